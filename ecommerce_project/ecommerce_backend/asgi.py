@@ -3,6 +3,16 @@ ASGI config for ecommerce_backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with uvicorn instead of gunicorn to run the async API views under
+``/api/async/`` natively (the sync views still work, run in a thread pool)::
+
+    uvicorn ecommerce_backend.asgi:application --host 0.0.0.0 --port $PORT --workers 4
+
+Compare the two deployments with ``python manage.py loadtest <wsgi url> <asgi url>``.
+The async views only pay off when requests spend most of their time waiting
+on a database or cache server; against SQLite every query still runs in a
+worker thread, so measure before switching.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
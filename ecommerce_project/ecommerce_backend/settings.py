@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import importlib.util
 from pathlib import Path
 
+from django.conf import global_settings
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -46,7 +49,11 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    'shop.metrics.PerformanceMiddleware',
+    'shop.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Static files and image variants, answered before the rest of the stack (see shop/images.py)
+    'shop.images.ImageVariantMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,6 +62,8 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
+if importlib.util.find_spec('whitenoise') is None:
+    MIDDLEWARE.remove('shop.images.ImageVariantMiddleware')
 
 ROOT_URLCONF = 'ecommerce_backend.urls'
 
@@ -62,12 +71,19 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'shop.context_processors.cart',
+            ],
+            # Parse each template once per process rather than on every render
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
             ],
         },
     },
@@ -83,13 +99,81 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Take the write lock at BEGIN so concurrent checkouts queue on the
+            # busy timeout instead of failing with "database is locked".
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        'TEST': {
+            # A file (not shared in-memory) database lets threaded tests wait on locks
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
 
+# Cache
+# Local memory by default; point CACHE_BACKEND / CACHE_LOCATION at a shared
+# backend (e.g. django.core.cache.backends.redis.RedisCache) when running
+# several workers so version bumps are seen by all of them.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'swapkart'),
+    }
+}
+SHOP_CACHE_ALIAS = 'default'
+SHOP_CACHE_TIMEOUT = int(os.environ.get('SHOP_CACHE_TIMEOUT', 600))
+
+# 'shop.cart.DatabaseCartStore' or 'shop.cart.CacheCartStore' (needs a persistent cache)
+SHOP_CART_STORE = os.environ.get('SHOP_CART_STORE', 'shop.cart.DatabaseCartStore')
+SHOP_CART_TIMEOUT = 60 * 60 * 24 * 30
+
+# Post-checkout jobs: 'thread' runs them on an in-process pool, 'worker' leaves
+# them to `manage.py run_jobs`, 'sync' runs them as soon as the order commits
+SHOP_JOBS_MODE = os.environ.get('SHOP_JOBS_MODE', 'thread')
+SHOP_JOBS_THREADS = int(os.environ.get('SHOP_JOBS_THREADS', 4))
+SHOP_JOBS_RETRY_DELAY = 5  # seconds, doubled after every failed attempt
+
+# Responses smaller than this are not worth compressing; Brotli quality 0-11 trades CPU for size
+SHOP_COMPRESS_MIN_SIZE = int(os.environ.get('SHOP_COMPRESS_MIN_SIZE', 1024))
+SHOP_BROTLI_QUALITY = int(os.environ.get('SHOP_BROTLI_QUALITY', 5))
+
+# Share of requests that get query counts and a Server-Timing header; every
+# request is still counted in the latency histograms served at /metrics. Without
+# a token, /metrics is only open to staff and to scrapers on localhost
+SHOP_METRICS_SAMPLE_RATE = float(os.environ.get('SHOP_METRICS_SAMPLE_RATE', 0.1))
+SHOP_METRICS_TOKEN = os.environ.get('SHOP_METRICS_TOKEN')
+
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'orders@swapkart.local')
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
+# Argon2 is tried first when installed. Django's defaults stay listed so every
+# existing hash still verifies; it is upgraded on the next login
+PASSWORD_HASHERS = [
+    'shop.hashers.PooledArgon2PasswordHasher',
+    'shop.hashers.PooledPBKDF2PasswordHasher',
+    *global_settings.PASSWORD_HASHERS,
+]
+if importlib.util.find_spec('argon2') is None:
+    PASSWORD_HASHERS.remove('shop.hashers.PooledArgon2PasswordHasher')
+# Processes that password hashing is offloaded to; 0 hashes on the request thread
+SHOP_PASSWORD_HASH_WORKERS = int(os.environ.get('SHOP_PASSWORD_HASH_WORKERS', 0))
+
+# Attempts allowed per window before login/signup answer 429, checked before any hashing;
+# the username limit counts each username per client IP
+SHOP_LOGIN_RATE_IP = os.environ.get('SHOP_LOGIN_RATE_IP', '100/min')
+SHOP_LOGIN_RATE_USERNAME = os.environ.get('SHOP_LOGIN_RATE_USERNAME', '10/min')
+SHOP_SIGNUP_RATE_IP = os.environ.get('SHOP_SIGNUP_RATE_IP', '20/hour')
+# Proxies in front of the app (1 behind a Heroku-style router); client IPs come from X-Forwarded-For
+SHOP_TRUSTED_PROXY_COUNT = int(os.environ.get('SHOP_TRUSTED_PROXY_COUNT', 0))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -124,17 +208,44 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    # Resized catalogue images written by `manage.py build_image_variants`
+    'shop_images': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        'OPTIONS': {'location': MEDIA_ROOT / 'images', 'base_url': MEDIA_URL + 'images/'},
+    },
+}
+# Where the originals behind image_url values like "/images/books.jpg" live
+SHOP_IMAGE_SOURCE_DIRS = [BASE_DIR.parent / 'images', BASE_DIR / 'frontend' / 'public' / 'images']
+
+# Anonymous pages written by `manage.py prerender_pages` for the web server to send directly
+SHOP_PRERENDER_DIR = os.environ.get('SHOP_PRERENDER_DIR', BASE_DIR / 'prerendered')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+# Build request.user from JWT claims instead of a per-request user query (see shop/authentication.py)
+SHOP_JWT_TOKEN_USER = os.environ.get('SHOP_JWT_TOKEN_USER', 'False') == 'True'
+SHOP_AUTH_STATE_TTL = int(os.environ.get('SHOP_AUTH_STATE_TTL', 60))
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "shop.authentication.TokenUserAuthentication" if SHOP_JWT_TOKEN_USER
+        else "rest_framework_simplejwt.authentication.JWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticatedOrReadOnly",
     ),
+    "DEFAULT_RENDERER_CLASSES": (
+        "shop.renderers.JSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
 }
 
 
@@ -151,4 +262,8 @@ SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
     "AUTH_HEADER_TYPES": ("Bearer",),
+    "TOKEN_OBTAIN_SERIALIZER": "shop.authentication.TokenObtainPairSerializer",
 }
+
+# Product search backend (dotted path); defaults to FTS5 on SQLite and tsvector on Postgres
+SHOP_SEARCH_BACKEND = os.environ.get('SHOP_SEARCH_BACKEND')
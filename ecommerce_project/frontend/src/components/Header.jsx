@@ -1,9 +1,19 @@
-import React from "react";
+import React, { useEffect, useState } from "react";
 import { Link, useNavigate } from "react-router-dom";
+import api from "../services/api";
 
 export default function Header() {
   const navigate = useNavigate();
   const token = localStorage.getItem("access_token");
+  const [itemCount, setItemCount] = useState(0);
+
+  useEffect(() => {
+    if (!token) return;
+    api
+      .get("/api/cart/summary/")
+      .then((res) => setItemCount(res.data.item_count))
+      .catch(() => setItemCount(0));
+  }, [token]);
 
   const handleLogout = () => {
     localStorage.removeItem("access_token");
@@ -24,7 +34,9 @@ export default function Header() {
               <Link className="nav-link" to="/">Home</Link>
             </li>
             <li className="nav-item">
-              <Link className="nav-link" to="/cart">Cart</Link>
+              <Link className="nav-link" to="/cart">
+                Cart {itemCount > 0 && <span className="badge bg-success">{itemCount}</span>}
+              </Link>
             </li>
             {token && (
               <>
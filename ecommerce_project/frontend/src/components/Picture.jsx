@@ -0,0 +1,27 @@
+import React from "react";
+import api from "../services/api";
+
+// Variant URLs are paths on the API server, not on the frontend's own origin
+const apiUrl = (url) => (url.startsWith("/") ? api.defaults.baseURL + url : url);
+
+// An item's image_url, or its resized WebP/JPEG variant once the backend has built one
+export default function Picture({ item, variant, alt, loading = "lazy", ...props }) {
+  const image = item.image_variants && item.image_variants[variant];
+  if (!image) {
+    return <img src={item.image_url} alt={alt} loading={loading} {...props} />;
+  }
+  return (
+    <picture>
+      {image.webp && <source srcSet={apiUrl(image.webp)} type="image/webp" />}
+      <img
+        src={apiUrl(image.jpeg)}
+        width={image.width}
+        height={image.height}
+        alt={alt}
+        loading={loading}
+        decoding="async"
+        {...props}
+      />
+    </picture>
+  );
+}
@@ -2,11 +2,13 @@ import React, { useEffect, useState } from "react";
 import { useParams, Link } from "react-router-dom";
 import api from "../services/api";
 import Header from "../components/Header";
+import Picture from "../components/Picture";
 
 function CategoryProducts() {
   const { slug } = useParams();
   const [category, setCategory] = useState(null);
   const [products, setProducts] = useState([]);
+  const [nextPage, setNextPage] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [message, setMessage] = useState("");
@@ -30,6 +32,7 @@ function CategoryProducts() {
       .then((res) => {
         setCategory(res.data.category);
         setProducts(res.data.products);
+        setNextPage(res.data.next);
         setLoading(false);
       })
       .catch((err) => {
@@ -39,6 +42,19 @@ function CategoryProducts() {
       });
   };
 
+  const loadMore = () => {
+    api
+      .get(nextPage)
+      .then((res) => {
+        setProducts((prev) => [...prev, ...res.data.products]);
+        setNextPage(res.data.next);
+      })
+      .catch((err) => {
+        console.error(err);
+        setError("Failed to load products");
+      });
+  };
+
   useEffect(() => {
     fetchProducts();
   }, [slug, query, minPrice, maxPrice, sort]);
@@ -100,7 +116,7 @@ function CategoryProducts() {
       <div className="container mt-5">
         {category && category.image_url && (
           <div className="text-center mb-4">
-            <img src={category.image_url} alt={category.name} className="img-fluid rounded" style={{ maxHeight: '200px', objectFit: 'cover' }} />
+            <Picture item={category} variant="card" alt={category.name} className="img-fluid rounded" style={{ maxHeight: '200px', objectFit: 'cover' }} loading="eager" />
           </div>
         )}
         <h2 className="mb-4">Products in {category ? category.name : slug}</h2>
@@ -143,6 +159,8 @@ function CategoryProducts() {
               <option value="">Sort by</option>
               <option value="price_asc">Price: Low to High</option>
               <option value="price_desc">Price: High to Low</option>
+              <option value="newest">Newest First</option>
+              <option value="rating">Top Rated</option>
             </select>
           </div>
           <div className="col-md-3">
@@ -165,8 +183,9 @@ function CategoryProducts() {
           <div key={p.id} className="col-lg-3 col-md-4 col-sm-6 col-12 mb-4">
             <div className="card h-100 shadow-sm">
               {p.image_url ? (
-                <img
-                  src={p.image_url}
+                <Picture
+                  item={p}
+                  variant="card"
                   alt={p.name}
                   className="card-img-top"
                   style={{ height: "200px", objectFit: "cover" }}
@@ -227,6 +246,13 @@ function CategoryProducts() {
           </div>
         ))}
       </div>
+      {nextPage && (
+        <div className="text-center mt-2">
+          <button type="button" className="btn btn-outline-primary" onClick={loadMore}>
+            Load more
+          </button>
+        </div>
+      )}
       <div className="text-center mt-4">
         <Link to="/" className="btn btn-secondary">
           ← Back to Categories
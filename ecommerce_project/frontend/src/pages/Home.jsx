@@ -3,6 +3,7 @@ import { Link } from "react-router-dom";
 import api from "../services/api";
 import Header from "../components/Header";
 import Footer from "../components/Footer";
+import Picture from "../components/Picture";
 
 function Home() {
   const [categories, setCategories] = useState([]);
@@ -79,7 +80,7 @@ function Home() {
             <div key={cat.id} className="col-lg-3 col-md-4 col-sm-6 mb-4">
               <div className="card h-100 border-0 shadow-sm">
                 {cat.image_url && (
-                  <img src={cat.image_url} className="card-img-top" alt={cat.name} style={{ height: '150px', objectFit: 'cover' }} />
+                  <Picture item={cat} variant="card" className="card-img-top" alt={cat.name} style={{ height: '150px', objectFit: 'cover' }} />
                 )}
                 <div className="card-body text-center d-flex flex-column">
                   {!cat.image_url && (
@@ -2,6 +2,7 @@ import React, { useEffect, useState } from "react";
 import { useParams, Link } from "react-router-dom";
 import api from "../services/api";
 import Header from "../components/Header";
+import Picture from "../components/Picture";
 
 function ProductDetail() {
   const { id } = useParams();
@@ -90,8 +91,10 @@ function ProductDetail() {
         <div className="row">
           <div className="col-md-6">
             {product.image_url ? (
-              <img
-                src={product.image_url}
+              <Picture
+                item={product}
+                variant="full"
+                loading="eager"
                 alt={product.name}
                 className="img-fluid rounded shadow"
                 style={{ maxHeight: '400px', objectFit: 'cover' }}
@@ -1,15 +1,30 @@
 from django.contrib import admin
-from .models import Category, Product, Order, OrderItem, Review
+from .models import Category, Product, Order, OrderItem, Review, Cart, Job
 
 # Register your models here
 admin.site.register(Category)
 admin.site.register(Product)
 admin.site.register(OrderItem)
 admin.site.register(Review)
+admin.site.register(Cart)
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'status', 'created_at')
+    list_display = ('id', 'user', 'status', 'created_at', 'order_total')
     list_filter = ('status', 'created_at')
+    list_select_related = ('user',)
     search_fields = ('user__username', 'id')
     ordering = ('-created_at',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_totals()
+
+    @admin.display(description='Total', ordering='items_total')
+    def order_total(self, obj):
+        return obj.items_total
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'run_at', 'created_at')
+    list_filter = ('status', 'name')
+    ordering = ('-created_at',)
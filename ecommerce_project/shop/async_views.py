@@ -0,0 +1,128 @@
+"""
+Async variants of the read-only catalog and order APIs.
+
+These mirror `CategoryList`, `ProductList`, `ProductDetail`,
+`CategoryProducts` and `MyOrders` but run natively under ASGI: queries go
+through the async ORM and the versioned cache is read with the async cache
+API, so a worker keeps serving other requests while one waits on the
+database. Responses and cache entries are shared with the sync views.
+"""
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse
+from django.views.decorators.http import require_safe
+from rest_framework.exceptions import AuthenticationFailed, NotFound
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .cache import acached
+from .conditional import aproduct_validators, catalog_validators
+from .metrics import timed_serialization
+from .renderers import dumps
+from .models import Category, Order, Product, Review
+from .serializers import CategorySerializer, OrderSerializer, ProductSerializer
+from .views import catalog_paginator, filter_catalog, list_param, serialize_products
+
+
+def json_response(data, status=200):
+    with timed_serialization():
+        return HttpResponse(dumps(data), content_type='application/json', status=status)
+
+
+async def fetch(queryset):
+    # Iterating runs select_related/prefetch_related in one _fetch_all call
+    return [row async for row in queryset]
+
+
+async def aget_or_404(queryset, **lookup):
+    try:
+        return await queryset.aget(**lookup)
+    except queryset.model.DoesNotExist:
+        raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+
+
+async def aauthenticate(request):
+    """The user the API's configured authentication classes find, in their order, or None."""
+    # Same classes as the sync views, so token-user mode skips the user query here too
+    request = Request(request)
+    for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        try:
+            result = await sync_to_async(authentication_class().authenticate)(request)
+        except AuthenticationFailed:
+            return None
+        if result:
+            return result[0]
+    return None
+
+
+@require_safe
+@catalog_validators(Category)
+async def category_list(request):
+    async def build():
+        return CategorySerializer(await fetch(Category.objects.all()), many=True).data
+
+    return json_response(await acached("categories", [Category], build))
+
+
+async def paginate_products(products, request):
+    request = Request(request)
+    expand = list_param(request, "expand")
+    products = ProductSerializer.setup_eager_loading(filter_catalog(products, request), expand=expand)
+    paginator = catalog_paginator(request)
+    try:
+        page = await paginator.apaginate_queryset(products, request)
+    except NotFound as exc:
+        raise Http404(exc.detail)
+    products, categories = serialize_products(page, request, expand)
+    payload = {'next': paginator.get_next_link(), 'results': products}
+    if categories is not None:
+        payload['categories'] = categories
+    return payload
+
+
+@require_safe
+@catalog_validators(Product, Category)
+async def product_list(request):
+    return json_response(await paginate_products(Product.objects.all(), request))
+
+
+@require_safe
+@aproduct_validators
+async def product_detail(request, pk):
+    fields = list_param(Request(request), "fields")
+
+    async def build():
+        expand = ["reviews"]
+        queryset = ProductSerializer.setup_eager_loading(Product.objects.filter(pk=pk), expand=expand)
+        products = await fetch(queryset)
+        if not products:
+            raise Http404("No Product matches the given query.")
+        return ProductSerializer(products[0], fields=fields, expand=expand).data
+
+    return json_response(await acached("product_detail", [Product, Category, Review], build, vary=[pk, fields]))
+
+
+@require_safe
+@catalog_validators(Category, Product, Review)
+async def category_products(request, category_slug):
+    models = [Category, Product, Review] if "reviews" in list_param(Request(request), "expand") else [Category, Product]
+
+    async def build():
+        category = await aget_or_404(Category.objects.all(), slug=category_slug)
+        page = await paginate_products(Product.objects.filter(category=category, available=True), request)
+        payload = {'category': CategorySerializer(category).data, 'products': page.pop('results')}
+        payload.update(page)
+        return payload
+
+    data = await acached("category_products", models, build, vary=[request.build_absolute_uri()])
+    return json_response(data)
+
+
+@require_safe
+async def my_orders(request):
+    user = await aauthenticate(request)
+    if user is None:
+        return json_response({"detail": "Authentication credentials were not provided."}, status=401)
+    orders = OrderSerializer.setup_eager_loading(
+        Order.objects.filter(user_id=user.pk, complete=True).order_by('-created_at')
+    )
+    return json_response(OrderSerializer(await fetch(orders), many=True).data)
@@ -0,0 +1,73 @@
+"""
+Stateless JWT authentication for the API.
+
+`TokenObtainPairSerializer` puts the user's `username`, `is_staff` and a
+short fingerprint of their password hash into every token it issues.
+`TokenUserAuthentication` builds `request.user` from those claims as a
+simplejwt `TokenUser` instead of loading the `User` row. Views that only
+need the user's id then run without a user query.
+
+A token is still rejected once its user is deactivated, deleted or changes
+password. Those checks read a small per-user state entry from the shop cache,
+which expires after `SHOP_AUTH_STATE_TTL` seconds. Saving or deleting a user
+clears the entry, so changes apply at once with a shared cache and within the
+TTL with a per-process one.
+
+Enable it with `SHOP_JWT_TOKEN_USER=True`. Tokens get the extra claims in
+either mode; tokens issued before they existed need a fresh login.
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.utils.crypto import salted_hmac
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer as BaseTokenObtainPairSerializer
+
+from .cache import get_cache
+
+REVOKED = 'revoked'
+
+
+def password_fingerprint(password):
+    return salted_hmac('shop.authentication.password', password).hexdigest()[:16]
+
+
+class TokenObtainPairSerializer(BaseTokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['username'] = user.get_username()
+        token['is_staff'] = user.is_staff
+        token['pwd'] = password_fingerprint(user.password)
+        return token
+
+
+def state_key(user_id):
+    return f"shop:auth:state:{user_id}"
+
+
+def user_state(user_id):
+    """The password fingerprint of an active user, or REVOKED; cached for a short TTL."""
+    cache = get_cache()
+    key = state_key(user_id)
+    state = cache.get(key)
+    if state is None:
+        password = User.objects.filter(pk=user_id, is_active=True).values_list('password', flat=True).first()
+        state = password_fingerprint(password) if password is not None else REVOKED
+        cache.set(key, state, getattr(settings, 'SHOP_AUTH_STATE_TTL', 60))
+    return state
+
+
+def forget_user_state(user_id):
+    get_cache().delete(state_key(user_id))
+
+
+class TokenUserAuthentication(JWTStatelessUserAuthentication):
+    """JWT authentication that trusts the token's claims instead of loading the user."""
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        state = user_state(user.id)
+        if state == REVOKED or state != validated_token.get('pwd'):
+            raise AuthenticationFailed('Token has been revoked.', code='token_revoked')
+        return user
@@ -0,0 +1,321 @@
+import os
+import random
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.contrib.auth.hashers import check_password, make_password
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Max
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from .cache import bump_version
+from .models import Category, Order, OrderItem, Product, Review
+from .search import get_search_backend
+from .stats import rebuild as rebuild_stats
+
+BENCH_PASSWORD = 'bench-pass-123'
+
+ADJECTIVES = [
+    'wireless', 'portable', 'classic', 'premium', 'compact', 'organic', 'smart', 'vintage',
+    'ergonomic', 'waterproof', 'lightweight', 'deluxe', 'rechargeable', 'handmade', 'adjustable',
+]
+NOUNS = [
+    'headphones', 'speaker', 'jacket', 'lamp', 'backpack', 'keyboard', 'blender', 'tent',
+    'novel', 'sneakers', 'watch', 'camera', 'mug', 'puzzle', 'charger', 'cookbook', 'bicycle',
+]
+FILLER = [
+    'with', 'long', 'battery', 'life', 'for', 'everyday', 'use', 'durable', 'design', 'and',
+    'comfortable', 'fit', 'great', 'gift', 'family', 'outdoor', 'travel', 'home', 'office',
+]
+
+
+def generate_catalog(product_count, category_count=10, seed=0, batch_size=5000):
+    """Bulk-create a synthetic catalog of `product_count` products."""
+    rng = random.Random(seed)
+    slugs = [f"bench-category-{seed}-{i}" for i in range(category_count)]
+    Category.objects.bulk_create(
+        [Category(name=f"Bench Category {seed}-{i}", slug=slug) for i, slug in enumerate(slugs)],
+        ignore_conflicts=True,
+    )
+    categories = list(Category.objects.filter(slug__in=slugs))
+    created = 0
+    while created < product_count:
+        batch = []
+        for i in range(created, min(created + batch_size, product_count)):
+            name = f"{rng.choice(ADJECTIVES).title()} {rng.choice(NOUNS).title()} {i}"
+            batch.append(Product(
+                category=rng.choice(categories),
+                name=name,
+                description=" ".join(rng.choice(FILLER + NOUNS) for _ in range(20)),
+                price=Decimal(rng.randint(100, 200000)) / 100,
+                stock=rng.randint(0, 500),
+            ))
+        Product.objects.bulk_create(batch)
+        created += len(batch)
+    return categories
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def time_call(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def login_throughput(hashers, workers=0, logins=40, concurrency=4):
+    """
+    Verify a password `logins` times from `concurrency` threads with
+    `hashers` as PASSWORD_HASHERS and `workers` hashing processes.
+    Verification is what a login spends its CPU on.
+    """
+    with override_settings(PASSWORD_HASHERS=hashers, SHOP_PASSWORD_HASH_WORKERS=workers):
+        encoded = make_password(BENCH_PASSWORD)
+        # Warm up, including starting the pool's processes
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(lambda _: check_password(BENCH_PASSWORD, encoded), range(max(workers, 1))))
+
+        def login(_):
+            elapsed, ok = time_call(check_password, BENCH_PASSWORD, encoded)
+            if not ok:
+                raise RuntimeError("Password did not verify")
+            return elapsed * 1000
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            samples = list(pool.map(login, range(logins)))
+        wall = time.perf_counter() - started
+    return {
+        'logins_per_second': round(logins / wall, 2),
+        'logins_per_second_per_core': round(logins / wall / (os.cpu_count() or 1), 2),
+        'p50_ms': round(percentile(samples, 50), 1),
+        'p95_ms': round(percentile(samples, 95), 1),
+    }
+
+
+def generate_users(count, seed=0):
+    # Hash once; every synthetic user shares the same password
+    password = make_password(BENCH_PASSWORD)
+    prefix = f"bench-user-{seed}-"
+    User.objects.bulk_create(
+        [User(username=f"{prefix}{i}", email=f"{prefix}{i}@example.com", password=password) for i in range(count)],
+        ignore_conflicts=True,
+    )
+    return list(User.objects.filter(username__startswith=prefix).order_by('pk'))
+
+
+def generate_orders(users, products, count, seed=0, max_lines=4):
+    """Bulk-create `count` completed orders with 1..max_lines lines each."""
+    rng = random.Random(seed)
+    baskets = []
+    for _ in range(count):
+        lines = {product: rng.randint(1, 3) for product in rng.sample(products, rng.randint(1, max_lines))}
+        total = sum((product.price * quantity for product, quantity in lines.items()), Decimal('0.00'))
+        baskets.append((Order(user=rng.choice(users), complete=True, total=total), lines))
+    orders = Order.objects.bulk_create([order for order, _ in baskets])
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product=product, quantity=quantity)
+        for order, (_, lines) in zip(orders, baskets) for product, quantity in lines.items()
+    ])
+    return orders
+
+
+def generate_reviews(users, products, count, seed=0):
+    rng = random.Random(seed)
+    Review.objects.bulk_create([
+        Review(product=rng.choice(products), user=rng.choice(users), rating=rng.randint(1, 5), comment="Synthetic review")
+        for _ in range(count)
+    ])
+    # bulk_create skips the signals that keep the rating aggregates current
+    Product.objects.filter(pk__in=[product.pk for product in products]).refresh_review_stats()
+
+
+def generate_dataset(categories=10, products=5000, users=50, orders=500, reviews=2000, seed=0):
+    """
+    Build a reproducible shop: the `populate_data` seed catalog plus a
+    synthetic catalog, users, order history and reviews. The same arguments
+    and seed always produce the same data.
+    """
+    from .populate_data import populate_data
+
+    populate_data()
+    generate_catalog(products, category_count=categories, seed=seed)
+    get_search_backend().rebuild()
+    catalog = list(Product.objects.order_by('pk'))
+    shoppers = generate_users(users, seed=seed)
+    generate_orders(shoppers, catalog, orders, seed=seed)
+    generate_reviews(shoppers, catalog, reviews, seed=seed)
+    bump_version(Category, Product, Review)
+    return {'products': len(catalog), 'users': shoppers}
+
+
+# In deletion order: orders and reviews point at users and products
+DATASET_MODELS = (Order, Review, User, Product, Category)
+
+
+def dataset_marks():
+    """The highest id of each model `generate_dataset` writes, taken before it runs."""
+    return {model: model.objects.aggregate(last=Max('pk'))['last'] or 0 for model in DATASET_MODELS}
+
+
+def delete_dataset(marks):
+    """Delete every row created since `dataset_marks()` and rebuild what was derived from them."""
+    for model in DATASET_MODELS:
+        model.objects.filter(pk__gt=marks[model]).delete()
+    # The dataset was bulk-created past the signals that keep these in step
+    get_search_backend().rebuild()
+    rebuild_stats()
+    bump_version(Category, Product, Review)
+
+
+class Recorder:
+    """Latency, query count and status of every request, grouped by scenario step."""
+
+    def __init__(self, count_queries=True):
+        self.count_queries = count_queries
+        self.latency = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+
+    def request(self, step, send):
+        if self.count_queries:
+            with CaptureQueriesContext(connection) as ctx:
+                elapsed, response = time_call(send)
+            self.queries[step].append(len(ctx.captured_queries))
+        else:
+            elapsed, response = time_call(send)
+            queries = server_timing_queries(response.headers.get('Server-Timing', ''))
+            if queries is not None:
+                self.queries[step].append(queries)
+        self.latency[step].append(elapsed * 1000)
+        self.statuses[step][response.status_code] += 1
+        return response
+
+    def summary(self):
+        results = {}
+        for step, samples in sorted(self.latency.items()):
+            queries = self.queries.get(step)
+            results[step] = {
+                'requests': len(samples),
+                'p50_ms': round(percentile(samples, 50), 3),
+                'p95_ms': round(percentile(samples, 95), 3),
+                'p99_ms': round(percentile(samples, 99), 3),
+                'mean_ms': round(sum(samples) / len(samples), 3),
+                'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+                'statuses': {str(status): count for status, count in sorted(self.statuses[step].items())},
+            }
+        return results
+
+
+def server_timing_queries(header):
+    """Query count from the `db` entry of a Server-Timing header, if the request was sampled."""
+    for part in header.split(','):
+        if part.strip().startswith('db;') and 'desc="' in part:
+            return int(part.split('desc="')[1].split()[0])
+    return None
+
+
+class InProcessClient:
+    """Drives the API through Django's test client, logged in as `user`."""
+
+    def __init__(self, user):
+        from rest_framework.test import APIClient
+
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def get(self, path, params=None):
+        return self.client.get(path, params)
+
+    def post(self, path, data):
+        return self.client.post(path, data, format='json')
+
+
+class HttpClient:
+    """Drives a running server over HTTP with a JWT for `username`."""
+
+    def __init__(self, base_url, username, password=BENCH_PASSWORD):
+        import httpx
+
+        self.client = httpx.Client(base_url=base_url, timeout=30)
+        token = self.client.post(reverse('token_obtain_pair'), json={'username': username, 'password': password})
+        token.raise_for_status()
+        self.client.headers['Authorization'] = f"Bearer {token.json()['access']}"
+
+    def get(self, path, params=None):
+        return self.client.get(path, params=params)
+
+    def post(self, path, data):
+        return self.client.post(path, json=data)
+
+
+def browse(rng, client, recorder):
+    categories = recorder.request('browse.categories', lambda: client.get(reverse('api_category_list'))).json()
+    slug = rng.choice(categories)['slug']
+    listing = recorder.request(
+        'browse.category', lambda: client.get(reverse('api_category_products', args=[slug]), {'sort': 'rating'})
+    ).json()
+    if listing['products']:
+        pk = rng.choice(listing['products'])['id']
+        recorder.request('browse.product', lambda: client.get(reverse('api_product_detail', args=[pk])))
+
+
+def search(rng, client, recorder):
+    query = rng.choice(ADJECTIVES + NOUNS)[:rng.randint(3, 8)]
+    recorder.request('search.products', lambda: client.get(reverse('api_product_list'), {'q': query}))
+
+
+def add_to_cart(rng, client, recorder):
+    products = recorder.request(
+        'cart.pick', lambda: client.get(reverse('api_product_list'), {'sort': 'newest', 'fields': 'id,stock'})
+    ).json()['results']
+    in_stock = [product['id'] for product in products if product['stock'] > 0]
+    operations = [{'product_id': pk, 'action': 'add', 'quantity': 1} for pk in rng.sample(in_stock, min(2, len(in_stock)))]
+    if operations:
+        recorder.request('cart.batch', lambda: client.post(reverse('api_cart_batch'), {'operations': operations}))
+    recorder.request('cart.summary', lambda: client.get(reverse('api_cart_summary')))
+
+
+def checkout(rng, client, recorder):
+    recorder.request('checkout', lambda: client.post(reverse('api_checkout'), {}))
+    recorder.request('checkout.history', lambda: client.get(reverse('api_my_orders')))
+
+
+def shopper(rng, client, recorder):
+    browse(rng, client, recorder)
+    search(rng, client, recorder)
+    add_to_cart(rng, client, recorder)
+    checkout(rng, client, recorder)
+
+
+SCENARIOS = {
+    'browse': browse,
+    'search': search,
+    'cart': add_to_cart,
+    'checkout': checkout,
+    'shopper': shopper,
+}
+
+
+def compare_results(baseline, current, threshold=0.10):
+    """Yield (step, field, before, after) for every latency or query-count regression."""
+    for step, after in current.items():
+        before = baseline.get(step)
+        if before is None:
+            continue
+        for field in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if before[field] and after[field] > before[field] * (1 + threshold):
+                yield step, field, before[field], after[field]
+        if (before['queries_per_request'] is not None and after['queries_per_request'] is not None
+                and after['queries_per_request'] > before['queries_per_request']):
+            yield step, 'queries_per_request', before['queries_per_request'], after['queries_per_request']
@@ -0,0 +1,66 @@
+"""
+Set-based changes to many products at once, for the staff dashboard.
+
+Each action is a single UPDATE over the selected rows, followed by at most
+one statement to refresh the cart summaries that depend on them. The catalog
+cache is invalidated once per batch instead of once per product. Deletes go
+through the ORM so the per-product signals keep the search index, carts and
+dashboard rollups right, but their cache bumps are merged the same way.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest, Now, Round
+
+from .cache import batched_invalidation, bump_version
+from .models import MONEY, Cart, Product
+
+ACTIONS = [
+    ('reprice', 'Change price by %'),
+    ('set_stock', 'Set stock to'),
+    ('add_stock', 'Add to stock'),
+    ('show', 'Make available'),
+    ('hide', 'Make unavailable'),
+    ('delete', 'Delete'),
+]
+ACTION_LABELS = dict(ACTIONS)
+
+
+def changes(action, value):
+    """The UPDATE keyword arguments for `action`."""
+    if action == 'reprice':
+        factor = 1 + Decimal(value) / 100
+        return {'price': Round(F('price') * Value(factor, output_field=MONEY), 2, output_field=MONEY)}
+    if action == 'set_stock':
+        return {'stock': int(value)}
+    if action == 'add_stock':
+        return {'stock': Greatest(F('stock') + int(value), 0)}
+    if action in ('show', 'hide'):
+        return {'available': action == 'show'}
+    raise ValueError(f"Unknown bulk action '{action}'")
+
+
+def apply(action, products, value=None, dry_run=False):
+    """
+    Run `action` over the `products` queryset and return how many products it
+    touched; with `dry_run` only count them.
+    """
+    if dry_run:
+        return products.count()
+
+    # Search filters join extra tables, which UPDATE cannot; select by id instead
+    selection = Product.objects.filter(pk__in=products.order_by().values('pk'))
+    with transaction.atomic(), batched_invalidation():
+        if action == 'delete':
+            deleted, per_model = selection.delete()
+            return per_model.get(Product._meta.label, 0)
+        carts = None
+        if action == 'reprice':
+            # Resolved before the update, which may move rows out of the filter
+            carts = list(Cart.objects.filter(items__product__in=selection).values_list('pk', flat=True).distinct())
+        updated = selection.update(updated_at=Now(), **changes(action, value))
+        if carts:
+            Cart.objects.filter(pk__in=carts).refresh_summary()
+        bump_version(Product)
+    return updated
@@ -0,0 +1,186 @@
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+MISSING = object()
+
+_deferred = ContextVar('shop_deferred_versions', default=None)
+
+
+class CacheStats:
+    """Process-local hit/miss counters for the versioned read-through cache."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def snapshot(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+            }
+
+
+stats = CacheStats()
+
+
+def get_cache():
+    return caches[getattr(settings, 'SHOP_CACHE_ALIAS', 'default')]
+
+
+def model_label(model):
+    return model if isinstance(model, str) else model._meta.label_lower
+
+
+def version_key(model):
+    return f"shop:version:{model_label(model)}"
+
+
+def modified_key(model):
+    return f"shop:modified:{model_label(model)}"
+
+
+def get_versions(models):
+    """Current version of each model; unseen models start at a timestamp so an
+    evicted counter can never reuse a version that is still cached."""
+    cache = get_cache()
+    keys = {version_key(model): model_label(model) for model in models}
+    versions = cache.get_many(list(keys))
+    for key in keys.keys() - versions.keys():
+        cache.add(key, time.time_ns(), timeout=None)
+        versions[key] = cache.get(key)
+    return {label: versions[key] for key, label in keys.items()}
+
+
+async def aget_versions(models):
+    cache = get_cache()
+    keys = {version_key(model): model_label(model) for model in models}
+    versions = await cache.aget_many(list(keys))
+    for key in keys.keys() - versions.keys():
+        await cache.aadd(key, time.time_ns(), timeout=None)
+        versions[key] = await cache.aget(key)
+    return {label: versions[key] for key, label in keys.items()}
+
+
+def bump_version(*models):
+    """
+    Invalidate every cached entry built from `models` once the current
+    transaction commits (at once in autocommit). Bumping earlier would let a
+    concurrent reader cache pre-commit rows under the new version.
+    """
+    deferred = _deferred.get()
+    if deferred is not None:
+        deferred.update(model_label(model) for model in models)
+        return
+    transaction.on_commit(lambda: _bump(models))
+
+
+def _bump(models):
+    cache = get_cache()
+    now = time.time()
+    for model in models:
+        key = version_key(model)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+        cache.set(modified_key(model), now, timeout=None)
+
+
+@contextmanager
+def batched_invalidation():
+    """
+    Collect the `bump_version()` calls made inside the block, including those
+    from per-row signals, and bump each model once when the surrounding
+    transaction commits.
+    """
+    if _deferred.get() is not None:
+        # Nested blocks are flushed by the outermost one
+        yield
+        return
+    pending = set()
+    token = _deferred.set(pending)
+    try:
+        yield
+    finally:
+        _deferred.reset(token)
+        if pending:
+            transaction.on_commit(lambda: _bump(sorted(pending)))
+
+
+def get_last_modified(models):
+    """Latest change time across `models`; models never bumped count as changed now."""
+    cache = get_cache()
+    keys = [modified_key(model) for model in models]
+    stamps = cache.get_many(keys)
+    for key in set(keys) - stamps.keys():
+        cache.add(key, time.time(), timeout=None)
+        stamps[key] = cache.get(key)
+    return datetime.fromtimestamp(max(stamps.values()), tz=timezone.utc)
+
+
+def cache_key(name, versions, vary):
+    parts = [f"{label}={version}" for label, version in sorted(versions.items())]
+    parts += [str(value) for value in vary]
+    digest = hashlib.md5("|".join(parts).encode()).hexdigest()
+    return f"shop:{name}:{digest}"
+
+
+def cache_timeout(timeout):
+    return timeout if timeout is not None else getattr(settings, 'SHOP_CACHE_TIMEOUT', 600)
+
+
+def cached(name, models, builder, vary=(), timeout=None):
+    """
+    Return `builder()` from the cache, keyed on the current version of every
+    model in `models` so that any save or delete of those models makes the
+    entry unreachable instead of waiting for it to expire.
+    """
+    cache = get_cache()
+    key = cache_key(name, get_versions(models), vary)
+
+    value = cache.get(key, MISSING)
+    if value is not MISSING:
+        stats.record(hit=True)
+        return value
+    stats.record(hit=False)
+    value = builder()
+    cache.set(key, value, cache_timeout(timeout))
+    return value
+
+
+async def acached(name, models, builder, vary=(), timeout=None):
+    """`cached` for async views; `builder` is a coroutine function."""
+    cache = get_cache()
+    key = cache_key(name, await aget_versions(models), vary)
+
+    value = await cache.aget(key, MISSING)
+    if value is not MISSING:
+        stats.record(hit=True)
+        return value
+    stats.record(hit=False)
+    value = await builder()
+    await cache.aset(key, value, cache_timeout(timeout))
+    return value
@@ -0,0 +1,287 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils.module_loading import import_string
+
+from .cache import get_cache
+from .models import Cart, CartItem, Product
+
+
+def empty_summary():
+    return {'item_count': 0, 'subtotal': Decimal('0.00')}
+
+
+class CartLine:
+    """One product in a cart. `id` is the product id, which the cart URLs take."""
+
+    def __init__(self, product, quantity):
+        self.product = product
+        self.quantity = quantity
+
+    @property
+    def id(self):
+        return self.product.pk
+
+    @property
+    def total_price(self):
+        return self.product.price * self.quantity
+
+
+class CartStore:
+    """
+    A per-user shopping cart.
+
+    `summary()` answers the header badge (item count and subtotal) without
+    reading the cart lines; `lines()` returns every line with its product
+    loaded in a single query.
+    """
+
+    def summary(self, user):
+        raise NotImplementedError
+
+    def lines(self, user):
+        raise NotImplementedError
+
+    def line(self, user, product_id):
+        raise NotImplementedError
+
+    def quantities(self, user):
+        """`{product_id: quantity}` for every line, without loading products."""
+        raise NotImplementedError
+
+    def lock(self, user):
+        """Hold off other writers to the cart until the current transaction ends."""
+
+    def set_quantity(self, user, product, quantity):
+        """Set the quantity of `product`, removing it at zero. Returns the new quantity."""
+        raise NotImplementedError
+
+    def set_many(self, user, quantities):
+        """Apply `{product: quantity}` in one write; zero removes the line."""
+        raise NotImplementedError
+
+    def add(self, user, product, quantity=1):
+        """Add `quantity` of `product`, capped at its stock. Returns the new quantity."""
+        raise NotImplementedError
+
+    def remove(self, user, product):
+        return self.set_quantity(user, product, 0)
+
+    def clear(self, user):
+        raise NotImplementedError
+
+
+class DatabaseCartStore(CartStore):
+    """Keeps lines in `CartItem` and running totals on the user's `Cart` row."""
+
+    def summary(self, user):
+        summary = Cart.objects.filter(user_id=user.pk).values('item_count', 'subtotal').first()
+        return summary or empty_summary()
+
+    def lines(self, user):
+        items = CartItem.objects.filter(cart__user_id=user.pk).select_related('product__category').order_by('pk')
+        return [CartLine(item.product, item.quantity) for item in items]
+
+    def line(self, user, product_id):
+        item = CartItem.objects.filter(cart__user_id=user.pk, product_id=product_id).select_related('product__category').first()
+        return CartLine(item.product, item.quantity) if item else None
+
+    def quantities(self, user):
+        return dict(CartItem.objects.filter(cart__user_id=user.pk).values_list('product_id', 'quantity'))
+
+    def lock(self, user):
+        Cart.objects.select_for_update().get_or_create(user_id=user.pk)
+
+    def set_quantity(self, user, product, quantity):
+        return self.change(user, product, lambda current: quantity)
+
+    def add(self, user, product, quantity=1):
+        return self.change(user, product, lambda current: min(current + quantity, product.stock))
+
+    def change(self, user, product, new_quantity):
+        with transaction.atomic():
+            cart, _ = Cart.objects.select_for_update().get_or_create(user_id=user.pk)
+            item = CartItem.objects.filter(cart=cart, product=product).first()
+            current = item.quantity if item else 0
+            quantity = max(new_quantity(current), 0)
+            if quantity == current:
+                return quantity
+
+            if not quantity:
+                item.delete()
+            elif item:
+                item.quantity = quantity
+                item.save(update_fields=['quantity'])
+            else:
+                CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+
+            delta = quantity - current
+            Cart.objects.filter(pk=cart.pk).update(
+                item_count=F('item_count') + delta,
+                subtotal=F('subtotal') + delta * product.price,
+            )
+        return quantity
+
+    def set_many(self, user, quantities):
+        with transaction.atomic():
+            cart, _ = Cart.objects.select_for_update().get_or_create(user_id=user.pk)
+            items = {item.product_id: item for item in CartItem.objects.filter(cart=cart, product__in=list(quantities))}
+            created, updated, removed = [], [], []
+            for product, quantity in quantities.items():
+                item = items.get(product.pk)
+                if quantity <= 0:
+                    if item:
+                        removed.append(item.pk)
+                elif item is None:
+                    created.append(CartItem(cart=cart, product=product, quantity=quantity))
+                elif item.quantity != quantity:
+                    item.quantity = quantity
+                    updated.append(item)
+            if created:
+                CartItem.objects.bulk_create(created)
+            if updated:
+                CartItem.objects.bulk_update(updated, ['quantity'])
+            if removed:
+                CartItem.objects.filter(pk__in=removed).delete()
+            Cart.objects.filter(pk=cart.pk).refresh_summary()
+
+    def clear(self, user):
+        CartItem.objects.filter(cart__user_id=user.pk).delete()
+        Cart.objects.filter(user_id=user.pk).update(item_count=0, subtotal=Decimal('0.00'))
+
+
+class CacheCartStore(CartStore):
+    """
+    Keeps each cart as one cache entry of `{product_id: (quantity, price)}`,
+    so the badge costs no query at all. Prices are refreshed whenever the full
+    cart is read. Concurrent writes to one cart are last-write-wins, and an
+    evicted entry loses the cart, so use a persistent cache backend.
+    """
+
+    def key(self, user):
+        return f"shop:cart:{user.pk}"
+
+    def load(self, user):
+        return get_cache().get(self.key(user)) or {}
+
+    def save(self, user, entries):
+        timeout = getattr(settings, 'SHOP_CART_TIMEOUT', 60 * 60 * 24 * 30)
+        get_cache().set(self.key(user), entries, timeout)
+
+    def summary(self, user):
+        entries = self.load(user)
+        return {
+            'item_count': sum(quantity for quantity, _ in entries.values()),
+            'subtotal': sum((quantity * price for quantity, price in entries.values()), Decimal('0.00')),
+        }
+
+    def lines(self, user):
+        entries = self.load(user)
+        products = Product.objects.select_related('category').in_bulk(list(entries))
+        fresh = {pk: (quantity, products[pk].price) for pk, (quantity, _) in entries.items() if pk in products}
+        if fresh != entries:
+            self.save(user, fresh)
+        return [CartLine(products[pk], quantity) for pk, (quantity, _) in fresh.items()]
+
+    def line(self, user, product_id):
+        entry = self.load(user).get(product_id)
+        product = Product.objects.select_related('category').filter(pk=product_id).first() if entry else None
+        return CartLine(product, entry[0]) if product else None
+
+    def quantities(self, user):
+        return {pk: quantity for pk, (quantity, _) in self.load(user).items()}
+
+    def set_many(self, user, quantities):
+        entries = self.load(user)
+        for product, quantity in quantities.items():
+            if quantity > 0:
+                entries[product.pk] = (quantity, product.price)
+            else:
+                entries.pop(product.pk, None)
+        self.save(user, entries)
+
+    def set_quantity(self, user, product, quantity):
+        entries = self.load(user)
+        if quantity > 0:
+            entries[product.pk] = (quantity, product.price)
+        else:
+            entries.pop(product.pk, None)
+        self.save(user, entries)
+        return max(quantity, 0)
+
+    def add(self, user, product, quantity=1):
+        current = self.load(user).get(product.pk, (0, None))[0]
+        return self.set_quantity(user, product, min(current + quantity, product.stock))
+
+    def clear(self, user):
+        get_cache().delete(self.key(user))
+
+
+class CartOperationError(ValueError):
+    pass
+
+
+def apply_operations(user, operations, store=None):
+    """
+    Apply a list of `{'product_id', 'action', 'quantity'}` operations in order.
+
+    Actions are `set`, `add`/`increase`, `decrease` and `remove`. Every product
+    is looked up in one query and the final quantities are written with a
+    single `set_many`, so the cost does not grow with the number of
+    operations. Quantities beyond stock are capped; the requested quantity of
+    each capped product is returned as `{product_id: requested}`.
+
+    It all runs in one transaction with the cart locked, so concurrent batches
+    for the same user apply one after the other instead of overwriting each
+    other's changes.
+    """
+    store = store or get_cart_store()
+    with transaction.atomic():
+        store.lock(user)
+        return _apply_operations(user, operations, store)
+
+
+def _apply_operations(user, operations, store):
+    ids = {operation['product_id'] for operation in operations}
+    products = Product.objects.in_bulk(ids)
+    missing = sorted(ids - products.keys())
+    if missing:
+        raise CartOperationError(f"Unknown products: {', '.join(map(str, missing))}")
+
+    current = store.quantities(user)
+    wanted = {}
+    for operation in operations:
+        product_id, action = operation['product_id'], operation['action']
+        quantity = wanted.get(product_id, current.get(product_id, 0))
+        if action == 'set':
+            quantity = operation['quantity']
+        elif action in ('add', 'increase'):
+            quantity += operation['quantity']
+        elif action == 'decrease':
+            quantity -= operation['quantity']
+        elif action == 'remove':
+            quantity = 0
+        else:
+            raise CartOperationError(f"Invalid action: {action}")
+        wanted[product_id] = max(quantity, 0)
+
+    capped = {}
+    for product_id, quantity in wanted.items():
+        if quantity > products[product_id].stock:
+            capped[product_id] = quantity
+            wanted[product_id] = products[product_id].stock
+    store.set_many(user, {products[product_id]: quantity for product_id, quantity in wanted.items()})
+    return capped
+
+
+_store = None
+
+
+def get_cart_store():
+    """Return the store named by `SHOP_CART_STORE`, defaulting to the database."""
+    global _store
+    if _store is None:
+        _store = import_string(getattr(settings, 'SHOP_CART_STORE', 'shop.cart.DatabaseCartStore'))()
+    return _store
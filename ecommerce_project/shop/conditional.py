@@ -0,0 +1,74 @@
+import hashlib
+from functools import wraps
+
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+
+from .cache import get_last_modified, get_versions
+from .models import Category, Product, Review
+
+
+def make_etag(*parts):
+    return hashlib.md5("|".join(str(part) for part in parts).encode()).hexdigest()
+
+
+def catalog_validators(*models):
+    """
+    ETag / Last-Modified for a catalog listing, computed from the model
+    version counters alone so a 304 costs no database query at all. Being
+    query-free also makes it safe to wrap async views.
+    """
+    def etag(request, *args, **kwargs):
+        versions = get_versions(models)
+        return make_etag(request.get_full_path(), *sorted(versions.items()))
+
+    def last_modified(request, *args, **kwargs):
+        return get_last_modified(models)
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def catalog_condition(*models):
+    return method_decorator(catalog_validators(*models))
+
+
+def updated_at_query(pk):
+    return Product.objects.filter(pk=pk).values_list('updated_at', flat=True)
+
+
+def product_updated_at(request, pk):
+    # Both validators need this; look it up once per request
+    if not hasattr(request, '_product_updated_at'):
+        request._product_updated_at = updated_at_query(pk).first()
+    return request._product_updated_at
+
+
+def product_etag(request, pk):
+    updated_at = product_updated_at(request, pk)
+    if updated_at is None:
+        return None
+    versions = get_versions([Category, Review])
+    return make_etag(request.get_full_path(), updated_at.isoformat(), *sorted(versions.items()))
+
+
+def product_last_modified(request, pk):
+    updated_at = product_updated_at(request, pk)
+    if updated_at is None:
+        return None
+    return max(updated_at, get_last_modified([Category, Review]))
+
+
+product_validators = condition(etag_func=product_etag, last_modified_func=product_last_modified)
+product_condition = method_decorator(product_validators)
+
+
+def aproduct_validators(view):
+    """`product_validators` for async views; the updated_at lookup is awaited first so the validators run query-free."""
+    conditional = product_validators(view)
+
+    @wraps(view)
+    async def wrapper(request, pk):
+        request._product_updated_at = await updated_at_query(pk).afirst()
+        return await conditional(request, pk)
+
+    return wrapper
@@ -0,0 +1,11 @@
+from django.utils.functional import SimpleLazyObject
+
+from .cart import get_cart_store
+
+
+def cart(request):
+    """Expose `cart_summary` for the header badge, read only if a template uses it."""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {'cart_summary': SimpleLazyObject(lambda: get_cart_store().summary(user))}
@@ -0,0 +1,165 @@
+import csv
+import json
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+from django.utils.text import slugify
+
+from . import stats
+from .cache import bump_version
+from .images import known_variants
+from .models import Cart, Category, Product
+from .search import get_search_backend
+
+FEED_FIELDS = ['category_slug', 'name', 'description', 'price', 'stock', 'image_url', 'available']
+UPDATE_FIELDS = ['description', 'price', 'stock', 'image_url', 'image_variants', 'available', 'updated_at']
+FORMATS = ('csv', 'jsonl')
+
+
+class FeedError(ValueError):
+    pass
+
+
+def guess_format(path, default='csv'):
+    for fmt in FORMATS:
+        if str(path).endswith(f'.{fmt}'):
+            return fmt
+    if str(path).endswith('.ndjson'):
+        return 'jsonl'
+    return default
+
+
+def read_feed(stream, fmt):
+    """Yield one dict per product row without reading the whole feed into memory."""
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    elif fmt == 'jsonl':
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        raise FeedError(f"Unknown feed format: {fmt}")
+
+
+def write_feed(stream, rows, fmt):
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=FEED_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    elif fmt == 'jsonl':
+        for row in rows:
+            stream.write(json.dumps(row, separators=(',', ':')) + '\n')
+    else:
+        raise FeedError(f"Unknown feed format: {fmt}")
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() not in ('0', 'false', 'no', 'n', '')
+
+
+class CatalogImporter:
+    """
+    Upserts product rows in batches keyed on (category, name).
+
+    Categories are resolved through a slug -> id map loaded once up front, and
+    each batch is a single INSERT ... ON CONFLICT DO UPDATE followed by one
+    search-index refresh, so the number of queries grows with the number of
+    batches rather than the number of rows.
+    """
+
+    def __init__(self, batch_size=5000, create_categories=False, progress=None):
+        self.batch_size = batch_size
+        self.create_categories = create_categories
+        self.progress = progress
+        self.category_ids = dict(Category.objects.values_list('slug', 'id'))
+        self.image_variants = None
+        self.imported = 0
+        self.errors = []
+
+    def category_id(self, slug):
+        if slug not in self.category_ids:
+            if not self.create_categories:
+                raise FeedError(f"Unknown category '{slug}'")
+            category, _ = Category.objects.get_or_create(slug=slug, defaults={'name': slug.replace('-', ' ').title()})
+            self.category_ids[slug] = category.pk
+        return self.category_ids[slug]
+
+    def variants_for(self, image_url):
+        # Rows keep the variants that match their (possibly new) image_url
+        if not image_url:
+            return {}
+        if self.image_variants is None:
+            self.image_variants = known_variants()
+        return self.image_variants.get(image_url, {})
+
+    def build(self, row):
+        try:
+            slug = row.get('category_slug') or slugify(row.get('category', ''))
+            image_url = row.get('image_url') or None
+            return Product(
+                category_id=self.category_id(slug),
+                name=row['name'].strip(),
+                description=row.get('description') or '',
+                price=Decimal(str(row['price'])),
+                stock=int(row.get('stock') or 0),
+                image_url=image_url,
+                image_variants=self.variants_for(image_url),
+                available=parse_bool(row.get('available', True)),
+            )
+        except (KeyError, TypeError, ValueError, InvalidOperation) as exc:
+            raise FeedError(f"{exc.__class__.__name__}: {exc}")
+
+    def import_rows(self, rows):
+        started = time.perf_counter()
+        for number, batch in enumerate(chunked(rows, self.batch_size)):
+            products = {}
+            for offset, row in enumerate(batch):
+                try:
+                    product = self.build(row)
+                except FeedError as exc:
+                    self.errors.append((number * self.batch_size + offset + 1, str(exc)))
+                    continue
+                # The last row wins when a feed repeats a product within one batch
+                products[(product.category_id, product.name)] = product
+            self.import_batch(list(products.values()))
+            if self.progress:
+                elapsed = time.perf_counter() - started
+                self.progress(self.imported, self.imported / elapsed if elapsed else 0.0)
+        if self.imported:
+            stats.recount_products()
+        return self.imported
+
+    def import_batch(self, products):
+        if not products:
+            return
+        with transaction.atomic():
+            Product.objects.bulk_create(
+                products,
+                update_conflicts=True,
+                unique_fields=['category', 'name'],
+                update_fields=UPDATE_FIELDS,
+            )
+            get_search_backend().index_many(product.pk for product in products)
+            Cart.objects.filter(items__product__in=[product.pk for product in products]).refresh_summary()
+            transaction.on_commit(lambda: bump_version(Product))
+        self.imported += len(products)
+
+
+def export_rows(queryset=None, chunk_size=5000):
+    """Yield feed rows for `queryset`, streamed from a server-side cursor."""
+    queryset = Product.objects.all() if queryset is None else queryset
+    columns = ['category__slug', 'name', 'description', 'price', 'stock', 'image_url', 'available']
+    for values in queryset.order_by('pk').values_list(*columns).iterator(chunk_size=chunk_size):
+        row = dict(zip(FEED_FIELDS, values))
+        row['price'] = str(row['price'])
+        yield row
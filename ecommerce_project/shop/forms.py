@@ -1,7 +1,13 @@
+from datetime import datetime, time, timedelta
+
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
-from .models import Review, Product
+from django.utils import timezone
+from .bulk import ACTIONS
+from .images import known_variants
+from .models import Category, Order, Review, Product
+from .search import get_search_backend
 
 class SignupForm(UserCreationForm):
     class Meta:
@@ -31,3 +37,98 @@ class ProductForm(forms.ModelForm):
             'description': forms.Textarea(attrs={'rows': 4}),
             'image_url': forms.URLInput(attrs={'placeholder': 'Enter image URL'}),
         }
+
+    def save(self, commit=True):
+        if 'image_url' in self.changed_data:
+            # Drop the old image's variants, reusing any already built for the new one
+            url = self.instance.image_url
+            self.instance.image_variants = known_variants([url]).get(url, {}) if url else {}
+        return super().save(commit)
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+class AdminOrderFilterForm(forms.Form):
+    status = forms.ChoiceField(choices=[('', 'Any status')] + Order.STATUS_CHOICES, required=False, widget=forms.Select(attrs={'class': 'form-select'}))
+    user = forms.CharField(required=False, widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Username'}))
+    date_from = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
+    date_to = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
+
+    def filter(self, orders):
+        data = self.cleaned_data
+        if data['status']:
+            orders = orders.filter(status=data['status'])
+        if data['user']:
+            orders = orders.filter(user__username=data['user'])
+        # Compare against day boundaries rather than created_at__date so the index is usable
+        if data['date_from']:
+            orders = orders.filter(created_at__gte=day_start(data['date_from']))
+        if data['date_to']:
+            orders = orders.filter(created_at__lt=day_start(data['date_to'] + timedelta(days=1)))
+        return orders
+
+class AdminProductFilterForm(forms.Form):
+    q = forms.CharField(required=False, widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Search products'}))
+    category = forms.ModelChoiceField(
+        queryset=Category.objects.order_by('name'), required=False, empty_label='Any category',
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    available = forms.ChoiceField(
+        choices=[('', 'Any'), ('yes', 'Available'), ('no', 'Hidden')], required=False,
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    max_stock = forms.IntegerField(required=False, min_value=0, widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Stock at most'}))
+
+    def filter(self, products):
+        data = self.cleaned_data
+        if data['q']:
+            products = get_search_backend().search(products, data['q'])
+        if data['category']:
+            products = products.filter(category=data['category'])
+        if data['available']:
+            products = products.filter(available=data['available'] == 'yes')
+        if data['max_stock'] is not None:
+            products = products.filter(stock__lte=data['max_stock'])
+        return products
+
+    def has_filters(self):
+        """Whether the submitted filters are valid and narrow the list at all."""
+        return self.is_valid() and any(value not in (None, '') for value in self.cleaned_data.values())
+
+class BulkProductForm(forms.Form):
+    action = forms.ChoiceField(choices=ACTIONS, widget=forms.Select(attrs={'class': 'form-select'}))
+    value = forms.DecimalField(
+        required=False, decimal_places=2,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': '% or units', 'step': 'any'}),
+    )
+    # Ticked rows; with none ticked the action covers every product matching the filters
+    ids = forms.ModelMultipleChoiceField(queryset=Product.objects.all(), required=False)
+    dry_run = forms.BooleanField(required=False)
+    confirm = forms.BooleanField(required=False, label='Confirm delete')
+
+    def __init__(self, *args, filter_form=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.filter_form = filter_form
+
+    def clean(self):
+        data = super().clean()
+        action, value = data.get('action'), data.get('value')
+        # Never fall through to the whole catalog
+        if not data.get('ids') and not (self.filter_form is not None and self.filter_form.has_filters()):
+            self.add_error('ids', 'Tick some products or filter the list first.')
+        if action == 'delete' and not data.get('dry_run') and not data.get('confirm'):
+            self.add_error('confirm', 'Deleting products needs Confirm delete ticked.')
+        if action in ('reprice', 'set_stock', 'add_stock') and value is None:
+            self.add_error('value', 'This action needs a value.')
+        elif action == 'reprice' and value <= -100:
+            self.add_error('value', 'A price cannot drop by 100% or more.')
+        elif action in ('set_stock', 'add_stock') and value != int(value):
+            self.add_error('value', 'Stock changes must be whole numbers.')
+        elif action == 'set_stock' and value < 0:
+            self.add_error('value', 'Stock cannot be negative.')
+        return data
+
+    def selection(self, products):
+        if self.cleaned_data['ids']:
+            products = products.filter(pk__in=[product.pk for product in self.cleaned_data['ids']])
+        return products
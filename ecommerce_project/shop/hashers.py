@@ -0,0 +1,92 @@
+"""
+Password hashers that run their key derivation in a bounded process pool.
+
+Hashing a password is deliberately slow. If it runs on the request thread,
+a burst of logins or signups ties up every worker at once. With
+`SHOP_PASSWORD_HASH_WORKERS` set, `encode()` and `verify()` of the pooled
+hashers below are sent to a shared pool of that many processes. At most
+that many hashes run at once, whatever the number of request threads, and
+the rest wait their turn. With the setting at 0 (the default) they hash
+inline, exactly like the Django hashers they extend.
+
+The pooled hashers keep the algorithm names of their bases. Existing hashes
+therefore verify unchanged, and Django's usual rehash-on-login upgrades them
+to whichever hasher comes first in `PASSWORD_HASHERS`.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, PBKDF2PasswordHasher
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    workers = getattr(settings, 'SHOP_PASSWORD_HASH_WORKERS', 0)
+    if not workers:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # Spawned, not forked: the parent has threads and open connections
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+@receiver(setting_changed)
+def reset_pool(setting, **kwargs):
+    if setting == 'SHOP_PASSWORD_HASH_WORKERS':
+        shutdown_pool()
+
+
+def call_hasher(path, method, *args):
+    # Runs in the pool; only needs the hasher class, not Django settings
+    return getattr(import_string(path)(), method)(*args)
+
+
+def run(path, method, *args):
+    pool = get_pool()
+    if pool is None:
+        return call_hasher(path, method, *args)
+    try:
+        return pool.submit(call_hasher, path, method, *args).result()
+    except BrokenProcessPool:
+        logger.exception("Password hashing pool died; hashing inline")
+        shutdown_pool()
+        return call_hasher(path, method, *args)
+
+
+class PooledHasherMixin:
+    base = None  # dotted path of the hasher doing the work
+
+    def encode(self, password, salt, *args):
+        return run(self.base, 'encode', password, salt, *args)
+
+    def verify(self, password, encoded):
+        return run(self.base, 'verify', password, encoded)
+
+
+class PooledPBKDF2PasswordHasher(PooledHasherMixin, PBKDF2PasswordHasher):
+    base = 'django.contrib.auth.hashers.PBKDF2PasswordHasher'
+
+
+class PooledArgon2PasswordHasher(PooledHasherMixin, Argon2PasswordHasher):
+    base = 'django.contrib.auth.hashers.Argon2PasswordHasher'
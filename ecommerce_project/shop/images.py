@@ -0,0 +1,162 @@
+"""
+Resized WebP and JPEG copies of the catalogue images.
+
+`image_url` values like "/images/automotive.jpg" point at full-size originals,
+some of them megabytes, and every product repeats its category's image. For
+each local original, `build_variants()` writes one copy per width in
+`VARIANTS`, as WebP and as progressive JPEG, to the `shop_images` storage. It
+never upscales. Each file name includes a hash of the file's bytes, so a
+changed image gets a new URL and the files can be cached forever.
+
+`ImageVariantMiddleware` serves them, and the collected static files, with
+WhiteNoise. Variant URLs get a far-future immutable Cache-Control. Outside
+DEBUG, WhiteNoise indexes the files when the process starts, so restart
+the web processes after building new variants. Servers with a local
+filesystem can instead map /media/images/ to MEDIA_ROOT/images in the web
+server, with `expires max` or an equivalent immutable header. Hosts with an
+ephemeral filesystem need a shared backend (S3 and a CDN, say) for the
+`shop_images` storage. Without WhiteNoise, `views.serve_image` serves them
+in DEBUG only.
+
+Rows keep the result in `image_variants`:
+
+    {"card": {"webp": "/media/images/books.card.3f2a….webp",
+              "jpeg": "/media/images/books.card.91c0….jpg",
+              "width": 480, "height": 320}, ...}
+
+"webp" is left out when it would not be smaller than the JPEG. Pages fall
+back to `image_url` while a row has no variants. Pillow is optional; without
+it no variants are built.
+"""
+import hashlib
+import io
+from pathlib import Path
+from urllib.parse import unquote, urlparse
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.utils.text import slugify
+
+from .models import Category, Product
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+try:
+    from whitenoise.middleware import WhiteNoiseMiddleware
+except ImportError:
+    WhiteNoiseMiddleware = None
+
+# Largest width of each variant, in pixels
+VARIANTS = {'thumb': 160, 'card': 480, 'full': 1200}
+FORMATS = {
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 6}),
+}
+SOURCE_PREFIX = '/images/'
+ORIENTATION = 0x0112  # EXIF tag
+
+
+def get_storage():
+    return storages['shop_images']
+
+
+def source_path(image_url):
+    """The original file behind a local image_url, or None for remote or missing images."""
+    if not image_url:
+        return None
+    parsed = urlparse(image_url)
+    path = unquote(parsed.path)
+    if parsed.scheme or parsed.netloc or not path.startswith(SOURCE_PREFIX):
+        return None
+    name = path[len(SOURCE_PREFIX):]
+    for directory in getattr(settings, 'SHOP_IMAGE_SOURCE_DIRS', []):
+        directory = Path(directory).resolve()
+        candidate = (directory / name).resolve()
+        if candidate.is_relative_to(directory) and candidate.is_file():
+            return candidate
+    return None
+
+
+def encode(image, fmt):
+    format, _, options = FORMATS[fmt]
+    buffer = io.BytesIO()
+    image.save(buffer, format, **options)
+    return buffer.getvalue()
+
+
+def build_variants(path, storage=None):
+    """Write every variant of the image at `path`; the `image_variants` value for it."""
+    storage = storage or get_storage()
+    with Image.open(path) as original:
+        source_format = original.format
+        upright = original.getexif().get(ORIENTATION, 1) == 1
+        image = ImageOps.exif_transpose(original).convert('RGB')
+    source = Path(path).read_bytes()
+    stem = slugify(Path(path).stem) or 'image'
+    variants = {}
+    by_size = {}
+    for name, width in VARIANTS.items():
+        resized = image
+        if image.width > width:
+            resized = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        if resized.size in by_size:
+            # Small originals come out the same at several widths; store them once
+            variants[name] = by_size[resized.size]
+            continue
+        variant = by_size[resized.size] = {'width': resized.width, 'height': resized.height}
+        sizes = {}
+        for fmt, (format, extension, _) in FORMATS.items():
+            content = encode(resized, fmt)
+            if resized is image and upright and source_format == format and len(source) < len(content):
+                # Re-encoding an already small original only makes it bigger
+                content = source
+            if fmt == 'webp' and len(content) >= sizes['jpeg']:
+                # Happens with small, already well-compressed JPEGs; the JPEG alone is served
+                continue
+            sizes[fmt] = len(content)
+            filename = f"{stem}.{name}.{hashlib.sha256(content).hexdigest()[:12]}.{extension}"
+            if not storage.exists(filename):
+                filename = storage.save(filename, ContentFile(content))
+            variant[fmt] = storage.url(filename)
+        variants[name] = variant
+    return variants
+
+
+def stored_size(url, storage=None):
+    """Bytes of the stored file behind a variant URL."""
+    return (storage or get_storage()).size(url.rsplit('/', 1)[-1])
+
+
+def known_variants(urls=None):
+    """image_url -> its recorded variants, for each of `urls` (every image if None) some row has variants of."""
+    known = {}
+    for model in (Category, Product):
+        rows = model.objects.exclude(image_variants={}).exclude(image_url=None)
+        if urls is not None:
+            rows = rows.filter(image_url__in=urls)
+        # Rows showing the same image share its variants, so this is one pair per image
+        for url, variants in rows.order_by().values_list('image_url', 'image_variants').distinct():
+            known.setdefault(url, variants)
+    return known
+
+
+if WhiteNoiseMiddleware is not None:
+    class ImageVariantMiddleware(WhiteNoiseMiddleware):
+        """WhiteNoise, also serving the `shop_images` storage at its base URL."""
+
+        def __init__(self, get_response=None, settings=settings):
+            storage = get_storage()
+            # Set first: indexing the static files already calls immutable_file_test
+            self.variant_prefix = storage.base_url
+            super().__init__(get_response, settings)
+            location = getattr(storage, 'location', None)
+            if location and (self.autorefresh or Path(location).is_dir()):
+                self.add_files(location, prefix=self.variant_prefix)
+
+        def immutable_file_test(self, path, url):
+            # Variant names carry a hash of their content
+            return url.startswith(self.variant_prefix) or super().immutable_file_test(path, url)
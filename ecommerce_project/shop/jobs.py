@@ -0,0 +1,153 @@
+"""
+A small in-process job queue backed by the `Job` outbox table.
+
+`enqueue()` writes a Job row inside the caller's transaction, so the job
+exists if and only if the work that queued it committed. Once the
+transaction commits, the job is handed to a thread pool; failures are
+retried with exponential backoff, and anything the process never got to
+(a crash, a restart, a retry that came due) is picked up by
+`manage.py run_jobs`.
+
+`SHOP_JOBS_MODE` picks how committed jobs are dispatched:
+
+* ``'thread'`` (default) - run on a process-local thread pool
+* ``'sync'`` - run immediately in the committing thread (tests, scripts)
+* ``'worker'`` - only queue them; a `run_jobs` process executes them
+
+Outside thread mode, retries wait for `run_jobs`. A job may run more than
+once if a worker dies mid-run, so handlers should be idempotent.
+"""
+import logging
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+handlers = {}
+
+
+def job(name, max_attempts=5):
+    """Register the decorated function as the handler for jobs called `name`."""
+    def register(func):
+        handlers[name] = (func, max_attempts)
+        return func
+    return register
+
+
+def enqueue(name, **payload):
+    """Queue `name(**payload)` to run after the current transaction commits."""
+    if name not in handlers:
+        raise KeyError(f"No job handler registered for '{name}'")
+    queued = Job.objects.create(name=name, payload=payload, max_attempts=handlers[name][1])
+    transaction.on_commit(lambda: dispatch(queued.pk))
+    return queued
+
+
+def jobs_mode():
+    return getattr(settings, 'SHOP_JOBS_MODE', 'thread')
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = getattr(settings, 'SHOP_JOBS_THREADS', 4)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='shop-jobs')
+    return _executor
+
+
+def dispatch(job_id, delay=0):
+    mode = jobs_mode()
+    if mode == 'sync' and not delay:
+        run_job(job_id)
+    elif mode == 'thread':
+        if delay:
+            timer = threading.Timer(delay, dispatch, [job_id])
+            timer.daemon = True
+            timer.start()
+        else:
+            get_executor().submit(run_in_thread, job_id)
+
+
+def run_in_thread(job_id):
+    # Pool threads keep their own connections; drop them once they go stale
+    close_old_connections()
+    try:
+        run_job(job_id)
+    except Exception:
+        logger.exception("Job %s crashed the worker", job_id)
+    finally:
+        close_old_connections()
+
+
+def claim(job_id):
+    """Mark a due pending job as running; False if another worker got there first."""
+    now = timezone.now()
+    return bool(
+        Job.objects.filter(pk=job_id, status=Job.PENDING, run_at__lte=now)
+        .update(status=Job.RUNNING, attempts=F('attempts') + 1, locked_at=now)
+    )
+
+
+def retry_delay(attempts):
+    base = getattr(settings, 'SHOP_JOBS_RETRY_DELAY', 5)
+    return base * 2 ** (attempts - 1)
+
+
+def run_job(job_id):
+    """Claim and run one job. Returns the job's new status, or None if it was not claimed."""
+    if not claim(job_id):
+        return None
+    queued = Job.objects.get(pk=job_id)
+    func = handlers.get(queued.name, (None,))[0]
+    try:
+        if func is None:
+            raise KeyError(f"No job handler registered for '{queued.name}'")
+        func(**queued.payload)
+    except Exception:
+        error = traceback.format_exc()
+        if queued.attempts >= queued.max_attempts:
+            logger.error("Job %s (%s) failed for good:\n%s", queued.pk, queued.name, error)
+            Job.objects.filter(pk=job_id).update(status=Job.FAILED, last_error=error, locked_at=None)
+            return Job.FAILED
+        delay = retry_delay(queued.attempts)
+        Job.objects.filter(pk=job_id).update(
+            status=Job.PENDING, last_error=error, locked_at=None,
+            run_at=timezone.now() + timedelta(seconds=delay),
+        )
+        dispatch(job_id, delay=delay)
+        return Job.PENDING
+
+    Job.objects.filter(pk=job_id).update(status=Job.DONE, last_error='', locked_at=None)
+    return Job.DONE
+
+
+def release_stale(lease=None):
+    """Put jobs whose worker died mid-run back in the queue."""
+    lease = lease if lease is not None else getattr(settings, 'SHOP_JOBS_LEASE', 300)
+    cutoff = timezone.now() - timedelta(seconds=lease)
+    return Job.objects.filter(status=Job.RUNNING, locked_at__lt=cutoff).update(status=Job.PENDING, locked_at=None)
+
+
+def run_pending(limit=100):
+    """Run up to `limit` due jobs in this thread. Returns how many were run."""
+    release_stale()
+    due = Job.objects.filter(status=Job.PENDING, run_at__lte=timezone.now()).order_by('run_at', 'pk')
+    ran = 0
+    for job_id in due.values_list('pk', flat=True)[:limit]:
+        if run_job(job_id) is not None:
+            ran += 1
+    return ran
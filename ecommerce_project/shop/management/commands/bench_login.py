@@ -0,0 +1,55 @@
+import importlib.util
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from shop.benchmarking import login_throughput, percentile, time_call
+from shop.throttling import check_login
+
+CONFIGURATIONS = [
+    # (label, PASSWORD_HASHERS, uses the process pool)
+    ('pbkdf2 (Django default)', ['django.contrib.auth.hashers.PBKDF2PasswordHasher'], False),
+    ('pbkdf2 pooled', ['shop.hashers.PooledPBKDF2PasswordHasher'], True),
+    ('argon2', ['django.contrib.auth.hashers.Argon2PasswordHasher'], False),
+    ('argon2 pooled', ['shop.hashers.PooledArgon2PasswordHasher'], True),
+]
+
+
+class Command(BaseCommand):
+    help = "Compare login throughput per core across password hashers, inline and process-pooled"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=40)
+        parser.add_argument('--concurrency', type=int, default=8, help="Request threads logging in at once")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Hashing processes for the pooled runs")
+        parser.add_argument('--burst', type=int, default=1000, help="Attempts in the throttled-burst check")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{os.cpu_count()} CPU(s), {options['concurrency']} threads, {options['logins']} logins each")
+        for label, hashers, pooled in CONFIGURATIONS:
+            if 'argon2' in label and importlib.util.find_spec('argon2') is None:
+                self.stdout.write(f"{label:<24} skipped: argon2-cffi is not installed")
+                continue
+            result = login_throughput(
+                hashers, workers=options['workers'] if pooled else 0,
+                logins=options['logins'], concurrency=options['concurrency'],
+            )
+            self.stdout.write(
+                f"{label:<24} {result['logins_per_second']:7.2f} logins/s "
+                f"({result['logins_per_second_per_core']:.2f}/core) "
+                f"p50={result['p50_ms']:8.1f}ms p95={result['p95_ms']:8.1f}ms"
+            )
+
+        # A burst against one username: everything past the limit is refused without hashing
+        request = RequestFactory().post('/api/token/', REMOTE_ADDR='203.0.113.7')
+        username = f"bench-burst-{time.time_ns()}"
+        with override_settings(SHOP_LOGIN_RATE_IP=None):
+            timings = [time_call(check_login, request, username) for _ in range(options['burst'])]
+        refused = [elapsed * 1000 for elapsed, wait in timings if wait is not None]
+        self.stdout.write(
+            f"throttled burst          {len(refused)}/{options['burst']} refused, "
+            f"p50={percentile(refused, 50):.3f}ms per refused attempt"
+        )
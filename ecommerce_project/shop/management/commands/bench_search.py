@@ -0,0 +1,50 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from shop.benchmarking import ADJECTIVES, NOUNS, generate_catalog, percentile, time_call
+from shop.models import Product
+from shop.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Compare search latency of the full-text backend against the icontains filter"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=200_000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--page-size', type=int, default=24)
+        parser.add_argument('--keep', action='store_true', help="Keep the generated catalog instead of rolling it back")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.stdout.write(f"Generating {options['products']} products...")
+            generate_catalog(options['products'])
+            backend = get_search_backend()
+            backend.rebuild()
+
+            rng = random.Random(1)
+            words = ADJECTIVES + NOUNS
+            # Mix whole words with the short prefixes a search-as-you-type box sends
+            queries = [rng.choice(words)[:rng.randint(3, 8)] for _ in range(options['queries'])]
+            size = options['page_size']
+
+            def contains(query):
+                return list(Product.objects.filter(
+                    Q(name__icontains=query) | Q(description__icontains=query)
+                ).order_by('-created_at', '-id')[:size])
+
+            def indexed(query):
+                return list(backend.search(Product.objects.all(), query).order_by('search_rank', 'id')[:size])
+
+            for label, func in (('icontains', contains), (type(backend).__name__, indexed)):
+                samples = [time_call(func, query)[0] * 1000 for query in queries]
+                self.stdout.write(
+                    f"{label:<24} p50={percentile(samples, 50):8.2f}ms "
+                    f"p95={percentile(samples, 95):8.2f}ms max={max(samples):8.2f}ms"
+                )
+
+            if not options['keep']:
+                transaction.set_rollback(True)
@@ -0,0 +1,52 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models.functions import Now
+
+from shop import images
+from shop.cache import bump_version
+from shop.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = "Write resized WebP/JPEG variants of local category and product images and record them on the rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Rebuild images that already have variants")
+
+    def handle(self, *args, **options):
+        if images.Image is None:
+            raise CommandError("Building image variants needs Pillow (pip install Pillow)")
+
+        models = (Category, Product)
+        urls = set()
+        for model in models:
+            rows = model.objects.exclude(image_url=None).exclude(image_url='')
+            if not options['force']:
+                rows = rows.filter(image_variants={})
+            urls.update(rows.order_by().values_list('image_url', flat=True).distinct())
+
+        started = time.perf_counter()
+        built = updated = 0
+        for url in sorted(urls):
+            path = images.source_path(url)
+            if path is None:
+                self.stderr.write(f"Skipped {url}: not a local image")
+                continue
+            variants = images.build_variants(path)
+            # Every row showing this image shares one set of files; products also
+            # move updated_at, which their ETag and Last-Modified are built from
+            updated += Category.objects.filter(image_url=url).update(image_variants=variants)
+            updated += Product.objects.filter(image_url=url).update(image_variants=variants, updated_at=Now())
+            built += 1
+            card = variants['card']
+            size = images.stored_size(card.get('webp', card['jpeg']))
+            self.stdout.write(f"{url}: {path.stat().st_size / 1024:,.0f} KB original, {size / 1024:,.1f} KB card")
+
+        if updated:
+            bump_version(*models)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Built variants of {built} images for {updated} rows in {elapsed:.1f}s"))
+        if built and not settings.DEBUG:
+            self.stdout.write("Restart the web processes so WhiteNoise serves the new files")
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.feeds import FORMATS, export_rows, guess_format, write_feed
+from shop.models import Product
+
+
+class Command(BaseCommand):
+    help = "Stream every product to a CSV or JSON Lines feed"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-', help="Feed file, or - to write to stdout")
+        parser.add_argument('--format', choices=FORMATS, help="Defaults to the file extension, then csv")
+        parser.add_argument('--category', help="Only export products in this category slug")
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        path = options['output']
+        fmt = options['format'] or guess_format(path)
+        queryset = Product.objects.all()
+        if options['category']:
+            queryset = queryset.filter(category__slug=options['category'])
+
+        count = 0
+
+        def counted(rows):
+            nonlocal count
+            for count, row in enumerate(rows, 1):
+                yield row
+
+        started = time.perf_counter()
+        rows = counted(export_rows(queryset, chunk_size=options['chunk_size']))
+        if path == '-':
+            write_feed(self.stdout, rows, fmt)
+        else:
+            with open(path, 'w', newline='', encoding='utf-8') as stream:
+                write_feed(stream, rows, fmt)
+        elapsed = time.perf_counter() - started
+        self.stderr.write(f"Exported {count} products in {elapsed:.1f}s ({count / elapsed if elapsed else 0:,.0f} rows/s)")
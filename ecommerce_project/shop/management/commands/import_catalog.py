@@ -0,0 +1,47 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.feeds import FORMATS, CatalogImporter, FeedError, guess_format, read_feed
+
+
+class Command(BaseCommand):
+    help = "Upsert products from a CSV or JSON Lines feed in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Feed file, or - to read from stdin")
+        parser.add_argument('--format', choices=FORMATS, help="Defaults to the file extension, then csv")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--create-categories', action='store_true', help="Create categories missing from the database")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+
+        def progress(count, rate):
+            self.stderr.write(f"{count} rows imported ({rate:,.0f} rows/s)")
+
+        importer = CatalogImporter(
+            batch_size=options['batch_size'],
+            create_categories=options['create_categories'],
+            progress=progress,
+        )
+        started = time.perf_counter()
+        try:
+            if path == '-':
+                importer.import_rows(read_feed(sys.stdin, fmt))
+            else:
+                with open(path, newline='', encoding='utf-8') as stream:
+                    importer.import_rows(read_feed(stream, fmt))
+        except (OSError, FeedError) as exc:
+            raise CommandError(str(exc))
+        elapsed = time.perf_counter() - started
+
+        for line, error in importer.errors[:20]:
+            self.stderr.write(f"row {line}: {error}")
+        if len(importer.errors) > 20:
+            self.stderr.write(f"... and {len(importer.errors) - 20} more rejected rows")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {importer.imported} products in {elapsed:.1f}s, rejected {len(importer.errors)} rows"
+        ))
@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+import httpx
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.benchmarking import percentile
+
+
+class Command(BaseCommand):
+    help = "Fire concurrent GET requests at running servers and report requests/sec and latency percentiles"
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+', help="Full URLs to compare, e.g. the WSGI and ASGI servers")
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--header', action='append', default=[], help="Extra 'Name: value' request header")
+
+    def handle(self, *args, **options):
+        headers = dict(header.split(':', 1) for header in options['header'])
+        headers = {name.strip(): value.strip() for name, value in headers.items()}
+        for url in options['urls']:
+            result = asyncio.run(self.run(url, options['concurrency'], options['requests'], headers))
+            self.stdout.write(
+                f"{url}\n  {result['rps']:8.1f} req/s  p50={result['p50']:7.2f}ms "
+                f"p95={result['p95']:7.2f}ms p99={result['p99']:7.2f}ms errors={result['errors']}"
+            )
+
+    async def run(self, url, concurrency, total, headers):
+        samples, errors = [], 0
+        remaining = iter(range(total))
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+        async def worker(client):
+            nonlocal errors
+            for _ in remaining:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(url)
+                    if response.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                samples.append((time.perf_counter() - start) * 1000)
+
+        async with httpx.AsyncClient(headers=headers, limits=limits, timeout=30) as client:
+            try:
+                await client.get(url)  # warm up connections and caches
+            except httpx.HTTPError as exc:
+                raise CommandError(f"{url}: {exc}")
+            started = time.perf_counter()
+            await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+
+        return {
+            'rps': total / elapsed,
+            'p50': percentile(samples, 50),
+            'p95': percentile(samples, 95),
+            'p99': percentile(samples, 99),
+            'errors': errors,
+        }
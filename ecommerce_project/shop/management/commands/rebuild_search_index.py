@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from shop.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product search index from the Product table"
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt search index with {type(backend).__name__}"))
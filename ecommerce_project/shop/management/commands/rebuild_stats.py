@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from shop.stats import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the admin dashboard rollups from the order, user, review and product tables"
+
+    def handle(self, *args, **options):
+        rows = rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} rollup rows"))
@@ -0,0 +1,123 @@
+import json
+import platform
+import random
+import subprocess
+from datetime import datetime, timezone
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+
+from shop.benchmarking import (
+    SCENARIOS, HttpClient, InProcessClient, Recorder, compare_results, dataset_marks, delete_dataset, generate_dataset,
+)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True, cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = "Generate a reproducible dataset, replay shopper scenarios and report latency and queries per step"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='shopper')
+        parser.add_argument('--iterations', type=int, default=100)
+        parser.add_argument('--categories', type=int, default=10)
+        parser.add_argument('--products', type=int, default=5000)
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--orders', type=int, default=500)
+        parser.add_argument('--reviews', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--base-url', help="Drive a running server over HTTP instead of the in-process test client. "
+                                               "The dataset is committed to this project's database, which the server must share.")
+        parser.add_argument('--output', help="Write the results to this JSON file")
+        parser.add_argument('--compare', help="Flag regressions against a previous results file")
+        parser.add_argument('--threshold', type=float, default=0.10, help="Latency growth counted as a regression")
+        parser.add_argument('--keep', action='store_true', help="Keep the generated data instead of deleting it afterwards")
+
+    def handle(self, *args, **options):
+        params = {key: options[key] for key in ('scenario', 'iterations', 'categories', 'products', 'users', 'orders', 'reviews', 'seed')}
+        marks = dataset_marks()
+        self.stdout.write("Generating dataset...")
+        with transaction.atomic():
+            dataset = generate_dataset(
+                options['categories'], options['products'], options['users'], options['orders'], options['reviews'], options['seed'],
+            )
+        # Scenarios run on committed data, so checkouts invalidate the cache
+        # and queue jobs as they would in production
+        try:
+            self.run(options, dataset, params)
+        finally:
+            if not options['keep']:
+                self.stdout.write("Deleting dataset...")
+                with transaction.atomic():
+                    delete_dataset(marks)
+
+    def run(self, options, dataset, params):
+        rng = random.Random(options['seed'])
+        scenario = SCENARIOS[options['scenario']]
+        recorder = Recorder(count_queries=not options['base_url'])
+        clients = {}
+
+        def client_for(user):
+            if user.pk not in clients:
+                if options['base_url']:
+                    clients[user.pk] = HttpClient(options['base_url'], user.username)
+                else:
+                    clients[user.pk] = InProcessClient(user)
+            return clients[user.pk]
+
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for _ in range(options['iterations']):
+                scenario(rng, client_for(rng.choice(dataset['users'])), recorder)
+
+        results = recorder.summary()
+        self.report(results)
+        document = {
+            'meta': {
+                'commit': git_commit(),
+                'created_at': datetime.now(timezone.utc).isoformat(),
+                'mode': 'http' if options['base_url'] else 'in-process',
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'params': params,
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as stream:
+                json.dump(document, stream, indent=2)
+            self.stdout.write(f"Wrote {options['output']}")
+        if options['compare']:
+            self.compare(options['compare'], results, options['threshold'])
+
+    def report(self, results):
+        self.stdout.write(f"{'step':<20} {'n':>5} {'p50':>9} {'p95':>9} {'p99':>9} {'queries':>8}")
+        for step, row in results.items():
+            queries = '-' if row['queries_per_request'] is None else f"{row['queries_per_request']:.1f}"
+            self.stdout.write(
+                f"{step:<20} {row['requests']:>5} {row['p50_ms']:>7.2f}ms {row['p95_ms']:>7.2f}ms "
+                f"{row['p99_ms']:>7.2f}ms {queries:>8}"
+            )
+
+    def compare(self, path, results, threshold):
+        try:
+            with open(path) as stream:
+                baseline = json.load(stream)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Cannot read {path}: {exc}")
+        regressions = list(compare_results(baseline['results'], results, threshold))
+        commit = baseline['meta'].get('commit') or path
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {commit}"))
+        for step, field, before, after in regressions:
+            self.stdout.write(self.style.WARNING(f"{step}: {field} {before} -> {after} (vs {commit})"))
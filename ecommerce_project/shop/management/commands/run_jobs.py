@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.jobs import run_pending
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs: retries that came due and anything the web process never got to"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Drain the due jobs once and exit")
+        parser.add_argument('--interval', type=float, default=2.0, help="Seconds to sleep when the queue is empty")
+        parser.add_argument('--batch', type=int, default=100)
+
+    def handle(self, *args, **options):
+        while True:
+            ran = run_pending(limit=options['batch'])
+            if ran:
+                self.stdout.write(f"Ran {ran} jobs")
+            if options['once']:
+                return
+            if not ran:
+                time.sleep(options['interval'])
@@ -0,0 +1,275 @@
+"""
+Per-view request metrics, exported in the Prometheus text format.
+
+`PerformanceMiddleware` times every request into a latency histogram and
+records its response size. A sampled fraction of requests
+(`SHOP_METRICS_SAMPLE_RATE`) is also instrumented in detail. For those, the
+query count and database time come from an execute wrapper installed on
+every connection, and the JSON encoding time comes from the renderer. The
+breakdown is returned in a `Server-Timing` header.
+
+Metrics are kept per process. Under several gunicorn/uvicorn workers,
+scrape each worker or aggregate them in Prometheus.
+"""
+import ipaddress
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+_sample = ContextVar('shop_metrics_sample', default=None)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f'{name}_sum{{{labels}}} {self.sum}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+class Registry:
+    """Thread-safe store of the request metrics, keyed by label values."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+            self.queries = defaultdict(lambda: Histogram(QUERY_BUCKETS))
+            self.counters = defaultdict(float)
+
+    def observe(self, view, method, status, duration, size, sample=None):
+        with self._lock:
+            self.latency[(view, method, str(status))].observe(duration)
+            self.counters[('shop_response_bytes_total', view)] += size
+            if sample is not None:
+                self.queries[(view,)].observe(sample.queries)
+                self.counters[('shop_sampled_requests_total', view)] += 1
+                self.counters[('shop_db_query_seconds_total', view)] += sample.db_time
+                self.counters[('shop_serialize_seconds_total', view)] += sample.serialize_time
+
+    def add_bytes(self, view, size):
+        with self._lock:
+            self.counters[('shop_response_bytes_total', view)] += size
+
+    def render(self):
+        with self._lock:
+            lines = [
+                '# HELP shop_request_duration_seconds Request latency by view.',
+                '# TYPE shop_request_duration_seconds histogram',
+            ]
+            for (view, method, status), histogram in sorted(self.latency.items()):
+                lines += histogram.lines(
+                    'shop_request_duration_seconds', f'view="{view}",method="{method}",status="{status}"'
+                )
+            lines += [
+                '# HELP shop_db_queries Database queries per sampled request.',
+                '# TYPE shop_db_queries histogram',
+            ]
+            for (view,), histogram in sorted(self.queries.items()):
+                lines += histogram.lines('shop_db_queries', f'view="{view}"')
+            for name, help_text in (
+                ('shop_response_bytes_total', 'Response body bytes sent.'),
+                ('shop_sampled_requests_total', 'Requests instrumented in detail.'),
+                ('shop_db_query_seconds_total', 'Database time of sampled requests.'),
+                ('shop_serialize_seconds_total', 'JSON encoding time of sampled requests.'),
+            ):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                lines += [
+                    f'{name}{{view="{view}"}} {value}'
+                    for (metric, view), value in sorted(self.counters.items()) if metric == name
+                ]
+            return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class Sample:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+
+    def server_timing(self, duration):
+        return ', '.join([
+            f'app;dur={duration * 1000:.1f}',
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+            f'serialize;dur={self.serialize_time * 1000:.1f}',
+        ])
+
+
+def record_query(execute, sql, params, many, context):
+    sample = _sample.get()
+    if sample is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        sample.queries += 1
+        sample.db_time += time.perf_counter() - start
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    # The wrapper costs one ContextVar lookup on requests that are not sampled
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def timed_serialization():
+    sample = _sample.get()
+    if sample is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        sample.serialize_time += time.perf_counter() - start
+
+
+def view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route
+
+
+def response_size(response):
+    """Body size if known up front; None for streams, which are counted as they are sent."""
+    if not response.streaming:
+        return len(response.content)
+    if response.has_header('Content-Length'):
+        # Files keep their sendfile path instead of being wrapped
+        return int(response['Content-Length'])
+    return None
+
+
+def counted(chunks, view):
+    size = 0
+    try:
+        for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+    finally:
+        registry.add_bytes(view, size)
+
+
+async def acounted(chunks, view):
+    size = 0
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+    finally:
+        registry.add_bytes(view, size)
+
+
+class PerformanceMiddleware:
+    """Time every request and instrument a sample of them in detail."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'SHOP_METRICS_SAMPLE_RATE', 0.1)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        sample, token, start = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            if token is not None:
+                _sample.reset(token)
+        return self.finish(request, response, sample, start)
+
+    async def __acall__(self, request):
+        sample, token, start = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            if token is not None:
+                _sample.reset(token)
+        return self.finish(request, response, sample, start)
+
+    def start(self):
+        sample = Sample() if random.random() < self.sample_rate else None
+        token = _sample.set(sample) if sample is not None else None
+        return sample, token, time.perf_counter()
+
+    def finish(self, request, response, sample, start):
+        duration = time.perf_counter() - start
+        view = view_label(request)
+        size = response_size(response)
+        if size is None:
+            wrap = acounted if response.is_async else counted
+            response.streaming_content = wrap(response.streaming_content, view)
+        registry.observe(view, request.method, response.status_code, duration, size or 0, sample)
+        if sample is not None:
+            response['Server-Timing'] = sample.server_timing(duration)
+        return response
+
+
+def is_loopback(request):
+    """Whether the request came straight from this host, not through a proxy."""
+    if 'X-Forwarded-For' in request.headers:
+        return False
+    try:
+        return ipaddress.ip_address(request.META.get('REMOTE_ADDR', '')).is_loopback
+    except ValueError:
+        return False
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint. With `SHOP_METRICS_TOKEN` set it needs that
+    bearer token; without it only staff and scrapers on this host get in.
+    """
+    token = getattr(settings, 'SHOP_METRICS_TOKEN', None)
+    if token:
+        allowed = request.headers.get('Authorization') == f'Bearer {token}'
+    else:
+        allowed = request.user.is_staff or is_loopback(request)
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
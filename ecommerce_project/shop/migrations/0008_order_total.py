@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:49
+
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+
+
+def snapshot_completed_totals(apps, schema_editor):
+    Order = apps.get_model('shop', 'Order')
+    line_total = ExpressionWrapper(
+        F('items__quantity') * F('items__product__price'),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+    orders = Order.objects.filter(complete=True, total__isnull=True).annotate(items_total=Sum(line_total))
+    for order in orders.iterator(chunk_size=2000):
+        Order.objects.filter(pk=order.pk).update(total=order.items_total or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0007_category_image_url'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.RunPython(snapshot_completed_totals, migrations.RunPython.noop),
+    ]
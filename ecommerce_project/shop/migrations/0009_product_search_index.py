@@ -0,0 +1,44 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:20
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS shop_product_fts "
+            "USING fts5(name, description, tokenize='unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            "INSERT INTO shop_product_fts (rowid, name, description) "
+            "SELECT id, name, description FROM shop_product"
+        )
+    elif connection.vendor == 'postgresql':
+        from django.contrib.postgres.indexes import GinIndex
+        from django.contrib.postgres.search import SearchVector
+
+        Product = apps.get_model('shop', 'Product')
+        schema_editor.add_index(
+            Product,
+            GinIndex(SearchVector('name', 'description', config='english'), name='shop_product_search_gin'),
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS shop_product_fts")
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS shop_product_search_gin")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0008_order_total'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
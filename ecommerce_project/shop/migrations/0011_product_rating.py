@@ -0,0 +1,40 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:52
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, FloatField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_rating(apps, schema_editor):
+    Product = apps.get_model('shop', 'Product')
+    Review = apps.get_model('shop', 'Review')
+    reviews = Review.objects.filter(product=OuterRef('pk')).order_by().values('product')
+    Product.objects.update(
+        review_count=Coalesce(Subquery(reviews.annotate(n=Count('pk')).values('n')), 0),
+        rating_avg=Coalesce(Subquery(reviews.annotate(avg=Avg('rating')).values('avg')), 0.0, output_field=FloatField()),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0010_product_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_avg',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['rating_avg', 'id'], name='shop_product_rating_idx'),
+        ),
+        migrations.RunPython(backfill_rating, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:20
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def rename_duplicates(apps, schema_editor):
+    # Keep the oldest row's name; later duplicates get their id appended so
+    # nothing that references them (order items, reviews) is lost.
+    Product = apps.get_model('shop', 'Product')
+    duplicates = (
+        Product.objects.values('category', 'name').annotate(n=Count('id')).filter(n__gt=1)
+    )
+    for dup in duplicates:
+        extra = Product.objects.filter(category=dup['category'], name=dup['name']).order_by('id')[1:]
+        for product in extra:
+            product.name = f"{product.name[:190]} ({product.pk})"
+            product.save(update_fields=['name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0011_product_rating'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.UniqueConstraint(fields=('category', 'name'), name='shop_product_category_name_uniq'),
+        ),
+    ]
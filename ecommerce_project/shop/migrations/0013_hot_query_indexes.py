@@ -0,0 +1,69 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:58
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def merge_open_carts(apps, schema_editor):
+    # Fold every extra open order into the user's newest one before the
+    # partial unique constraint goes on.
+    Order = apps.get_model('shop', 'Order')
+    OrderItem = apps.get_model('shop', 'OrderItem')
+    users = Order.objects.filter(complete=False).values('user').annotate(n=Count('id')).filter(n__gt=1)
+    for row in users:
+        keep, *extra = Order.objects.filter(user=row['user'], complete=False).order_by('-created_at', '-id')
+        for item in OrderItem.objects.filter(order__in=extra):
+            existing = OrderItem.objects.filter(order=keep, product=item.product_id).first()
+            if existing:
+                existing.quantity += item.quantity
+                existing.save(update_fields=['quantity'])
+                item.delete()
+            else:
+                item.order = keep
+                item.save(update_fields=['order'])
+        Order.objects.filter(pk__in=[order.pk for order in extra]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0012_product_category_name_unique'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_open_carts, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['created_at', 'id'], name='shop_order_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('complete', True)), fields=['user', 'created_at', 'id'], name='shop_order_user_done_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['created_at', 'id'], name='shop_product_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['price', 'id'], name='shop_product_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('available', True)), fields=['category', 'created_at', 'id'], name='shop_product_cat_new_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('available', True)), fields=['category', 'price', 'id'], name='shop_product_cat_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', '-created_at'], name='shop_review_product_new_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(condition=models.Q(('complete', False)), fields=('user',), name='shop_order_one_open_cart'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:40
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+def move_open_orders_to_carts(apps, schema_editor):
+    Order = apps.get_model('shop', 'Order')
+    OrderItem = apps.get_model('shop', 'OrderItem')
+    Cart = apps.get_model('shop', 'Cart')
+    CartItem = apps.get_model('shop', 'CartItem')
+    for order in Order.objects.filter(complete=False):
+        items = list(OrderItem.objects.filter(order=order, quantity__gt=0).select_related('product'))
+        if items:
+            cart = Cart.objects.create(
+                user_id=order.user_id,
+                item_count=sum(item.quantity for item in items),
+                subtotal=sum(item.quantity * item.product.price for item in items),
+            )
+            CartItem.objects.bulk_create(
+                [CartItem(cart=cart, product_id=item.product_id, quantity=item.quantity) for item in items]
+            )
+    Order.objects.filter(complete=False).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0013_hot_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Cart',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('subtotal', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='cart', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CartItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('cart', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='shop.cart')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shop.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('cart', 'product'), name='shop_cartitem_unique_product')],
+            },
+        ),
+        migrations.RunPython(move_open_orders_to_carts, migrations.RunPython.noop),
+    ]
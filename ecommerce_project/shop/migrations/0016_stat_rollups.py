@@ -0,0 +1,88 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:51
+
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncHour
+from django.utils import timezone
+
+ALL_TIME = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MONEY = models.DecimalField(max_digits=12, decimal_places=2)
+
+
+def bucket_start(when, period):
+    if period == 'all':
+        return ALL_TIME
+    when = timezone.localtime(when).replace(minute=0, second=0, microsecond=0)
+    if period == 'day':
+        when = when.replace(hour=0)
+    return when
+
+
+def backfill(apps, schema_editor):
+    # A frozen copy of shop.stats.rebuild() as of this migration
+    Order = apps.get_model('shop', 'Order')
+    OrderItem = apps.get_model('shop', 'OrderItem')
+    StatRollup = apps.get_model('shop', 'StatRollup')
+    line_totals = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order').annotate(
+        sum=Sum(F('quantity') * F('product__price'), output_field=MONEY)
+    ).values('sum')
+    orders = (
+        Order.objects.filter(complete=True)
+        .annotate(
+            hour=TruncHour('created_at'),
+            amount=Coalesce('total', Subquery(line_totals, output_field=MONEY), Value(Decimal('0.00')), output_field=MONEY),
+        )
+        .values('hour', 'status')
+        .annotate(n=Count('pk'), revenue=Sum('amount'))
+    )
+    rows = []
+    for row in orders:
+        rows.append(('orders', row['status'], row['hour'], row['n']))
+        rows.append(('revenue', row['status'], row['hour'], row['revenue']))
+    for model, field, metric in (
+        (apps.get_model(settings.AUTH_USER_MODEL), 'date_joined', 'new_users'),
+        (apps.get_model('shop', 'Review'), 'created_at', 'reviews'),
+    ):
+        for row in model.objects.annotate(hour=TruncHour(field)).values('hour').annotate(n=Count('pk')):
+            rows.append((metric, '', row['hour'], row['n']))
+
+    buckets = defaultdict(Decimal)
+    for metric, dimension, hour, amount in rows:
+        for period in ('hour', 'day', 'all'):
+            buckets[(period, bucket_start(hour, period), metric, dimension)] += amount
+    buckets[('all', ALL_TIME, 'products', '')] = apps.get_model('shop', 'Product').objects.count()
+    StatRollup.objects.bulk_create(
+        [StatRollup(period=period, start=start, metric=metric, dimension=dimension, value=value)
+         for (period, start, metric, dimension), value in buckets.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0015_job_outbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day'), ('all', 'All time')], max_length=4)),
+                ('start', models.DateTimeField()),
+                ('metric', models.CharField(max_length=30)),
+                ('dimension', models.CharField(blank=True, default='', max_length=30)),
+                ('value', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('period', 'start', 'metric', 'dimension'), name='shop_statrollup_unique_bucket')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -1,14 +1,51 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import Avg, Case, Count, DecimalField, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Now
 from django.contrib.auth.models import User  # default Django user
+from django.utils import timezone
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+
+def line_total_expression(prefix=''):
+    return models.ExpressionWrapper(
+        F(f'{prefix}quantity') * F(f'{prefix}product__price'), output_field=MONEY
+    )
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
     slug = models.SlugField(unique=True)
     image_url = models.URLField(blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True)  # resized copies of image_url, see shop/images.py
 
     def __str__(self):
         return self.name
 
+class ProductQuerySet(models.QuerySet):
+    def record_review(self, rating, delta=1):
+        """Fold one review in (delta=1) or out (delta=-1) of the running rating stats."""
+        count = F('review_count') + delta
+        return self.update(
+            review_count=count,
+            rating_avg=Case(
+                When(review_count__lte=-delta, then=Value(0.0)),
+                default=(F('rating_avg') * F('review_count') + delta * rating) / count,
+                output_field=FloatField(),
+            ),
+            updated_at=Now(),
+        )
+
+    def refresh_review_stats(self):
+        """Recompute the rating stats from the reviews table."""
+        reviews = Review.objects.filter(product=OuterRef('pk')).order_by().values('product')
+        return self.update(
+            review_count=Coalesce(Subquery(reviews.annotate(n=Count('pk')).values('n')), 0),
+            rating_avg=Coalesce(Subquery(reviews.annotate(avg=Avg('rating')).values('avg')), 0.0, output_field=FloatField()),
+            updated_at=Now(),
+        )
+
 class Product(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products')
     name = models.CharField(max_length=200)
@@ -16,16 +53,57 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField()
     image_url = models.URLField(blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True)
     available = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    rating_avg = models.FloatField(default=0)  # kept in step with reviews by signals
+    review_count = models.PositiveIntegerField(default=0)
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['rating_avg', 'id'], name='shop_product_rating_idx'),
+            models.Index(fields=['created_at', 'id'], name='shop_product_created_idx'),
+            models.Index(fields=['price', 'id'], name='shop_product_price_idx'),
+            # Sortable columns of the admin product grid
+            models.Index(fields=['name', 'id'], name='shop_product_name_idx'),
+            models.Index(fields=['stock', 'id'], name='shop_product_stock_idx'),
+            # Category pages only list available products
+            models.Index(
+                fields=['category', 'created_at', 'id'], condition=Q(available=True), name='shop_product_cat_new_idx'
+            ),
+            models.Index(
+                fields=['category', 'price', 'id'], condition=Q(available=True), name='shop_product_cat_price_idx'
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'name'], name='shop_product_category_name_uniq'),
+        ]
 
     def __str__(self):
         return self.name
 
+class OrderQuerySet(models.QuerySet):
+    def with_totals(self):
+        """Annotate `items_total`, preferring the snapshot taken at checkout."""
+        # A correlated subquery rather than JOIN + GROUP BY, so ordering and
+        # limits still use the order indexes and snapshotted rows skip the sum.
+        line_totals = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order').annotate(
+            sum=Sum(line_total_expression())
+        ).values('sum')
+        return self.annotate(
+            items_total=Coalesce(
+                'total', Subquery(line_totals, output_field=MONEY), Value(Decimal('0.00')), output_field=MONEY
+            )
+        )
+
 class Order(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     complete = models.BooleanField(default=False)
+    total = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)  # snapshot written at checkout
     STATUS_CHOICES = [
         ('Placed', 'Placed'),
         ('Processing', 'Processing'),
@@ -35,22 +113,88 @@ class Order(models.Model):
     ]
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Placed')  # New field
 
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='shop_order_created_idx'),
+            models.Index(fields=['user', 'created_at', 'id'], condition=Q(complete=True), name='shop_order_user_done_idx'),
+            # Filters of the admin order list
+            models.Index(fields=['status', 'created_at', 'id'], name='shop_order_status_idx'),
+            models.Index(fields=['user', 'created_at', 'id'], name='shop_order_user_idx'),
+        ]
+        constraints = [
+            # At most one open cart per user; also serves the cart lookup
+            models.UniqueConstraint(fields=['user'], condition=Q(complete=False), name='shop_order_one_open_cart'),
+        ]
+
     def __str__(self):
         return f"Order {self.id} by {self.user.username}"
 
+    def compute_total(self):
+        return self.items.aggregate(total=Coalesce(Sum(line_total_expression()), Value(Decimal('0.00')), output_field=MONEY))['total']
+
     @property
     def get_total(self):
-        return sum(item.product.price * item.quantity for item in self.items.all())
+        if self.total is not None:
+            return self.total
+        if hasattr(self, 'items_total'):
+            return self.items_total
+        if 'items' in getattr(self, '_prefetched_objects_cache', {}):
+            return sum(item.get_total for item in self.items.all())
+        return self.compute_total()
+
+class OrderItemQuerySet(models.QuerySet):
+    def with_totals(self):
+        return self.annotate(line_total=line_total_expression())
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name="items", on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.IntegerField(default=1)
 
+    objects = OrderItemQuerySet.as_manager()
+
     @property
     def get_total(self):
+        if hasattr(self, 'line_total'):
+            return self.line_total
         return self.product.price * self.quantity
 
+class CartQuerySet(models.QuerySet):
+    def refresh_summary(self):
+        """Recompute item_count and subtotal from the cart lines and current prices."""
+        items = CartItem.objects.filter(cart=OuterRef('pk')).order_by().values('cart')
+        return self.update(
+            item_count=Coalesce(Subquery(items.annotate(n=Sum('quantity')).values('n')), 0),
+            subtotal=Coalesce(
+                Subquery(items.annotate(sum=Sum(line_total_expression())).values('sum'), output_field=MONEY),
+                Value(Decimal('0.00')), output_field=MONEY,
+            ),
+        )
+
+class Cart(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='cart')
+    # Running totals so the header badge never has to read the lines
+    item_count = models.PositiveIntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = CartQuerySet.as_manager()
+
+    def __str__(self):
+        return f"Cart of {self.user.username}"
+
+class CartItem(models.Model):
+    cart = models.ForeignKey(Cart, related_name='items', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='shop_cartitem_unique_product'),
+        ]
+
 class Review(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reviews')
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -58,5 +202,60 @@ class Review(models.Model):
     comment = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', '-created_at'], name='shop_review_product_new_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.product.name}"
+class Job(models.Model):
+    """Outbox row for work that runs after the transaction that queued it commits."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='shop_job_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+class StatRollup(models.Model):
+    """
+    One precomputed dashboard number: `metric` (split by `dimension`, e.g. an
+    order status) summed over an hour, a day, or all time. Kept current
+    incrementally by shop.stats; `manage.py rebuild_stats` recomputes it.
+    """
+    HOUR = 'hour'
+    DAY = 'day'
+    ALL = 'all'
+    PERIOD_CHOICES = [(HOUR, 'Hour'), (DAY, 'Day'), (ALL, 'All time')]
+
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    start = models.DateTimeField()
+    metric = models.CharField(max_length=30)
+    dimension = models.CharField(max_length=30, blank=True, default='')
+    value = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'start', 'metric', 'dimension'], name='shop_statrollup_unique_bucket'),
+        ]
+
     def __str__(self):
-        return f"{self.user.username} - {self.product.name}"
\ No newline at end of file
+        return f"{self.metric}[{self.dimension}] {self.period} {self.start:%Y-%m-%d %H:%M} = {self.value}"
@@ -0,0 +1,154 @@
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over an `(ordering field, id)` pair.
+
+    Each page is fetched with a `WHERE (field, id) > (last field, last id)`
+    style filter instead of an OFFSET, so page N costs the same as page 1.
+    The `sort` query parameter picks the ordering, mirroring the options the
+    catalog views already accept.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    sort_query_param = 'sort'
+    page_size = 24
+    max_page_size = 100
+
+    # sort option -> (field, descending)
+    orderings = {
+        'price_asc': ('price', False),
+        'price_desc': ('price', True),
+        'newest': ('created_at', True),
+        'oldest': ('created_at', False),
+        'rating': ('rating_avg', True),
+        'relevance': ('search_rank', False),
+    }
+    fallback_sort = 'newest'
+
+    def __init__(self, default_sort=None):
+        self.default_sort = default_sort or self.fallback_sort
+
+    def get_ordering(self, request, queryset):
+        sort = request.query_params.get(self.sort_query_param) or self.default_sort
+        self.sort = sort if sort in self.orderings else self.default_sort
+        field, descending = self.orderings[self.sort]
+        if not self.is_orderable(queryset, field):
+            self.sort = self.fallback_sort
+            field, descending = self.orderings[self.sort]
+        return field, descending
+
+    def is_orderable(self, queryset, field):
+        if field in queryset.query.annotations:
+            return True
+        try:
+            queryset.model._meta.get_field(field)
+        except FieldDoesNotExist:
+            return False
+        return True
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def order_queryset(self, queryset, request):
+        self.field, self.descending = self.get_ordering(request, queryset)
+        direction = '-' if self.descending else ''
+        return queryset.order_by(f'{direction}{self.field}', f'{direction}id')
+
+    def page_queryset(self, queryset, request):
+        """The ordered, cursor-filtered slice holding this page plus one lookahead row."""
+        self.request = request
+        self.page_size_value = self.get_page_size(request)
+        queryset = self.order_queryset(queryset, request)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            value, pk = self.decode_cursor(cursor, queryset.model)
+            lookup = 'lt' if self.descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{self.field}__{lookup}': value}) | Q(**{self.field: value, f'id__{lookup}': pk})
+            )
+        return queryset[:self.page_size_value + 1]
+
+    def set_page(self, rows):
+        self.has_next = len(rows) > self.page_size_value
+        self.page = rows[:self.page_size_value]
+        return self.page
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return self.set_page([row async for row in self.page_queryset(queryset, request)])
+
+    def encode_cursor(self, instance):
+        value = getattr(instance, self.field)
+        if isinstance(value, Decimal):
+            value = str(value)
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        payload = json.dumps([value, instance.pk], separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, cursor, model):
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            try:
+                value = model._meta.get_field(self.field).to_python(value)
+            except FieldDoesNotExist:
+                pass  # annotated ordering values are stored as-is
+            return value, int(pk)
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound('Invalid cursor')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+
+class AdminOrderPagination(KeysetPagination):
+    page_size = 50
+    max_page_size = 200
+    orderings = {
+        'newest': ('created_at', True),
+        'oldest': ('created_at', False),
+    }
+
+
+class AdminProductPagination(KeysetPagination):
+    page_size = 50
+    max_page_size = 200
+    orderings = {
+        'newest': ('created_at', True),
+        'oldest': ('created_at', False),
+        'name': ('name', False),
+        '-name': ('name', True),
+        'price': ('price', False),
+        '-price': ('price', True),
+        'stock': ('stock', False),
+        '-stock': ('stock', True),
+        'rating': ('rating_avg', True),
+    }
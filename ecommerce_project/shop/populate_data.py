@@ -6,7 +6,9 @@ from django.utils.text import slugify
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce_backend.settings')
 django.setup()
 
-from .models import Category, Product
+from .cache import bump_version
+from .feeds import CatalogImporter
+from .models import Category
 
 def populate_data():
     # Categories with local image URLs
@@ -22,11 +24,13 @@ def populate_data():
          {'name': 'Fashion', 'slug': 'fashion', 'image_url': '/images/fashion.jpg'},
     ]
 
-    for cat_data in categories_data:
-        Category.objects.update_or_create(
-            slug=cat_data['slug'],
-            defaults={'name': cat_data['name'], 'image_url': cat_data['image_url']}
-        )
+    Category.objects.bulk_create(
+        [Category(**cat_data) for cat_data in categories_data],
+        update_conflicts=True,
+        unique_fields=['slug'],
+        update_fields=['name', 'image_url'],
+    )
+    bump_version(Category)
 
     # Products
     products_data = [
@@ -87,19 +91,11 @@ def populate_data():
         {'category_slug': 'automotive', 'name': 'GPS Navigator', 'description': 'Advanced GPS for accurate navigation.', 'price': 99.99, 'stock': 25},
     ]
 
+    # Same upsert path as `manage.py import_catalog`
+    images = {cat_data['slug']: cat_data['image_url'] for cat_data in categories_data}
     for prod_data in products_data:
-        category = Category.objects.get(slug=prod_data['category_slug'])
-        Product.objects.update_or_create(
-            name=prod_data['name'],
-            category=category,
-            defaults={
-                'description': prod_data['description'],
-                'price': prod_data['price'],
-                'stock': prod_data['stock'],
-                'image_url': category.image_url,
-                'available': True,
-            }
-        )
+        prod_data['image_url'] = images[prod_data['category_slug']]
+    CatalogImporter().import_rows(products_data)
 
 if __name__ == '__main__':
     populate_data()
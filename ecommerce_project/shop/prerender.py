@@ -0,0 +1,92 @@
+"""
+Hot storefront pages written to disk, for the web server to send without
+calling Django.
+
+`write_pages()` renders each path as an anonymous visitor gets it and writes
+it to <directory>/<path>/index.html. It also writes .gz and .br siblings (.br
+only when brotli is installed) for servers that serve precompressed files.
+`directory` is a symlink to the current tree in <directory>.versions/. Each run
+builds a new tree there and atomically repoints the symlink at it, then
+removes the old trees. Pages of deleted products therefore disappear, and
+the web server never sees a missing or half-written tree.
+
+Pages are only as fresh as the last run of `manage.py prerender_pages`, so
+run it after catalogue changes or from cron. Serve them only to visitors
+without a session and only for URLs without a query string, e.g. with nginx:
+
+    map "$cookie_sessionid$args" $prerendered {
+        ""      /prerendered$uri/index.html;
+        default /nonexistent;
+    }
+    location / {
+        root /srv/swapkart;
+        gzip_static on;
+        try_files $prerendered @django;
+    }
+"""
+import gzip
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+
+from .compression import brotli
+from .models import Category, Product
+
+
+def hot_paths(products=50):
+    """The home page, the product list, every category page and the `products` most reviewed products."""
+    paths = [reverse('home'), '/products/']
+    paths += [reverse('category_products', args=[slug]) for slug in Category.objects.order_by('slug').values_list('slug', flat=True)]
+    top = Product.objects.filter(available=True).order_by('-review_count', '-rating_avg', 'id').values_list('pk', flat=True)
+    paths += [reverse('product_detail', args=[pk]) for pk in top[:products]]
+    return paths
+
+
+def render_page(path):
+    request = RequestFactory().get(path)
+    request.user = AnonymousUser()
+    match = resolve(path)
+    return match.func(request, *match.args, **match.kwargs)
+
+
+def page_file(directory, path):
+    return Path(directory, *[part for part in path.split('/') if part], 'index.html')
+
+
+def write_pages(paths, directory):
+    """Render `paths` into `directory`, replacing what was there; the paths written and (path, status) of those skipped."""
+    directory = Path(directory)
+    versions = directory.with_name(directory.name + '.versions')
+    versions.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(dir=versions))
+    written, skipped = [], []
+    for path in paths:
+        response = render_page(path)
+        if response.status_code != 200:
+            skipped.append((path, response.status_code))
+            continue
+        target = page_file(staging, path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(response.content)
+        target.with_name('index.html.gz').write_bytes(gzip.compress(response.content, 9, mtime=0))
+        if brotli is not None:
+            target.with_name('index.html.br').write_bytes(brotli.compress(response.content, mode=brotli.MODE_TEXT))
+        written.append(path)
+
+    staging.chmod(0o755)
+    if directory.is_dir() and not directory.is_symlink():
+        # A tree from before the symlink layout; only this first swap is not atomic
+        shutil.rmtree(directory)
+    link = directory.with_name(directory.name + '.link')
+    link.unlink(missing_ok=True)
+    link.symlink_to(Path(versions.name, staging.name))
+    os.replace(link, directory)
+    for old in versions.iterdir():
+        if old != staging:
+            shutil.rmtree(old, ignore_errors=True)
+    return written, skipped
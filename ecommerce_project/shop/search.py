@@ -0,0 +1,143 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Product
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(query):
+    return TOKEN_RE.findall(query.lower())
+
+
+class SearchBackend:
+    """
+    Filters a `Product` queryset down to the rows matching a search query and
+    annotates them with `search_rank`, where lower values rank higher.
+    """
+
+    def search(self, queryset, query):
+        raise NotImplementedError
+
+    def index(self, product):
+        pass
+
+    def index_many(self, product_ids):
+        pass
+
+    def remove(self, product_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class ContainsSearchBackend(SearchBackend):
+    """Unindexed `icontains` matching, used when no full-text index is available."""
+
+    def search(self, queryset, query):
+        queryset = queryset.filter(Q(name__icontains=query) | Q(description__icontains=query))
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+class SQLiteFTSSearchBackend(SearchBackend):
+    """
+    Searches the `shop_product_fts` FTS5 table, ranked with bm25 and matching
+    every query term as a prefix so results update as the user types.
+    """
+    table = 'shop_product_fts'
+
+    def match_expression(self, query):
+        return " AND ".join(f'"{token}"*' for token in tokenize(query))
+
+    def search(self, queryset, query):
+        match = self.match_expression(query)
+        if not match:
+            return queryset.none()
+        table, product_table = self.table, Product._meta.db_table
+        hits = f"SELECT rowid, bm25({table}, 10.0, 1.0) AS rank FROM {table} WHERE {table} MATCH %s"
+        queryset = queryset.filter(pk__in=RawSQL(f"SELECT rowid FROM {table} WHERE {table} MATCH %s", (match,)))
+        # LIMIT -1 keeps SQLite from flattening the hits into a MATCH per product
+        # row, which is quadratic; they are ranked once and looked up by rowid
+        rank = f"SELECT rank FROM ({hits} LIMIT -1) WHERE rowid = {product_table}.id"
+        return queryset.annotate(search_rank=RawSQL(rank, (match,), output_field=FloatField()))
+
+    def index(self, product):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [product.pk])
+            cursor.execute(
+                f"INSERT INTO {self.table} (rowid, name, description) VALUES (%s, %s, %s)",
+                [product.pk, product.name, product.description],
+            )
+
+    def index_many(self, product_ids):
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+        placeholders = ", ".join(["%s"] * len(product_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid IN ({placeholders})", product_ids)
+            cursor.execute(
+                f"INSERT INTO {self.table} (rowid, name, description) "
+                f"SELECT id, name, description FROM {Product._meta.db_table} WHERE id IN ({placeholders})",
+                product_ids,
+            )
+
+    def remove(self, product_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [product_id])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            cursor.execute(
+                f"INSERT INTO {self.table} (rowid, name, description) "
+                f"SELECT id, name, description FROM {Product._meta.db_table}"
+            )
+
+
+class PostgresSearchBackend(SearchBackend):
+    """
+    Matches against `to_tsvector(name || description)`, which the
+    `shop_product_search_gin` expression index covers, with prefix terms.
+    """
+    config = 'english'
+
+    def vector(self):
+        from django.contrib.postgres.search import SearchVector
+        return SearchVector('name', 'description', config=self.config)
+
+    def search(self, queryset, query):
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+        tokens = tokenize(query)
+        if not tokens:
+            return queryset.none()
+        search_query = SearchQuery(" & ".join(f"{token}:*" for token in tokens), search_type='raw', config=self.config)
+        vector = self.vector()
+        return queryset.alias(document=vector).filter(document=search_query).annotate(
+            search_rank=-SearchRank(vector, search_query)
+        )
+
+
+_backend = None
+
+
+def get_search_backend():
+    """Return the backend named by `SHOP_SEARCH_BACKEND`, or the best fit for the database."""
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'SHOP_SEARCH_BACKEND', None)
+        if path:
+            _backend = import_string(path)()
+        elif connection.vendor == 'sqlite':
+            _backend = SQLiteFTSSearchBackend()
+        elif connection.vendor == 'postgresql':
+            _backend = PostgresSearchBackend()
+        else:
+            _backend = ContainsSearchBackend()
+    return _backend
@@ -1,33 +1,104 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
 from .models import Category, Product, Order, OrderItem, Review
 
-class CategorySerializer(serializers.ModelSerializer):
+
+class EagerLoadingMixin:
+    """
+    Declares the select_related / prefetch_related plan a serializer needs so
+    views can prepare their querysets with `setup_eager_loading` instead of
+    letting nested fields fire one query per row.
+    """
+    select_related_fields = []
+
+    @classmethod
+    def get_prefetch_related(cls, expand=()):
+        return []
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, expand=()):
+        if cls.select_related_fields:
+            queryset = queryset.select_related(*cls.select_related_fields)
+        prefetches = cls.get_prefetch_related(expand)
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches)
+        return queryset
+
+
+class DynamicFieldsMixin:
+    """
+    `fields` limits the output to the named fields, and anything listed in
+    `expandable_fields` is left out unless it is named in `expand`.
+    """
+    expandable_fields = []
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        expand = set(expand or ())
+        for name in self.expandable_fields:
+            if name not in expand:
+                self.fields.pop(name, None)
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class CategorySerializer(EagerLoadingMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
-        fields = ['id', 'name', 'slug', 'image_url']
+        fields = ['id', 'name', 'slug', 'image_url', 'image_variants']
+        read_only_fields = ['image_variants']
 
-class ReviewSerializer(serializers.ModelSerializer):
+def category_table(products):
+    """Each distinct category of `products` once, keyed by id, for compact listings."""
+    categories = {product.category_id: product.category for product in products}
+    return {str(pk): CategorySerializer(category).data for pk, category in categories.items()}
+
+class ReviewSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     user = serializers.StringRelatedField(read_only=True)
     product = serializers.StringRelatedField(read_only=True)
 
+    # `product` is filled in by the reverse prefetch when nested under a product
+    select_related_fields = ['user']
+
     class Meta:
         model = Review
         fields = '__all__'
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(EagerLoadingMixin, DynamicFieldsMixin, serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     category_id = serializers.IntegerField(write_only=True)
     reviews = ReviewSerializer(many=True, read_only=True)
 
+    select_related_fields = ['category']
+    expandable_fields = ['reviews']
+
     class Meta:
         model = Product
         fields = '__all__'
+        read_only_fields = ['rating_avg', 'review_count', 'image_variants']
+
+    def __init__(self, *args, compact=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        if compact and 'category' in self.fields:
+            # Only the id; the response carries each category once in a side table
+            self.fields['category'] = serializers.IntegerField(source='category_id', read_only=True)
+
+    @classmethod
+    def get_prefetch_related(cls, expand=()):
+        if 'reviews' not in expand:
+            return []
+        return [
+            Prefetch('reviews', queryset=ReviewSerializer.setup_eager_loading(Review.objects.all())),
+        ]
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
     product_id = serializers.IntegerField(write_only=True)
     total_price = serializers.SerializerMethodField()
 
+    select_related_fields = ['product__category']
+
     class Meta:
         model = OrderItem
         fields = '__all__'
@@ -35,7 +106,7 @@ class OrderItemSerializer(serializers.ModelSerializer):
     def get_total_price(self, obj):
         return obj.get_total
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     total = serializers.SerializerMethodField()
 
@@ -43,5 +114,25 @@ class OrderSerializer(serializers.ModelSerializer):
         model = Order
         fields = '__all__'
 
+    @classmethod
+    def get_prefetch_related(cls, expand=()):
+        return [
+            Prefetch('items', queryset=OrderItemSerializer.setup_eager_loading(OrderItem.objects.all())),
+        ]
+
     def get_total(self, obj):
         return obj.get_total
+
+class CartLineSerializer(serializers.Serializer):
+    id = serializers.IntegerField(read_only=True)  # the product id
+    product = ProductSerializer(read_only=True)
+    quantity = serializers.IntegerField()
+    total_price = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+
+class CartOperationSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    action = serializers.ChoiceField(choices=['set', 'add', 'increase', 'decrease', 'remove'])
+    quantity = serializers.IntegerField(min_value=0, default=1)
+
+class CartBatchSerializer(serializers.Serializer):
+    operations = CartOperationSerializer(many=True, allow_empty=False, max_length=200)
@@ -0,0 +1,95 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, Q, When
+from django.db.models.functions import Now
+
+from . import stats
+from .cache import bump_version
+from .cart import get_cart_store
+from .jobs import enqueue
+from .models import Order, OrderItem, Product
+
+
+class CheckoutError(Exception):
+    pass
+
+class EmptyCart(CheckoutError):
+    def __init__(self):
+        super().__init__("Cart is empty")
+
+class InsufficientStock(CheckoutError):
+    def __init__(self, products):
+        self.products = products
+        names = ", ".join(product.name for product in products)
+        super().__init__(f"Not enough stock for: {names}")
+
+
+def place_order(order):
+    """
+    Reserve stock for every line of `order` and mark it complete.
+
+    Everything runs in one transaction: stock is decremented by a single
+    conditional UPDATE that only touches products with enough stock left, so
+    concurrent checkouts can never oversell. If any line cannot be filled
+    nothing is written and InsufficientStock names the products that ran out.
+    """
+    with transaction.atomic():
+        wanted = defaultdict(int)
+        for product_id, quantity in order.items.filter(quantity__gt=0).values_list('product_id', 'quantity'):
+            wanted[product_id] += quantity
+        if not wanted:
+            raise EmptyCart()
+
+        # Claim the order first so the same cart cannot be checked out twice
+        if not Order.objects.filter(pk=order.pk, complete=False).update(complete=True):
+            raise EmptyCart()
+
+        in_stock = Q()
+        new_stock = []
+        for product_id, quantity in sorted(wanted.items()):
+            in_stock |= Q(pk=product_id, stock__gte=quantity)
+            new_stock.append(When(pk=product_id, then=F('stock') - quantity))
+        reserved = Product.objects.filter(in_stock).update(stock=Case(*new_stock), updated_at=Now())
+
+        if reserved != len(wanted):
+            short = [
+                product for product in Product.objects.filter(pk__in=wanted).order_by('pk')
+                if product.stock < wanted[product.pk]
+            ]
+            raise InsufficientStock(short)
+
+        order.total = order.compute_total()
+        order.complete = True
+        Order.objects.filter(pk=order.pk).update(total=order.total)
+
+        # These UPDATEs bypass post_save, so roll up stats and invalidate by hand
+        stats.order_placed(order)
+        transaction.on_commit(lambda: bump_version(Product))
+    return order
+
+
+def checkout_cart(user, store=None):
+    """
+    Turn `user`'s cart into an Order and place it.
+
+    The order and all its lines are written in one bulk insert and the cart is
+    emptied in the same transaction. The order row is inserted before the cart
+    is read, so a second concurrent checkout for the same user waits on the
+    one-open-order constraint and then finds the cart already empty.
+    Follow-up work is queued as jobs that only run once the order commits.
+    """
+    store = store or get_cart_store()
+    with transaction.atomic():
+        order = Order.objects.create(user_id=user.pk)
+        lines = [line for line in store.lines(user) if line.quantity > 0]
+        if not lines:
+            raise EmptyCart()
+        OrderItem.objects.bulk_create(
+            [OrderItem(order=order, product=line.product, quantity=line.quantity) for line in lines]
+        )
+        place_order(order)
+        store.clear(user)
+        # Side effects go through the outbox so they cost checkout one INSERT
+        enqueue('send_order_confirmation', order_id=order.pk)
+    return order
@@ -0,0 +1,118 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .authentication import forget_user_state
+from .cache import bump_version
+from . import stats
+from .models import Cart, Category, Order, Product, Review
+from .search import get_search_backend
+
+
+# ----------------- Search index -----------------
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    get_search_backend().index(instance)
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    get_search_backend().remove(instance.pk)
+
+# ----------------- Review aggregates -----------------
+@receiver(post_save, sender=Review)
+def count_review(sender, instance, created, **kwargs):
+    products = Product.objects.filter(pk=instance.product_id)
+    if created:
+        products.record_review(instance.rating)
+    else:
+        products.refresh_review_stats()
+    bump_version(Product)
+
+@receiver(post_delete, sender=Review)
+def uncount_review(sender, instance, **kwargs):
+    Product.objects.filter(pk=instance.product_id).record_review(instance.rating, delta=-1)
+    bump_version(Product)
+
+# ----------------- Cart summaries -----------------
+@receiver(post_save, sender=Product)
+def reprice_carts(sender, instance, created, **kwargs):
+    if not created:
+        Cart.objects.filter(items__product=instance).refresh_summary()
+
+@receiver(pre_delete, sender=Product)
+def remember_carts(sender, instance, **kwargs):
+    instance._cart_ids = list(Cart.objects.filter(items__product=instance).values_list('pk', flat=True))
+
+@receiver(post_delete, sender=Product)
+def recount_carts(sender, instance, **kwargs):
+    Cart.objects.filter(pk__in=getattr(instance, '_cart_ids', [])).refresh_summary()
+
+# ----------------- Cache versions -----------------
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def bump_cache_version(sender, **kwargs):
+    bump_version(sender)
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def bump_review_version(sender, update_fields=None, **kwargs):
+    # Reviews are shown with their author's username; logins only touch last_login
+    if update_fields is None or 'username' in update_fields:
+        bump_version(Review)
+
+# ----------------- Dashboard rollups -----------------
+def order_state(order):
+    total = order.total
+    if order.complete and total is None:
+        total = order.compute_total()
+    return order.complete, order.status, total
+
+@receiver(pre_save, sender=Order)
+def remember_order_state(sender, instance, **kwargs):
+    before = Order.objects.filter(pk=instance.pk).values_list('complete', 'status', 'total').first() if instance.pk else None
+    instance._stats_before = before or (False, instance.status, None)
+
+@receiver(post_save, sender=Order)
+def roll_up_order(sender, instance, **kwargs):
+    stats.record(stats.order_delta(instance._stats_before, order_state(instance)), instance.created_at)
+
+@receiver(post_delete, sender=Order)
+def roll_back_order(sender, instance, **kwargs):
+    stats.record(stats.order_delta(order_state(instance), (False, instance.status, None)), instance.created_at)
+
+@receiver(post_save, sender=User)
+def count_user(sender, instance, created, **kwargs):
+    if created:
+        stats.record({('new_users', ''): 1}, instance.date_joined)
+
+@receiver(post_delete, sender=User)
+def uncount_user(sender, instance, **kwargs):
+    stats.record({('new_users', ''): -1}, instance.date_joined)
+
+@receiver(post_save, sender=Review)
+def count_review_stat(sender, instance, created, **kwargs):
+    if created:
+        stats.record({('reviews', ''): 1}, instance.created_at)
+
+@receiver(post_delete, sender=Review)
+def uncount_review_stat(sender, instance, **kwargs):
+    stats.record({('reviews', ''): -1}, instance.created_at)
+
+@receiver(post_save, sender=Product)
+def count_product(sender, instance, created, **kwargs):
+    if created:
+        stats.increment(stats.StatRollup.ALL, stats.ALL_TIME, 'products', '', 1)
+
+@receiver(post_delete, sender=Product)
+def uncount_product(sender, instance, **kwargs):
+    stats.increment(stats.StatRollup.ALL, stats.ALL_TIME, 'products', '', -1)
+
+# ----------------- Token user state -----------------
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_token_user(sender, instance, **kwargs):
+    forget_user_state(instance.pk)
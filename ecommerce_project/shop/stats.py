@@ -0,0 +1,162 @@
+"""
+Hourly, daily and all-time rollups behind the admin dashboard.
+
+Every placed order, status change, new user, review and product adjusts a
+handful of `StatRollup` rows by a delta, so the dashboard reads a bounded
+number of precomputed rows however much history there is. `rebuild()`
+recomputes everything from the source tables for backfills and repairs.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncHour
+from django.utils import timezone
+
+from .models import MONEY, Order, OrderItem, Product, Review, StatRollup
+
+ALL_TIME = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+ORDER_STATUSES = [status for status, _ in Order.STATUS_CHOICES]
+
+
+def bucket_start(when, period):
+    if period == StatRollup.ALL:
+        return ALL_TIME
+    when = timezone.localtime(when).replace(minute=0, second=0, microsecond=0)
+    if period == StatRollup.DAY:
+        when = when.replace(hour=0)
+    return when
+
+
+def increment(period, start, metric, dimension, amount):
+    lookup = {'period': period, 'start': start, 'metric': metric, 'dimension': dimension}
+    if StatRollup.objects.filter(**lookup).update(value=F('value') + amount):
+        return
+    try:
+        with transaction.atomic():
+            StatRollup.objects.create(value=amount, **lookup)
+    except IntegrityError:
+        # Another writer created the bucket first
+        StatRollup.objects.filter(**lookup).update(value=F('value') + amount)
+
+
+def record(changes, when):
+    """Add `{(metric, dimension): amount}` to the hour, day and all-time buckets of `when`."""
+    for (metric, dimension), amount in changes.items():
+        if not amount:
+            continue
+        for period in (StatRollup.HOUR, StatRollup.DAY, StatRollup.ALL):
+            increment(period, bucket_start(when, period), metric, dimension, amount)
+
+
+def order_contribution(complete, status, total):
+    """What one order adds to the rollups; open carts count for nothing."""
+    if not complete:
+        return {}
+    return {('orders', status): 1, ('revenue', status): total or Decimal('0.00')}
+
+
+def order_delta(before, after):
+    changes = defaultdict(Decimal)
+    for key, amount in order_contribution(*after).items():
+        changes[key] += amount
+    for key, amount in order_contribution(*before).items():
+        changes[key] -= amount
+    return changes
+
+
+def order_placed(order):
+    record(order_contribution(True, order.status, order.total), order.created_at)
+
+
+def dashboard(days=7):
+    """All-time totals, orders by status and the last `days` daily rows, in two queries."""
+    totals = defaultdict(Decimal)
+    by_status = {status: {'orders': 0, 'revenue': Decimal('0.00')} for status in ORDER_STATUSES}
+    for metric, dimension, value in StatRollup.objects.filter(period=StatRollup.ALL).values_list('metric', 'dimension', 'value'):
+        totals[metric] += value
+        if metric in ('orders', 'revenue') and dimension in by_status:
+            by_status[dimension][metric] = int(value) if metric == 'orders' else value
+
+    today = bucket_start(timezone.now(), StatRollup.DAY)
+    starts = [today - timedelta(days=offset) for offset in range(days - 1, -1, -1)]
+    daily = {start: defaultdict(Decimal) for start in starts}
+    recent = StatRollup.objects.filter(period=StatRollup.DAY, start__gte=starts[0]).values_list('start', 'metric', 'dimension', 'value')
+    for start, metric, dimension, value in recent:
+        start = timezone.localtime(start)
+        if start in daily and not (metric == 'revenue' and dimension == 'Cancelled'):
+            daily[start][metric] += value
+
+    return {
+        'products': int(totals['products']),
+        'orders': int(totals['orders']),
+        'users': int(totals['new_users']),
+        'reviews': int(totals['reviews']),
+        'revenue': totals['revenue'] - by_status.get('Cancelled', {}).get('revenue', 0),
+        'by_status': by_status,
+        'daily': [
+            {
+                'day': start,
+                'orders': int(daily[start]['orders']),
+                'revenue': daily[start]['revenue'],
+                'new_users': int(daily[start]['new_users']),
+                'reviews': int(daily[start]['reviews']),
+            }
+            for start in starts
+        ],
+    }
+
+
+def hourly_sources():
+    """(metric, dimension, hour, amount) rows aggregated from the source tables."""
+    line_totals = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order').annotate(
+        sum=Sum(F('quantity') * F('product__price'), output_field=MONEY)
+    ).values('sum')
+    orders = (
+        Order.objects.filter(complete=True)
+        .annotate(
+            hour=TruncHour('created_at'),
+            amount=Coalesce('total', Subquery(line_totals, output_field=MONEY), Value(Decimal('0.00')), output_field=MONEY),
+        )
+        .values('hour', 'status')
+        .annotate(n=Count('pk'), revenue=Sum('amount'))
+    )
+    for row in orders:
+        yield 'orders', row['status'], row['hour'], row['n']
+        yield 'revenue', row['status'], row['hour'], row['revenue']
+
+    for model, field, metric in (
+        (get_user_model(), 'date_joined', 'new_users'),
+        (Review, 'created_at', 'reviews'),
+    ):
+        for row in model.objects.annotate(hour=TruncHour(field)).values('hour').annotate(n=Count('pk')):
+            yield metric, '', row['hour'], row['n']
+
+
+def rebuild():
+    """Recompute every rollup from scratch in bulk. Returns the number of rows written."""
+    buckets = defaultdict(Decimal)
+    for metric, dimension, hour, amount in hourly_sources():
+        for period in (StatRollup.HOUR, StatRollup.DAY, StatRollup.ALL):
+            buckets[(period, bucket_start(hour, period), metric, dimension)] += amount
+    buckets[(StatRollup.ALL, ALL_TIME, 'products', '')] = Product.objects.count()
+
+    with transaction.atomic():
+        StatRollup.objects.all().delete()
+        StatRollup.objects.bulk_create(
+            [StatRollup(period=period, start=start, metric=metric, dimension=dimension, value=value)
+             for (period, start, metric, dimension), value in buckets.items()],
+            batch_size=1000,
+        )
+    return len(buckets)
+
+
+def recount_products():
+    """Reset the product total after bulk writes that bypass the model signals."""
+    lookup = {'period': StatRollup.ALL, 'start': ALL_TIME, 'metric': 'products', 'dimension': ''}
+    count = Product.objects.count()
+    if not StatRollup.objects.filter(**lookup).update(value=count):
+        increment(amount=count, **lookup)
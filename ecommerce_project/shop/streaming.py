@@ -0,0 +1,41 @@
+from django.http import StreamingHttpResponse
+from .feeds import chunked
+from .renderers import dumps
+
+STREAM_FORMATS = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def stream_format(request, param='stream'):
+    """The streaming format asked for with `?stream=json|ndjson`, or None."""
+    fmt = request.GET.get(param)
+    return fmt if fmt in STREAM_FORMATS else None
+
+
+def encode_rows(queryset, serialize, fmt, chunk_size):
+    batches = chunked(queryset.iterator(chunk_size=chunk_size), chunk_size)
+    if fmt == 'ndjson':
+        for batch in batches:
+            yield b''.join(dumps(row) + b'\n' for row in serialize(batch))
+        return
+    yield b'['
+    separator = b''
+    for batch in batches:
+        yield separator + b','.join(dumps(row) for row in serialize(batch))
+        separator = b','
+    yield b']'
+
+
+def streaming_response(queryset, serialize, fmt='json', chunk_size=500):
+    """
+    Stream `queryset` as a JSON array or as newline-delimited JSON.
+
+    Rows are read with `iterator(chunk_size=...)`, which also runs any
+    prefetches one chunk at a time, and `serialize` turns each chunk into a
+    list of dicts, so memory stays flat however many rows there are.
+    """
+    response = StreamingHttpResponse(encode_rows(queryset, serialize, fmt, chunk_size), content_type=STREAM_FORMATS[fmt])
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.mail import send_mail
+
+from .jobs import job
+from .models import Order
+
+
+@job('send_order_confirmation')
+def send_order_confirmation(order_id):
+    order = Order.objects.select_related('user').filter(pk=order_id).first()
+    if order is None or not order.user.email:
+        return
+    items = order.items.select_related('product').order_by('pk')
+    lines = [f"{item.quantity} x {item.product.name}: {item.get_total}" for item in items]
+    send_mail(
+        subject=f"Your order #{order.pk} is confirmed",
+        message="\n".join([f"Hi {order.user.username},", "", "Thanks for your order:", *lines, "", f"Total: {order.get_total}"]),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipient_list=[order.user.email],
+    )
@@ -0,0 +1,70 @@
+"""
+`{% fragment %}`: cache a piece of a template until the models it shows change.
+
+    {% load shop_cache %}
+    {% fragment "related_products" on "shop.product" by product.pk %}
+        ...
+    {% endfragment %}
+
+The rendered HTML is stored with `shop.cache.cached`, keyed on the fragment
+name, the version counter of every model after `on`, and the values after
+`by`. Saving or deleting any of those models makes the entry unreachable.
+Querysets the fragment iterates are only evaluated on a miss.
+
+Fragments are shared by every visitor, so they must not show anything
+user-specific. `{% csrf_token %}` is the one exception: it is cached as a
+placeholder and filled in with the current request's token on the way out.
+"""
+from django import template
+from django.utils.safestring import mark_safe
+
+from ..cache import cached
+
+register = template.Library()
+
+CSRF_PLACEHOLDER = 'shop-fragment-csrf-token'
+
+
+class FragmentNode(template.Node):
+    def __init__(self, nodelist, name, models, vary):
+        self.nodelist = nodelist
+        self.name = name
+        self.models = models
+        self.vary = vary
+
+    def render(self, context):
+        def build():
+            with context.push(csrf_token=CSRF_PLACEHOLDER):
+                return str(self.nodelist.render(context))
+
+        vary = [value.resolve(context) for value in self.vary]
+        html = cached(f"fragment:{self.name}", self.models, build, vary=vary)
+        if CSRF_PLACEHOLDER in html:
+            token = context.get('csrf_token')
+            html = html.replace(CSRF_PLACEHOLDER, str(token) if token and token != 'NOTPROVIDED' else '')
+        return mark_safe(html)
+
+
+def literal(bit, parser):
+    value = parser.compile_filter(bit)
+    if not value.is_var and isinstance(value.var, str):
+        return value.var
+    raise template.TemplateSyntaxError(f"'fragment' expects quoted names, got {bit}")
+
+
+@register.tag
+def fragment(parser, token):
+    """{% fragment "name" on "app.model" ... [by value ...] %}...{% endfragment %}"""
+    bits = token.split_contents()
+    if len(bits) < 4 or bits[2] != 'on':
+        raise template.TemplateSyntaxError("Usage: {% fragment \"name\" on \"app.model\" ... [by value ...] %}")
+    name = literal(bits[1], parser)
+    rest = bits[3:]
+    split = rest.index('by') if 'by' in rest else len(rest)
+    models = [literal(bit, parser).lower() for bit in rest[:split]]
+    vary = [parser.compile_filter(bit) for bit in rest[split + 1:]]
+    if not models:
+        raise template.TemplateSyntaxError("'fragment' needs at least one model after 'on'")
+    nodelist = parser.parse(('endfragment',))
+    parser.delete_first_token()
+    return FragmentNode(nodelist, name, models, vary)
@@ -1,3 +1,1592 @@
-from django.test import TestCase
+import gzip
+import importlib.util
+import io
+import json
+import os
+import tempfile
+from datetime import datetime
+import threading
+from decimal import Decimal
+from unittest import mock, skipUnless
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, connection, transaction
+from django.core import mail
+from django.conf import global_settings, settings
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer as DRFJSONRenderer
+from rest_framework.test import APIClient
+from rest_framework.views import APIView
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from .authentication import TokenUserAuthentication, forget_user_state
+from . import hashers
+from .hashers import PooledPBKDF2PasswordHasher
+from .benchmarking import compare_results
+from .compression import brotli
+from .cache import batched_invalidation, bump_version, get_cache, get_versions, stats as cache_stats
+from .cart import CacheCartStore, DatabaseCartStore, apply_operations, get_cart_store
+from .feeds import CatalogImporter, read_feed
+from . import images
+from .forms import ProductForm
+from .jobs import enqueue, handlers, job, release_stale, run_job, run_pending
+from .metrics import registry as metrics_registry
+from . import stats
+from .models import Cart, Category, Product, Order, OrderItem, Review, Job, StatRollup
+from .prerender import hot_paths, write_pages
+from .renderers import JSONRenderer
+from .search import get_search_backend
+from .templatetags.shop_cache import CSRF_PLACEHOLDER
+from .services import EmptyCart, InsufficientStock, checkout_cart, place_order
+
+
+def make_catalog(category_count=2, products_per_category=3, stock=10):
+    products = []
+    start = Category.objects.count()
+    for c in range(start, start + category_count):
+        category = Category.objects.create(name=f"Category {c}", slug=f"category-{c}")
+        for p in range(products_per_category):
+            products.append(Product.objects.create(
+                category=category,
+                name=f"Product {c}-{p}",
+                description=f"Description for product {c}-{p}",
+                price=10 + p,
+                stock=stock,
+            ))
+    return products
+
+
+class QueryCountTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='secret-pass-123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_orders(self, count):
+        products = make_catalog(category_count=count, products_per_category=2)
+        for product in products:
+            Review.objects.create(product=product, user=self.user, rating=4, comment="ok")
+        for i in range(count):
+            order = Order.objects.create(user=self.user, complete=True)
+            OrderItem.objects.create(order=order, product=products[2 * i], quantity=1)
+            OrderItem.objects.create(order=order, product=products[2 * i + 1], quantity=2)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_my_orders_query_count_is_independent_of_rows(self):
+        self.add_orders(1)
+        small = self.count_queries(reverse('api_my_orders'))
+        self.add_orders(6)
+        self.assertEqual(self.count_queries(reverse('api_my_orders')), small)
+
+    def test_product_list_query_count_is_independent_of_rows(self):
+        self.add_orders(1)
+        small = self.count_queries(reverse('api_product_list'))
+        self.add_orders(6)
+        self.assertEqual(self.count_queries(reverse('api_product_list')), small)
+
+    def test_category_products_query_count_is_independent_of_rows(self):
+        category = Category.objects.create(name="Books", slug="books")
+        Product.objects.create(category=category, name="Novel", description="d", price=5, stock=1)
+        url = reverse('api_category_products', args=['books'])
+        small = self.count_queries(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(5):
+                product = Product.objects.create(category=category, name=f"Novel {i}", description="d", price=5, stock=1)
+                Review.objects.create(product=product, user=self.user, rating=5, comment="great")
+        self.assertEqual(self.count_queries(url), small)
+
+
+class OrderTotalTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='bob', password='secret-pass-123')
+        self.products = make_catalog(category_count=1, products_per_category=2)
+        self.order = Order.objects.create(user=self.user)
+        OrderItem.objects.create(order=self.order, product=self.products[0], quantity=2)  # 2 x 10
+        OrderItem.objects.create(order=self.order, product=self.products[1], quantity=1)  # 1 x 11
+
+    def test_with_totals_annotates_sum_in_sql(self):
+        Order.objects.create(user=self.user, complete=True)  # one open cart per user
+        with self.assertNumQueries(1):
+            totals = [order.get_total for order in Order.objects.with_totals().order_by('id')]
+        self.assertEqual(totals, [31, 0])
+
+    def test_checkout_snapshots_total(self):
+        self.order.delete()
+        store = get_cart_store()
+        store.add(self.user, self.products[0], 2)
+        store.add(self.user, self.products[1], 1)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post(reverse('api_checkout'))
+        self.assertEqual(response.status_code, 200)
+        order = Order.objects.get(user=self.user)
+        self.assertEqual(order.total, 31)
+
+        # Later price changes do not rewrite the amount that was charged
+        Product.objects.filter(pk=self.products[0].pk).update(price=100)
+        self.assertEqual(Order.objects.with_totals().get(pk=order.pk).get_total, 31)
+
+    def test_admin_order_list_uses_single_query_for_totals(self):
+        for _ in range(5):
+            order = Order.objects.create(user=self.user, complete=True)
+            OrderItem.objects.create(order=order, product=self.products[0], quantity=1)
+        staff = User.objects.create_user(username='staff', password='secret-pass-123', is_staff=True)
+        self.client.force_login(staff)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('admin_order_list'))
+        self.assertContains(response, '₹31')
+        order_queries = [q for q in ctx.captured_queries if 'shop_order' in q['sql']]
+        self.assertEqual(len(order_queries), 1)
+
+
+class CatalogPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.products = make_catalog(category_count=1, products_per_category=3)
+        # Duplicate prices so the id tie-breaker is exercised
+        self.products += make_catalog(category_count=1, products_per_category=3)
+        user = User.objects.create_user(username='carol', password='secret-pass-123')
+        Review.objects.create(product=self.products[0], user=user, rating=3, comment="fine")
+
+    def walk(self, url):
+        ids, pages = [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [p['id'] for p in response.data['results']]
+            url = response.data['next']
+            pages += 1
+        return ids, pages
+
+    def test_keyset_pages_cover_catalog_in_sort_order(self):
+        ids, pages = self.walk(reverse('api_product_list') + '?sort=price_asc&page_size=4')
+        expected = [p.id for p in sorted(self.products, key=lambda p: (p.price, p.id))]
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 2)
+
+        ids, _ = self.walk(reverse('api_product_list') + '?sort=newest&page_size=2')
+        self.assertEqual(ids, sorted((p.id for p in self.products), reverse=True))
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse('api_product_list') + '?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+    def test_list_omits_reviews_unless_expanded(self):
+        response = self.client.get(reverse('api_product_list') + '?fields=id,name,reviews')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'name'})
+
+        response = self.client.get(reverse('api_product_list') + '?sort=oldest&expand=reviews')
+        self.assertEqual(len(response.data['results'][0]['reviews']), 1)
+
+    def test_category_products_returns_next_link(self):
+        slug = self.products[0].category.slug
+        response = self.client.get(reverse('api_category_products', args=[slug]) + '?page_size=2')
+        self.assertEqual(len(response.data['products']), 2)
+        self.assertIn('cursor=', response.data['next'])
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Audio", slug="audio")
+        self.headphones = Product.objects.create(
+            category=self.category, name="Wireless Headphones", description="Noise cancelling", price=99, stock=5,
+        )
+        self.speaker = Product.objects.create(
+            category=self.category, name="Bluetooth Speaker", description="Pairs with wireless headphones", price=49, stock=5,
+        )
+        self.client = APIClient()
+
+    def search_ids(self, query):
+        response = self.client.get(reverse('api_product_list'), {'q': query})
+        return [p['id'] for p in response.data['results']]
+
+    def test_results_are_ranked_and_prefix_matched(self):
+        # A name match outranks a description match
+        self.assertEqual(self.search_ids('headphones'), [self.headphones.id, self.speaker.id])
+        self.assertEqual(self.search_ids('wirel head'), [self.headphones.id, self.speaker.id])
+        self.assertEqual(self.search_ids('blue'), [self.speaker.id])
+
+    def test_index_follows_product_save_and_delete(self):
+        self.speaker.name = "Bluetooth Soundbar"
+        self.speaker.save()
+        self.assertEqual(self.search_ids('soundbar'), [self.speaker.id])
+        self.speaker.delete()
+        self.assertEqual(self.search_ids('soundbar'), [])
+
+    def test_template_search_uses_backend(self):
+        response = self.client.get(reverse('product_list'), {'q': 'speak'})
+        self.assertEqual(list(response.context['products']), [self.speaker])
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='dave', password='secret-pass-123')
+        self.first, self.second = make_catalog(category_count=1, products_per_category=2, stock=3)
+        self.order = Order.objects.create(user=self.user)
+
+    def test_only_one_open_cart_per_user(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Order.objects.create(user=self.user)
+        self.order.complete = True
+        self.order.save()
+        Order.objects.create(user=self.user)
+
+    def test_place_order_reserves_stock_in_one_update(self):
+        OrderItem.objects.create(order=self.order, product=self.first, quantity=2)
+        OrderItem.objects.create(order=self.order, product=self.second, quantity=3)
+        place_order(self.order)
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual((self.first.stock, self.second.stock), (1, 0))
+        self.assertTrue(Order.objects.get(pk=self.order.pk).complete)
+
+    def test_insufficient_stock_rolls_back_everything(self):
+        OrderItem.objects.create(order=self.order, product=self.first, quantity=1)
+        OrderItem.objects.create(order=self.order, product=self.second, quantity=4)
+        with self.assertRaises(InsufficientStock) as ctx:
+            place_order(self.order)
+        self.assertEqual(ctx.exception.products, [self.second])
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.stock, 3)
+        self.assertFalse(Order.objects.get(pk=self.order.pk).complete)
+
+    def test_empty_cart_and_api_error(self):
+        with self.assertRaises(EmptyCart):
+            place_order(self.order)
+        self.order.delete()
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.post(reverse('api_checkout')).status_code, 400)
+
+        get_cart_store().add(self.user, self.first, 3)
+        Product.objects.filter(pk=self.first.pk).update(stock=2)  # sold elsewhere meanwhile
+        response = client.post(reverse('api_checkout'))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(self.first.name, response.data['error'])
+        # nothing was written and the cart is left for the user to fix
+        self.assertFalse(Order.objects.filter(user=self.user).exists())
+        self.assertEqual(get_cart_store().summary(self.user)['item_count'], 3)
+
+
+@override_settings(SHOP_JOBS_MODE='worker')
+class ConcurrentCheckoutTests(TransactionTestCase):
+    buyers = 200
+    stock = 50
+
+    def test_concurrent_buyers_never_oversell(self):
+        product = make_catalog(category_count=1, products_per_category=1, stock=self.stock)[0]
+        users = User.objects.bulk_create([User(username=f"buyer{i}") for i in range(self.buyers)])
+        orders = Order.objects.bulk_create([Order(user=user) for user in users])
+        OrderItem.objects.bulk_create([OrderItem(order=order, product=product, quantity=1) for order in orders])
+
+        results = []
+        start = threading.Barrier(self.buyers)
+
+        def buy(order):
+            start.wait()
+            try:
+                place_order(order)
+                results.append('sold')
+            except InsufficientStock:
+                results.append('rejected')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy, args=(order,)) for order in orders]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        self.assertEqual(results.count('sold'), self.stock)
+        self.assertEqual(results.count('rejected'), self.buyers - self.stock)
+        self.assertEqual(product.stock, 0)
+        self.assertEqual(Order.objects.filter(complete=True).count(), self.stock)
+
+
+class VersionedCacheTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        cache_stats.reset()
+        self.user = User.objects.create_user(username='erin', password='secret-pass-123')
+        self.product = make_catalog(category_count=1, products_per_category=1, stock=5)[0]
+        self.client = APIClient()
+
+    def test_category_list_is_served_from_cache_until_a_category_changes(self):
+        url = reverse('api_category_list')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual([c['name'] for c in response.data], ['Category 0'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name="Garden", slug="garden")
+        response = self.client.get(url)
+        self.assertEqual(len(response.data), 2)
+        self.assertEqual(cache_stats.snapshot()['hits'], 1)
+        self.assertEqual(cache_stats.snapshot()['misses'], 2)
+
+    def test_product_detail_invalidated_by_reviews_and_checkout(self):
+        url = reverse('api_product_detail', args=[self.product.pk])
+        self.assertEqual(self.client.get(url).data['reviews'], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(product=self.product, user=self.user, rating=5, comment="love it")
+        self.assertEqual(len(self.client.get(url).data['reviews']), 1)
+
+        order = Order.objects.create(user=self.user)
+        OrderItem.objects.create(order=order, product=self.product, quantity=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(order)
+        self.assertEqual(self.client.get(url).data['stock'], 3)
+
+    def test_versions_move_only_when_the_write_commits(self):
+        before = get_versions([Product])['shop.product']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+            # A reader caching now still files its entry under the old version
+            self.assertEqual(get_versions([Product])['shop.product'], before)
+        self.assertEqual(get_versions([Product])['shop.product'], before + 1)
+
+    def test_stats_endpoint_is_staff_only(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(reverse('api_cache_stats')).status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(set(self.client.get(reverse('api_cache_stats')).data), {'hits', 'misses', 'hit_ratio'})
+
+
+class ConditionalRequestTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.product = make_catalog(category_count=1, products_per_category=3)[0]
+        self.client = APIClient()
+
+    def test_unchanged_listing_returns_304_without_queries(self):
+        url = reverse('api_product_list')
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('Last-Modified', first)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertGreater(len(first.content), len(response.content))
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_changes_with_the_query_string(self):
+        url = reverse('api_product_list')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url + '?sort=price_asc', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_product_detail_etag_follows_product_saves(self):
+        url = reverse('api_product_detail', args=[self.product.pk])
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.product.price = 99
+        self.product.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_missing_product_is_still_404(self):
+        response = self.client.get(reverse('api_product_detail', args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+
+class RatingAggregateTests(TestCase):
+    def setUp(self):
+        self.products = make_catalog(category_count=1, products_per_category=3)
+        self.users = [User.objects.create_user(username=f'rater{i}', password='secret-pass-123') for i in range(3)]
+
+    def review(self, product, user, rating):
+        return Review.objects.create(product=product, user=user, rating=rating, comment="ok")
+
+    def test_reviews_maintain_count_and_average(self):
+        product = self.products[0]
+        first = self.review(product, self.users[0], 5)
+        second = self.review(product, self.users[1], 2)
+        product.refresh_from_db()
+        self.assertEqual(product.review_count, 2)
+        self.assertAlmostEqual(product.rating_avg, 3.5)
+
+        second.rating = 4
+        second.save()
+        product.refresh_from_db()
+        self.assertAlmostEqual(product.rating_avg, 4.5)
+
+        second.delete()
+        product.refresh_from_db()
+        self.assertEqual(product.review_count, 1)
+        self.assertAlmostEqual(product.rating_avg, 5.0)
+
+        first.delete()
+        product.refresh_from_db()
+        self.assertEqual((product.review_count, product.rating_avg), (0, 0.0))
+
+    def test_review_posted_through_the_api_updates_the_stats(self):
+        client = APIClient()
+        client.force_authenticate(self.users[0])
+        product = self.products[1]
+        client.post(reverse('api_product_detail', args=[product.pk]), {'rating': 4, 'comment': 'nice'})
+        data = client.get(reverse('api_product_detail', args=[product.pk])).data
+        self.assertEqual((data['review_count'], data['rating_avg']), (1, 4.0))
+
+    def test_sort_by_rating_uses_the_index(self):
+        self.review(self.products[0], self.users[0], 3)
+        self.review(self.products[2], self.users[0], 5)
+        response = APIClient().get(reverse('api_product_list'), {'sort': 'rating', 'page_size': 2})
+        self.assertEqual([p['id'] for p in response.data['results']], [self.products[2].pk, self.products[0].pk])
+        response = APIClient().get(response.data['next'])
+        self.assertEqual([p['id'] for p in response.data['results']], [self.products[1].pk])
+
+        if connection.vendor == 'sqlite':
+            plan = Product.objects.order_by('-rating_avg', '-id')[:24].explain()
+            self.assertIn('shop_product_rating_idx', plan)
+
+
+class CatalogFeedTests(TestCase):
+    def setUp(self):
+        Category.objects.create(name="Books", slug="books")
+
+    def run_import(self, feed, fmt='csv', **kwargs):
+        importer = CatalogImporter(**kwargs)
+        importer.import_rows(read_feed(io.StringIO(feed), fmt))
+        return importer
+
+    def test_csv_import_upserts_in_batches(self):
+        rows = "\n".join(f"books,Book {i},About {i},{i}.50,{i}" for i in range(10))
+        feed = "category_slug,name,description,price,stock\n" + rows
+        with CaptureQueriesContext(connection) as ctx:
+            importer = self.run_import(feed, batch_size=4)
+        self.assertEqual(importer.imported, 10)
+        # slug map once, then savepoint, upsert, index refresh, cart reprice, release per batch,
+        # then the product total is recounted once
+        self.assertLessEqual(len(ctx.captured_queries), 1 + 3 * 6 + 2)
+
+        self.run_import("category_slug,name,description,price,stock\nbooks,Book 3,Revised,9.99,1\n")
+        self.assertEqual(Product.objects.count(), 10)
+        self.assertEqual(Product.objects.get(name="Book 3").description, "Revised")
+        self.assertEqual(get_search_backend().search(Product.objects.all(), "revised").count(), 1)
+
+    def test_bad_rows_are_reported_not_fatal(self):
+        feed = '{"category_slug": "books", "name": "Good", "price": "1.00"}\n' \
+               '{"category_slug": "music", "name": "Unknown category", "price": "1.00"}\n' \
+               '{"category_slug": "books", "name": "No price"}\n'
+        importer = self.run_import(feed, fmt='jsonl')
+        self.assertEqual(importer.imported, 1)
+        self.assertEqual([line for line, _ in importer.errors], [2, 3])
+
+        importer = self.run_import(feed, fmt='jsonl', create_categories=True)
+        self.assertTrue(Category.objects.filter(slug="music").exists())
+
+    def test_export_round_trips_through_import(self):
+        make_catalog(category_count=2, products_per_category=3)
+        out = io.StringIO()
+        call_command('export_catalog', format='jsonl', stdout=out, stderr=io.StringIO())
+        exported = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(len(exported), 6)
+
+        Product.objects.update(stock=0)
+        self.run_import(out.getvalue(), fmt='jsonl')
+        self.assertEqual(Product.objects.count(), 6)
+        self.assertFalse(Product.objects.filter(stock=0).exists())
+
+
+class StreamingResponseTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='frank', password='secret-pass-123')
+        self.products = make_catalog(category_count=1, products_per_category=4)
+        for i in range(12):
+            order = Order.objects.create(user=self.user, complete=True)
+            OrderItem.objects.create(order=order, product=self.products[i % 4], quantity=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def read(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_streamed_orders_match_the_regular_response(self):
+        url = reverse('api_my_orders')
+        expected = json.loads(json.dumps(self.client.get(url).data, cls=DjangoJSONEncoder))
+        streamed = json.loads(self.read(self.client.get(url, {'stream': 'json'})))
+        self.assertEqual([o['id'] for o in streamed], [o['id'] for o in expected])
+        self.assertEqual(streamed[0]['items'][0]['product']['name'], expected[0]['items'][0]['product']['name'])
+
+    def test_ndjson_product_stream_skips_pagination(self):
+        make_catalog(category_count=1, products_per_category=30)
+        response = APIClient().get(reverse('api_product_list'), {'stream': 'ndjson', 'fields': 'id,price', 'sort': 'price_asc'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual(len(rows), 34)
+        self.assertEqual(set(rows[0]), {'id', 'price'})
+        self.assertEqual(rows, sorted(rows, key=lambda row: (float(row['price']), row['id'])))
+
+    def test_query_count_does_not_grow_with_rows(self):
+        def count(total):
+            Order.objects.all().delete()
+            for _ in range(total):
+                order = Order.objects.create(user=self.user, complete=True)
+                OrderItem.objects.create(order=order, product=self.products[0], quantity=1)
+            with CaptureQueriesContext(connection) as ctx:
+                self.read(self.client.get(reverse('api_my_orders'), {'stream': 'json'}))
+            return len(ctx.captured_queries)
+
+        self.assertEqual(count(3), count(400))
+
+    def test_empty_stream_is_a_valid_array(self):
+        Order.objects.all().delete()
+        self.assertEqual(self.read(self.client.get(reverse('api_my_orders'), {'stream': 'json'})), '[]')
+
+
+@skipUnless(connection.vendor == 'sqlite', "query plans are checked with SQLite's EXPLAIN QUERY PLAN")
+class QueryPlanTests(TestCase):
+    """Hot views must reach product, order and review rows through an index."""
+    hot_tables = ('shop_product', 'shop_order', 'shop_review')
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='gina', password='secret-pass-123')
+        self.products = make_catalog(category_count=2, products_per_category=5)
+        self.product = self.products[0]
+        Review.objects.create(product=self.product, user=self.user, rating=4, comment="good")
+        order = Order.objects.create(user=self.user, complete=True)
+        OrderItem.objects.create(order=order, product=self.product, quantity=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.staff = APIClient()
+        self.staff.force_login(User.objects.create_user(username='boss', password='secret-pass-123', is_staff=True))
+
+    def assert_indexed(self, client, url, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(client.get(url, params or {}).status_code, 200)
+        for query in ctx.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT') or not any(f'"{table}"' in sql for table in self.hot_tables):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                plan = [row[-1] for row in cursor.fetchall()]
+            for step in plan:
+                table = step.split()[1] if step.startswith(('SCAN', 'SEARCH')) else None
+                if table in self.hot_tables:
+                    self.assertFalse(
+                        step.startswith('SCAN') and 'INDEX' not in step,
+                        f"full scan of {table} for {url}:\n{sql}\n{plan}",
+                    )
+                self.assertNotIn('TEMP B-TREE FOR ORDER BY', step, f"unindexed sort for {url}:\n{sql}\n{plan}")
+
+    def test_catalog_views(self):
+        category = self.product.category
+        self.assert_indexed(self.client, reverse('api_category_products', args=[category.slug]))
+        self.assert_indexed(self.client, reverse('api_category_products', args=[category.slug]), {'sort': 'price_asc'})
+        self.assert_indexed(self.client, reverse('api_product_list'))
+        self.assert_indexed(self.client, reverse('api_product_list'), {'sort': 'price_desc', 'min_price': 5, 'max_price': 50})
+        self.assert_indexed(self.client, reverse('api_product_list'), {'sort': 'rating'})
+        self.assert_indexed(self.client, reverse('product_detail', args=[self.product.pk]))
+
+    def test_order_views(self):
+        self.assert_indexed(self.client, reverse('api_cart'))
+        self.assert_indexed(self.client, reverse('api_my_orders'))
+        self.assert_indexed(self.staff, reverse('admin_order_list'))
+        self.assert_indexed(self.staff, reverse('admin_order_list'), {'status': 'Placed', 'date_from': '2020-01-01'})
+        self.assert_indexed(self.staff, reverse('admin_order_list'), {'user': 'gina', 'sort': 'oldest'})
+
+    def test_admin_product_grid(self):
+        for sort in ('name', '-name', 'price', '-stock', 'rating', 'oldest'):
+            self.assert_indexed(self.staff, reverse('admin_product_list'), {'sort': sort})
+        self.assert_indexed(self.staff, reverse('admin_product_list'), {'sort': 'stock', 'max_stock': 3})
+
+
+class CartStoreTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create_user(username='hana', password='secret-pass-123')
+        self.first, self.second = make_catalog(category_count=1, products_per_category=2, stock=5)  # 10.00, 11.00
+
+    def exercise(self, store):
+        self.assertEqual(store.add(self.user, self.first, 2), 2)
+        self.assertEqual(store.add(self.user, self.first, 10), 5)  # capped at stock
+        store.add(self.user, self.second)
+        self.assertEqual(store.summary(self.user), {'item_count': 6, 'subtotal': Decimal('61.00')})
+
+        store.set_quantity(self.user, self.first, 1)
+        store.remove(self.user, self.second)
+        self.assertEqual(store.summary(self.user), {'item_count': 1, 'subtotal': Decimal('10.00')})
+        self.assertEqual([(line.id, line.quantity) for line in store.lines(self.user)], [(self.first.pk, 1)])
+
+        self.first.price = 20
+        self.first.save()
+        self.assertEqual(store.lines(self.user)[0].total_price, 20)
+        self.assertEqual(store.summary(self.user)['subtotal'], 20)
+
+        order = checkout_cart(self.user, store=store)
+        self.assertEqual(order.total, 20)
+        self.assertEqual(store.summary(self.user)['item_count'], 0)
+        with self.assertRaises(EmptyCart):
+            checkout_cart(self.user, store=store)
+
+    def test_database_store(self):
+        self.exercise(DatabaseCartStore())
+
+    def test_cache_store(self):
+        self.exercise(CacheCartStore())
+
+    def test_badge_and_cart_page_take_one_query(self):
+        store = DatabaseCartStore()
+        store.add(self.user, self.first, 2)
+        store.add(self.user, self.second, 1)
+        with self.assertNumQueries(1):
+            self.assertEqual(store.summary(self.user)['item_count'], 3)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(store.lines(self.user)), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(CacheCartStore().summary(self.user)['item_count'], 0)
+
+    def test_cart_api_uses_product_ids(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        client.post(reverse('add_to_cart', args=[self.first.pk]), {'quantity': 2}, format='json')
+        data = client.get(reverse('api_cart')).data
+        self.assertEqual([item['id'] for item in data['items']], [self.first.pk])
+        self.assertEqual((data['grand_total'], data['item_count']), (20, 2))
+
+        client.post(reverse('api_update_cart', args=[self.first.pk]), {'action': 'decrease'})
+        self.assertEqual(client.get(reverse('api_cart_summary')).data['item_count'], 1)
+        self.assertEqual(client.post(reverse('api_update_cart', args=[self.second.pk]), {'action': 'remove'}).status_code, 404)
+
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get(reverse('cart')), '<span class="badge bg-success">1</span>')
+
+    def test_batch_endpoint_applies_operations_in_constant_queries(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse('api_cart_batch')
+        extra = make_catalog(category_count=1, products_per_category=8, stock=3)
+
+        def sync(operations):
+            with CaptureQueriesContext(connection) as ctx:
+                response = client.post(url, {'operations': operations}, format='json')
+            self.assertEqual(response.status_code, 200, response.data)
+            return response.data, len(ctx.captured_queries)
+
+        data, _ = sync([{'product_id': p.pk, 'action': 'add'} for p in (self.first, self.second, extra[1])])
+        self.assertEqual(data['item_count'], 3)
+
+        # one insert, update and delete each, whatever the number of lines
+        data, few = sync([
+            {'product_id': extra[2].pk, 'action': 'add'},
+            {'product_id': self.first.pk, 'action': 'increase'},
+            {'product_id': self.second.pk, 'action': 'increase'},
+            {'product_id': self.second.pk, 'action': 'remove'},
+        ])
+        data, many = sync(
+            [{'product_id': p.pk, 'action': 'add', 'quantity': 2} for p in extra[3:]]
+            + [{'product_id': self.first.pk, 'action': 'increase'},
+               {'product_id': self.first.pk, 'action': 'decrease', 'quantity': 2},
+               {'product_id': extra[0].pk, 'action': 'set', 'quantity': 9},
+               {'product_id': extra[2].pk, 'action': 'increase'},
+               {'product_id': extra[1].pk, 'action': 'remove'}]
+        )
+        self.assertEqual(many, few)
+        quantities = {item['id']: item['quantity'] for item in data['items']}
+        self.assertEqual(quantities[self.first.pk], 1)
+        self.assertEqual(quantities[extra[0].pk], 3)  # capped at stock
+        self.assertNotIn(extra[1].pk, quantities)
+        self.assertEqual(data['capped'], [{'product_id': extra[0].pk, 'requested': 9}])
+        self.assertEqual(get_cart_store().summary(self.user)['item_count'], data['item_count'])
+
+    def test_batches_from_the_same_starting_cart_both_apply(self):
+        store = DatabaseCartStore()
+        store.add(self.user, self.first, 1)
+        depth, depths = len(connection.atomic_blocks), []
+        quantities = store.quantities
+
+        def locked_quantities(user):
+            depths.append(len(connection.atomic_blocks) - depth)
+            return quantities(user)
+
+        with mock.patch.object(store, 'quantities', locked_quantities):
+            apply_operations(self.user, [{'product_id': self.first.pk, 'action': 'increase', 'quantity': 1},
+                                         {'product_id': self.second.pk, 'action': 'add', 'quantity': 1}], store=store)
+            apply_operations(self.user, [{'product_id': self.first.pk, 'action': 'increase', 'quantity': 2}], store=store)
+        self.assertEqual(store.quantities(self.user), {self.first.pk: 4, self.second.pk: 1})
+        self.assertEqual(depths, [1, 1])  # read inside apply_operations' own transaction
+
+    def test_batch_with_unknown_product_changes_nothing(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post(reverse('api_cart_batch'), {'operations': [
+            {'product_id': self.first.pk, 'action': 'add'},
+            {'product_id': 0, 'action': 'add'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(get_cart_store().quantities(self.user), {})
+        response = client.post(reverse('api_cart_batch'), {'operations': [{'product_id': 1, 'action': 'explode'}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache_stats.reset()
+        get_cache().clear()
+        self.user = User.objects.create_user(username='grace', password='secret-pass-123')
+        self.products = make_catalog(category_count=2, products_per_category=5)
+        Review.objects.create(product=self.products[0], user=self.user, rating=4, comment="Good")
+        for product in self.products[:3]:
+            order = Order.objects.create(user=self.user, complete=True)
+            OrderItem.objects.create(order=order, product=product, quantity=2)
+
+    def assert_same(self, sync_name, async_name, params=None, **kwargs):
+        expected = APIClient().get(reverse(sync_name, kwargs=kwargs), params).json()
+        response = self.client.get(reverse(async_name, kwargs=kwargs), params)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        if isinstance(data, dict) and data.get('next'):
+            # Same cursor, different path
+            self.assertEqual(data['next'].split('?')[1], expected['next'].split('?')[1])
+            self.assertEqual({**data, 'next': None}, {**expected, 'next': None})
+        else:
+            self.assertEqual(data, expected)
+        return data
+
+    def test_async_views_match_sync_views(self):
+        slug = self.products[0].category.slug
+        self.assert_same('api_category_list', 'api_async_category_list')
+        self.assert_same('api_product_detail', 'api_async_product_detail', pk=self.products[0].pk)
+        self.assert_same('api_product_detail', 'api_async_product_detail', {'fields': 'id,name'}, pk=self.products[1].pk)
+        self.assert_same('api_category_products', 'api_async_category_products', {'sort': 'price_desc'}, category_slug=slug)
+
+        data = self.assert_same('api_product_list', 'api_async_product_list', {'page_size': 4, 'sort': 'price_asc'})
+        self.assertEqual(len(data['results']), 4)
+        cursor = parse_qs(urlsplit(data['next']).query)['cursor'][0]
+        self.assert_same('api_product_list', 'api_async_product_list', {'page_size': 4, 'sort': 'price_asc', 'cursor': cursor})
+        self.assert_same('api_product_list', 'api_async_product_list', {'q': 'Product', 'min_price': 12})
+
+    def test_catalog_validators_apply(self):
+        response = self.client.get(reverse('api_async_product_list'))
+        self.assertIn('ETag', response)
+        response = self.client.get(reverse('api_async_product_list'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_missing_objects_are_404(self):
+        self.assertEqual(self.client.get(reverse('api_async_product_detail', kwargs={'pk': 0})).status_code, 404)
+        response = self.client.get(reverse('api_async_category_products', kwargs={'category_slug': 'nope'}))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.client.get(reverse('api_async_product_list'), {'cursor': 'garbage'}).status_code, 404)
+
+    def test_my_orders_requires_authentication(self):
+        url = reverse('api_async_my_orders')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer not-a-token').status_code, 401)
+
+        token = str(RefreshToken.for_user(self.user).access_token)
+        response = self.client.get(url, HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(len(response.json()), 3)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.json(), client.get(reverse('api_my_orders')).json())
+
+        # Like the sync view, a session alone is not accepted
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+    async def test_runs_under_async_client(self):
+        response = await self.async_client.get(reverse('api_async_product_list'), {'page_size': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 3)
+        token = str(RefreshToken.for_user(self.user).access_token)
+        response = await self.async_client.get(reverse('api_async_my_orders'), headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(len(response.json()), 3)
+
+    def test_product_detail_validators_match_sync_view(self):
+        product = self.products[0]
+        sync_url = reverse('api_product_detail', kwargs={'pk': product.pk})
+        url = reverse('api_async_product_detail', kwargs={'pk': product.pk})
+        response = self.client.get(url)
+        self.assertEqual(response['Last-Modified'], APIClient().get(sync_url)['Last-Modified'])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        # Editing another product leaves this one's validators alone
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[1].save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+
+@override_settings(SHOP_JOBS_MODE='sync')
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='heidi', email='heidi@example.com', password='secret-pass-123')
+        self.product = make_catalog(category_count=1, products_per_category=1)[0]
+        self.calls = []
+        self.failures = 0
+
+        @job('test_flaky', max_attempts=3)
+        def flaky(value):
+            self.calls.append(value)
+            if len(self.calls) <= self.failures:
+                raise RuntimeError("boom")
+
+        self.addCleanup(handlers.pop, 'test_flaky')
+
+    def test_checkout_queues_confirmation_after_commit(self):
+        get_cart_store().add(self.user, self.product, 2)
+        with self.captureOnCommitCallbacks() as callbacks:
+            order = checkout_cart(self.user)
+        queued = Job.objects.get()
+        self.assertEqual((queued.name, queued.payload), ('send_order_confirmation', {'order_id': order.pk}))
+        self.assertEqual(len(mail.outbox), 0)  # nothing runs on the request before commit
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(Job.objects.get().status, Job.DONE)
+        self.assertEqual(mail.outbox[0].to, ['heidi@example.com'])
+        self.assertIn(self.product.name, mail.outbox[0].body)
+
+    def test_rolled_back_work_queues_nothing(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(EmptyCart):
+                checkout_cart(self.user)
+        self.assertEqual(callbacks, [])
+        self.assertFalse(Job.objects.exists())
+
+    def test_failed_jobs_are_retried_with_backoff(self):
+        self.failures = 1
+        with self.captureOnCommitCallbacks(execute=True):
+            queued = enqueue('test_flaky', value=1)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Job.PENDING, 1))
+        self.assertIn("boom", queued.last_error)
+        self.assertGreater(queued.run_at, queued.created_at)
+        self.assertEqual(run_pending(), 0)  # not due yet
+
+        Job.objects.update(run_at=queued.created_at)
+        self.assertEqual(run_pending(), 1)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Job.DONE, 2))
+        self.assertEqual(self.calls, [1, 1])
+
+    def test_jobs_give_up_after_max_attempts(self):
+        self.failures = 10
+        queued = enqueue('test_flaky', value=2)
+        with self.assertLogs('shop.jobs', 'ERROR'):
+            for _ in range(3):
+                Job.objects.update(run_at=queued.created_at)
+                status = run_job(queued.pk)
+        self.assertEqual(status, Job.FAILED)
+        self.assertIsNone(run_job(queued.pk))
+        self.assertEqual(len(self.calls), 3)
+
+    def test_stale_running_jobs_are_released(self):
+        queued = enqueue('test_flaky', value=3)
+        Job.objects.update(status=Job.RUNNING, locked_at=queued.created_at)
+        self.assertEqual(release_stale(lease=0), 1)
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(self.calls, [3])
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics_registry.reset()
+        get_cache().clear()
+        self.products = make_catalog(category_count=1, products_per_category=3)
+
+    def metric(self, text, line_start):
+        return [line for line in text.splitlines() if line.startswith(line_start)]
+
+    @override_settings(SHOP_METRICS_SAMPLE_RATE=1.0)
+    def test_sampled_requests_report_queries_and_server_timing(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('api_product_list'))
+        query_count = len(ctx.captured_queries)
+        timing = dict(part.split(';', 1) for part in response['Server-Timing'].split(', '))
+        self.assertIn(f'desc="{query_count} queries"', timing['db'])
+        self.assertIn('serialize', timing)
+
+        text = self.client.get(reverse('metrics')).content.decode()
+        count = self.metric(text, 'shop_request_duration_seconds_count{view="api_product_list",method="GET",status="200"}')
+        self.assertEqual(count[0].split()[-1], '1')
+        queries = self.metric(text, 'shop_db_queries_sum{view="api_product_list"}')
+        self.assertEqual(float(queries[0].split()[-1]), query_count)
+        size = self.metric(text, 'shop_response_bytes_total{view="api_product_list"}')
+        self.assertEqual(float(size[0].split()[-1]), len(response.content))
+
+    def test_streamed_bytes_are_counted_as_sent(self):
+        response = self.client.get(reverse('api_product_list'), {'stream': 'ndjson'})
+        body = b''.join(response.streaming_content)
+        self.assertTrue(body)
+        size = self.metric(metrics_registry.render(), 'shop_response_bytes_total{view="api_product_list"}')
+        self.assertEqual(float(size[0].split()[-1]), len(body))
+
+    @override_settings(SHOP_METRICS_SAMPLE_RATE=0.0)
+    def test_unsampled_requests_are_only_timed(self):
+        response = self.client.get(reverse('api_async_product_list'))
+        self.assertNotIn('Server-Timing', response)
+        text = metrics_registry.render()
+        self.assertTrue(self.metric(text, 'shop_request_duration_seconds_count{view="api_async_product_list"'))
+        self.assertFalse(self.metric(text, 'shop_db_queries_count{view="api_async_product_list"}'))
+
+    @override_settings(SHOP_METRICS_SAMPLE_RATE=1.0)
+    async def test_async_views_are_instrumented(self):
+        response = await self.async_client.get(reverse('api_async_product_detail', kwargs={'pk': self.products[0].pk}))
+        self.assertIn('queries"', response['Server-Timing'])
+        self.assertNotIn('desc="0 queries"', response['Server-Timing'])
+
+    @override_settings(SHOP_METRICS_TOKEN='scrape-me')
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-me')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+    def test_metrics_without_token_are_staff_or_local_only(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='203.0.113.5').status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_X_FORWARDED_FOR='203.0.113.5').status_code, 403)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        staff = User.objects.create_user('ops', password='pw', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='203.0.113.5').status_code, 200)
+
+
+class BenchmarkSuiteTests(TestCase):
+    def test_shopper_scenario_reports_every_step(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bench.json')
+            call_command('run_benchmarks', products=40, users=3, orders=5, reviews=10, iterations=4,
+                         output=path, stdout=io.StringIO())
+            with open(path) as stream:
+                document = json.load(stream)
+
+            out = io.StringIO()
+            call_command('run_benchmarks', products=40, users=3, orders=5, reviews=10, iterations=4,
+                         compare=path, threshold=100, stdout=out)
+
+        results = document['results']
+        self.assertEqual(set(results), {
+            'browse.categories', 'browse.category', 'browse.product', 'search.products',
+            'cart.pick', 'cart.batch', 'cart.summary', 'checkout', 'checkout.history',
+        })
+        self.assertEqual(results['checkout']['requests'], 4)
+        self.assertGreater(results['checkout']['queries_per_request'], 0)
+        self.assertEqual(results['browse.product']['statuses'], {'200': 4})
+        self.assertEqual(document['meta']['params']['products'], 40)
+        self.assertIn("No regressions", out.getvalue())
+        # Generated data is deleted unless --keep is passed
+        self.assertFalse(User.objects.filter(username__startswith='bench-user-').exists())
+        self.assertFalse(Product.objects.filter(category__slug__startswith='bench-category-').exists())
+
+    def test_compare_flags_slower_steps_and_extra_queries(self):
+        row = {'p50_ms': 1.0, 'p95_ms': 2.0, 'p99_ms': 3.0, 'queries_per_request': 2}
+        current = {'a': {**row, 'p95_ms': 2.5}, 'b': {**row, 'queries_per_request': 3}, 'c': row}
+        regressions = list(compare_results({'a': row, 'b': row, 'c': row}, current))
+        self.assertEqual(regressions, [('a', 'p95_ms', 2.0, 2.5), ('b', 'queries_per_request', 2, 3)])
+
+
+class DashboardStatsTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='ivan', password='secret-pass-123', is_staff=True)
+        self.user = User.objects.create_user(username='judy', password='secret-pass-123')
+        self.products = make_catalog(category_count=1, products_per_category=3)
+
+    def checkout(self, quantity=1):
+        get_cart_store().add(self.user, self.products[0], quantity)
+        return checkout_cart(self.user)
+
+    def test_rollups_follow_orders_users_and_reviews(self):
+        first = self.checkout(2)
+        self.checkout(1)
+        review = Review.objects.create(product=self.products[1], user=self.user, rating=5, comment="Great")
+        totals = stats.dashboard()
+        self.assertEqual((totals['orders'], totals['users'], totals['reviews'], totals['products']), (2, 2, 1, 3))
+        self.assertEqual(totals['revenue'], Decimal('30.00'))
+        self.assertEqual(totals['daily'][-1]['orders'], 2)
+        self.assertEqual(totals['by_status']['Placed']['orders'], 2)
+
+        first.status = 'Cancelled'
+        first.save()
+        review.delete()
+        totals = stats.dashboard()
+        self.assertEqual(totals['by_status']['Placed']['orders'], 1)
+        self.assertEqual(totals['by_status']['Cancelled'], {'orders': 1, 'revenue': Decimal('20.00')})
+        self.assertEqual(totals['revenue'], Decimal('10.00'))
+        self.assertEqual(totals['reviews'], 0)
+
+        first.delete()
+        self.assertEqual(stats.dashboard()['orders'], 1)
+
+    def test_rebuild_matches_incremental_rollups(self):
+        self.checkout(1)
+        order = self.checkout(3)
+        order.status = 'Shipped'
+        order.save()
+        Review.objects.create(product=self.products[1], user=self.user, rating=4, comment="Fine")
+        rows = lambda: sorted(StatRollup.objects.values_list('period', 'start', 'metric', 'dimension', 'value'))
+        incremental = [row for row in rows() if row[4]]
+
+        StatRollup.objects.all().delete()
+        call_command('rebuild_stats', stdout=io.StringIO())
+        self.assertEqual(rows(), incremental)
+
+    def test_dashboard_query_count_is_independent_of_history(self):
+        self.client.force_login(self.admin)
+        self.checkout(1)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(reverse('admin_dashboard'))
+        for _ in range(5):
+            self.checkout(1)
+            Review.objects.create(product=self.products[2], user=self.user, rating=3, comment="Ok")
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(reverse('admin_dashboard'))
+        self.assertEqual(len(many), len(few))
+        self.assertEqual(response.context['total_orders'], 6)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in many.captured_queries))
+
+
+class AdminListTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username='kate', password='secret-pass-123', is_staff=True)
+        self.buyer = User.objects.create_user(username='leo', password='secret-pass-123')
+        self.client.force_login(self.staff)
+        self.products = make_catalog(category_count=2, products_per_category=3)
+
+    def place(self, count, user=None, status='Placed'):
+        for _ in range(count):
+            order = Order.objects.create(user=user or self.buyer, complete=True, status=status)
+            OrderItem.objects.create(order=order, product=self.products[0], quantity=2)
+
+    def walk(self, name, params):
+        """Follow the next links and return the ids of every row seen and the queries per page."""
+        ids, queries, url = [], [], reverse(name)
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url, params)
+            params = None
+            key = 'orders' if 'orders' in response.context else 'products'
+            ids += [row.pk for row in response.context[key]]
+            queries.append(len(ctx.captured_queries))
+            url = response.context['next_link']
+        return ids, queries
+
+    def test_orders_are_paginated_with_totals(self):
+        self.place(7)
+        self.place(2, status='Shipped')
+        ids, queries = self.walk('admin_order_list', {'page_size': 3})
+        self.assertEqual(ids, list(Order.objects.order_by('-created_at', '-id').values_list('pk', flat=True)))
+        self.assertEqual(len(set(queries)), 1)  # every page costs the same
+
+        response = self.client.get(reverse('admin_order_list'), {'status': 'Shipped'})
+        self.assertEqual(len(response.context['orders']), 2)
+        self.assertContains(response, '₹20')
+
+    def test_order_filters(self):
+        self.place(2)
+        self.place(1, user=self.staff)
+        old = Order.objects.order_by('pk').first()
+        Order.objects.filter(pk=old.pk).update(created_at=timezone.make_aware(datetime(2024, 3, 5, 23, 30)))
+
+        def ids(**params):
+            return [order.pk for order in self.client.get(reverse('admin_order_list'), params).context['orders']]
+
+        self.assertEqual(len(ids(user='kate')), 1)
+        self.assertEqual(ids(date_from='2024-03-05', date_to='2024-03-05'), [old.pk])
+        self.assertEqual(len(ids(date_from='2024-03-06')), 2)
+        self.assertEqual(len(ids(status='bogus')), 3)  # invalid filters are ignored and reported
+        self.assertEqual(self.client.get(reverse('admin_order_list'), {'cursor': 'nope'}).status_code, 404)
+
+    def test_product_grid_sorts_and_filters(self):
+        Product.objects.filter(pk=self.products[1].pk).update(stock=1, available=False)
+        ids, _ = self.walk('admin_product_list', {'sort': '-price', 'page_size': 4})
+        expected = Product.objects.order_by('-price', '-id').values_list('pk', flat=True)
+        self.assertEqual(ids, list(expected))
+
+        response = self.client.get(reverse('admin_product_list'), {'max_stock': 1, 'available': 'no'})
+        self.assertEqual([p.pk for p in response.context['products']], [self.products[1].pk])
+        self.assertEqual(response.context['sort'], 'newest')
+        self.assertContains(response, 'sort=name')
+        response = self.client.get(reverse('admin_product_list'), {'sort': 'name'})
+        self.assertContains(response, 'sort=-name')  # clicking the sorted column flips it
+
+    def test_query_count_does_not_grow_with_history(self):
+        self.place(3)
+        _, few = self.walk('admin_order_list', {'page_size': 50})
+        self.place(60)
+        _, many = self.walk('admin_order_list', {'page_size': 50})
+        self.assertEqual(many, [few[0], few[0]])
+
+
+class BulkProductTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username='mia', password='secret-pass-123', is_staff=True)
+        self.client.force_login(self.staff)
+        self.products = make_catalog(category_count=2, products_per_category=3)
+        self.category = self.products[0].category
+        self.url = reverse('admin_product_list') + f'?category={self.category.pk}'
+
+    def version(self):
+        return get_versions([Product])['shop.product']
+
+    def test_reprice_category_in_one_statement(self):
+        buyer = User.objects.create_user(username='ned', password='secret-pass-123')
+        get_cart_store().add(buyer, self.products[0], 2)
+        before = self.version()
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, {'action': 'reprice', 'value': '10'})
+        self.assertRedirects(response, self.url, fetch_redirect_response=False)
+
+        prices = dict(Product.objects.values_list('name', 'price'))
+        self.assertEqual(prices['Product 0-0'], Decimal('11.00'))
+        self.assertEqual(prices['Product 0-2'], Decimal('13.20'))
+        self.assertEqual(prices['Product 1-0'], Decimal('10.00'))
+        self.assertEqual(Cart.objects.get(user=buyer).subtotal, Decimal('22.00'))
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "shop_product"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self.version(), before + 1)
+
+    def test_dry_run_only_counts(self):
+        response = self.client.post(self.url, {'action': 'hide', 'dry_run': 'on'}, follow=True)
+        self.assertContains(response, 'would affect 3 products')
+        self.assertEqual(Product.objects.filter(available=False).count(), 0)
+
+    def test_stock_actions_on_ticked_rows(self):
+        ids = [self.products[0].pk, self.products[4].pk]
+        self.client.post(reverse('admin_product_list'), {'action': 'add_stock', 'value': '-15', 'ids': ids})
+        self.assertEqual(list(Product.objects.filter(stock=0).values_list('pk', flat=True)), ids)
+
+        response = self.client.post(reverse('admin_product_list'), {'action': 'set_stock', 'value': '1.5'}, follow=True)
+        self.assertContains(response, 'whole numbers')
+        self.assertFalse(Product.objects.filter(stock=1).exists())
+
+    def test_delete_bumps_cache_once(self):
+        before = self.version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.url, {'action': 'delete', 'confirm': 'on'})
+        self.assertEqual(Product.objects.count(), 3)
+        self.assertEqual(self.version(), before + 1)
+        self.assertEqual(stats.dashboard()['products'], 3)
+
+    def test_unscoped_or_unconfirmed_actions_change_nothing(self):
+        url = reverse('admin_product_list')
+        for data in ({'action': 'delete', 'confirm': 'on'}, {'action': 'hide'}):
+            response = self.client.post(url, data, follow=True)
+            self.assertContains(response, 'Tick some products or filter the list first.')
+        response = self.client.post(url + '?max_stock=oops', {'action': 'delete', 'confirm': 'on'}, follow=True)
+        self.assertContains(response, 'Tick some products or filter the list first.')
+        response = self.client.post(self.url, {'action': 'delete'}, follow=True)
+        self.assertContains(response, 'Deleting products needs Confirm delete ticked.')
+        self.assertEqual(Product.objects.count(), 6)
+        self.assertFalse(Product.objects.filter(available=False).exists())
+
+    def test_batched_invalidation_merges_nested_bumps(self):
+        before = self.version()
+        with self.captureOnCommitCallbacks(execute=True):
+            with batched_invalidation():
+                bump_version(Product)
+                with batched_invalidation():
+                    bump_version(Product, Category)
+                self.assertEqual(self.version(), before)
+        self.assertEqual(self.version(), before + 1)
+
+
+TOKEN_USER_REST_FRAMEWORK = dict(
+    settings.REST_FRAMEWORK, DEFAULT_AUTHENTICATION_CLASSES=('shop.authentication.TokenUserAuthentication',),
+)
+
+
+@override_settings(REST_FRAMEWORK=TOKEN_USER_REST_FRAMEWORK)
+class TokenUserAuthTests(TestCase):
+    def setUp(self):
+        # APIView reads its default authentication classes once, at import
+        patcher = mock.patch.object(APIView, 'authentication_classes', [TokenUserAuthentication])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        get_cache().clear()
+        self.user = User.objects.create_user(username='olga', password='secret-pass-123')
+        self.products = make_catalog(category_count=1, products_per_category=2)
+        self.client = APIClient()
+
+    def login(self):
+        response = self.client.post(reverse('token_obtain_pair'), {'username': 'olga', 'password': 'secret-pass-123'})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.json()['access']}")
+        return response.json()
+
+    def user_queries(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(url, data or {}, format='json')
+        self.assertLess(response.status_code, 300, response.content)
+        return [q['sql'] for q in ctx.captured_queries if '"auth_user"' in q['sql']]
+
+    def test_tokens_carry_user_claims(self):
+        access = AccessToken(self.login()['access'])
+        self.assertEqual((access['username'], access['is_staff']), ('olga', False))
+
+    def test_cart_and_checkout_skip_the_user_query(self):
+        self.login()
+        self.assertEqual(len(self.user_queries('get', reverse('api_cart_summary'))), 1)  # warms the state cache
+        self.assertEqual(self.user_queries('post', reverse('add_to_cart', args=[self.products[0].pk]), {'quantity': 2}), [])
+        self.assertEqual(self.user_queries('get', reverse('api_cart')), [])
+        with self.captureOnCommitCallbacks():
+            self.assertEqual(self.user_queries('post', reverse('api_checkout')), [])
+        self.assertEqual(self.user_queries('get', reverse('api_my_orders')), [])
+        self.assertEqual(Order.objects.get(user=self.user, complete=True).total, Decimal('20.00'))
+
+        response = self.client.get(reverse('api_async_my_orders'))
+        self.assertEqual(len(response.json()), 1)
+
+    def test_password_change_and_deactivation_revoke_tokens(self):
+        self.login()
+        url = reverse('api_cart_summary')
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.user.set_password('another-pass-456')
+        self.user.save()
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+        self.client.credentials()
+        tokens = self.client.post(reverse('token_obtain_pair'), {'username': 'olga', 'password': 'another-pass-456'}).json()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.assertEqual(self.client.get(url).status_code, 200)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)  # bypasses signals: honoured after the TTL
+        forget_user_state(self.user.pk)
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+
+class PasswordHashingTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create_user(username='pia', password='secret-pass-123')
+
+    def test_pooled_hasher_round_trip(self):
+        hasher = PooledPBKDF2PasswordHasher()
+        with override_settings(SHOP_PASSWORD_HASH_WORKERS=1):
+            encoded = hasher.encode('secret', hasher.salt(), 1000)
+            self.assertTrue(hasher.verify('secret', encoded))
+            self.assertFalse(hasher.verify('wrong', encoded))
+        self.assertTrue(hasher.verify('secret', encoded))  # inline once the pool is off
+
+    @skipUnless(importlib.util.find_spec('argon2'), "argon2-cffi is not installed")
+    def test_pbkdf2_hash_is_upgraded_on_login(self):
+        User.objects.filter(pk=self.user.pk).update(password=make_password('secret-pass-123', hasher='pbkdf2_sha256'))
+        response = self.client.post(reverse('token_obtain_pair'), {'username': 'pia', 'password': 'secret-pass-123'})
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('argon2$'))
+
+    @skipUnless(importlib.util.find_spec('argon2'), "argon2-cffi is not installed")
+    def test_hashes_of_every_default_hasher_still_verify(self):
+        for hasher in global_settings.PASSWORD_HASHERS:
+            self.assertIn(hasher, settings.PASSWORD_HASHERS)
+        self.assertEqual(get_hasher('bcrypt_sha256').algorithm, 'bcrypt_sha256')
+        User.objects.filter(pk=self.user.pk).update(password=make_password('secret-pass-123', hasher='scrypt'))
+        response = self.client.post(reverse('token_obtain_pair'), {'username': 'pia', 'password': 'secret-pass-123'})
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('argon2$'))
+
+    @override_settings(SHOP_LOGIN_RATE_USERNAME='2/min')
+    def test_login_bursts_are_refused_before_hashing(self):
+        url = reverse('token_obtain_pair')
+        with mock.patch('shop.hashers.run', wraps=hashers.run) as hashing:
+            statuses = [self.client.post(url, {'username': 'PIA', 'password': 'nope'}).status_code for _ in range(2)]
+            response = self.client.post(url, {'username': 'pia', 'password': 'secret-pass-123'})
+        self.assertEqual(statuses, [401, 401])
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(hashing.call_count, 2)
+
+        # The page and JSON logins share the same counter
+        response = self.client.post(reverse('login_page'), {'username': 'pia', 'password': 'secret-pass-123'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(self.client.post(reverse('token_obtain_pair'), {'username': 'other', 'password': 'x'}).status_code, 401)
+        # Other clients can still sign in as the same user
+        response = self.client.post(url, {'username': 'pia', 'password': 'secret-pass-123'}, REMOTE_ADDR='198.51.100.7')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(SHOP_SIGNUP_RATE_IP='1/hour', SHOP_TRUSTED_PROXY_COUNT=1)
+    def test_client_ip_comes_from_trusted_proxy_header(self):
+        def signup(username, forwarded):
+            body = json.dumps({'username': username, 'password': 'Long-pass-9911'})
+            return self.client.post(
+                reverse('signup'), body, content_type='application/json',
+                REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR=forwarded,
+            ).status_code
+
+        self.assertEqual(signup('quinn', '203.0.113.9'), 200)
+        self.assertEqual(signup('rory', '203.0.113.10'), 200)
+        # A forged leading entry does not change the address the proxy saw
+        self.assertEqual(signup('sage', '203.0.113.99, 203.0.113.9'), 429)
+
+    @override_settings(SHOP_SIGNUP_RATE_IP='1/hour')
+    def test_signup_is_throttled_per_ip(self):
+        def signup(username, ip):
+            body = json.dumps({'username': username, 'password': 'Long-pass-9911'})
+            return self.client.post(reverse('signup'), body, content_type='application/json', REMOTE_ADDR=ip).status_code
+
+        self.assertEqual(signup('quinn', '127.0.0.1'), 200)
+        self.assertEqual(signup('rory', '127.0.0.1'), 429)
+        self.assertEqual(signup('rory', '198.51.100.4'), 200)
+
+
+class ResponseEncodingTests(TestCase):
+    def setUp(self):
+        self.products = make_catalog(category_count=2, products_per_category=20)
+        self.client = APIClient()
+
+    def test_orjson_renderer_matches_drf(self):
+        data = {'price': Decimal('1.50'), 'when': timezone.make_aware(datetime(2024, 1, 1)), 1: 'x', 'text': 'é\u2028'}
+        expected = DRFJSONRenderer().render(data)
+        self.assertEqual(JSONRenderer().render(data), expected)
+        with mock.patch('shop.renderers.orjson', None):
+            self.assertEqual(JSONRenderer().render(data), expected)
+
+    @skipUnless(brotli, "brotli is not installed")
+    def test_large_responses_are_compressed(self):
+        url = reverse('api_product_list')
+        plain = self.client.get(url, {'page_size': 40})
+        self.assertNotIn('Content-Encoding', plain)
+
+        brotli_response = self.client.get(url, {'page_size': 40}, HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        self.assertEqual(brotli_response['Content-Encoding'], 'br')
+        self.assertIn('Accept-Encoding', brotli_response['Vary'])
+        self.assertTrue(brotli_response['ETag'].startswith('W/'))
+        self.assertEqual(brotli.decompress(brotli_response.content), plain.content)
+        self.assertLess(len(brotli_response.content) * 4, len(plain.content))
+
+        gzip_response = self.client.get(url, {'page_size': 40}, HTTP_ACCEPT_ENCODING='gzip, br;q=0')
+        self.assertEqual(gzip_response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(gzip_response.content), plain.content)
+
+        small = self.client.get(reverse('api_category_list'), HTTP_ACCEPT_ENCODING='br')
+        self.assertNotIn('Content-Encoding', small)
+
+        # Pages with CSRF tokens only get Django's BREACH-padded gzip
+        page = self.client.get(reverse('product_list'), HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(page['Content-Encoding'], 'gzip')
+        self.assertIn('csrfmiddlewaretoken', gzip.decompress(page.content).decode())
+        self.assertNotIn('Content-Encoding', self.client.get(reverse('product_list'), HTTP_ACCEPT_ENCODING='br'))
+
+        stream = self.client.get(url, {'stream': 'ndjson'}, HTTP_ACCEPT_ENCODING='br')
+        lines = brotli.decompress(b''.join(stream.streaming_content)).splitlines()
+        self.assertEqual(len(lines), 40)
+
+    def test_compact_mode_sends_categories_once(self):
+        full = self.client.get(reverse('api_product_list'), {'page_size': 40}).json()
+        compact = self.client.get(reverse('api_product_list'), {'page_size': 40, 'compact': 1}).json()
+        self.assertEqual(len(compact['categories']), 2)
+        for product, original in zip(compact['results'], full['results']):
+            self.assertEqual(compact['categories'][str(product['category'])], original['category'])
+
+        category = self.products[0].category
+        response = self.client.get(reverse('api_async_category_products', args=[category.slug]), {'compact': 1})
+        self.assertEqual(list(response.json()['categories']), [str(category.pk)])
+        self.assertEqual({product['category'] for product in response.json()['products']}, {category.pk})
+
+        without = self.client.get(reverse('api_product_list'), {'compact': 1, 'fields': 'id,name'}).json()
+        self.assertNotIn('categories', without)
+
+
+@skipUnless(images.Image, "Pillow is not installed")
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        sources = os.path.join(tmp.name, 'images')
+        os.makedirs(sources)
+        # Noise keeps the original big, like the photos in /images
+        noise = images.Image.effect_noise((1600, 1200), 64)
+        photo = images.Image.merge('RGB', (noise, noise.rotate(90, expand=False), noise.transpose(images.Image.FLIP_LEFT_RIGHT)))
+        photo.save(os.path.join(sources, 'big photo.jpg'), quality=95)
+        self.original_size = os.path.getsize(os.path.join(sources, 'big photo.jpg'))
+
+        storages = {**settings.STORAGES, 'shop_images': {
+            'BACKEND': 'django.core.files.storage.FileSystemStorage',
+            'OPTIONS': {'location': os.path.join(tmp.name, 'media'), 'base_url': '/media/images/'},
+        }}
+        overrides = override_settings(SHOP_IMAGE_SOURCE_DIRS=[sources], STORAGES=storages)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        self.category = Category.objects.create(name="Cars", slug="cars", image_url='/images/big%20photo.jpg')
+        self.product = Product.objects.create(
+            category=self.category, name="Car", description="Fast", price=10, stock=1, image_url='/images/big%20photo.jpg',
+        )
+
+    def build(self, *args):
+        out = io.StringIO()
+        call_command('build_image_variants', *args, stdout=out, stderr=io.StringIO())
+        return out.getvalue()
+
+    def test_variants_are_resized_hashed_and_recorded(self):
+        self.build()
+        self.category.refresh_from_db()
+        self.product.refresh_from_db()
+        variants = self.category.image_variants
+        self.assertEqual(self.product.image_variants, variants)
+        self.assertEqual(set(variants), set(images.VARIANTS))
+        self.assertEqual((variants['card']['width'], variants['card']['height']), (480, 360))
+        self.assertEqual(variants['full']['width'], 1200)
+        self.assertRegex(variants['thumb']['jpeg'], r'^/media/images/big-photo\.thumb\.[0-9a-f]{12}\.jpg$')
+
+        card_size = images.stored_size(variants['card']['jpeg'])
+        self.assertLess(card_size * 10, self.original_size)
+
+        self.assertIn("0 images", self.build())
+        self.assertIn("1 images for 2 rows", self.build('--force'))
+
+    @skipUnless(brotli, "brotli is not installed")
+    def test_variants_are_served_immutable_and_uncompressed(self):
+        self.build()
+        self.category.refresh_from_db()
+        card = self.category.image_variants['card']
+        response = self.client.get(card['jpeg'], HTTP_ACCEPT_ENCODING='br')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        cache_control = {part.strip().split('=')[0]: part.strip() for part in response['Cache-Control'].split(',')}
+        self.assertIn('immutable', cache_control)
+        self.assertIn('public', cache_control)
+        self.assertGreaterEqual(int(cache_control['max-age'].split('=')[1]), 31536000)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(len(b''.join(response.streaming_content)), images.stored_size(card['jpeg']))
+        self.assertEqual(self.client.get('/media/images/missing.jpg').status_code, 404)
+
+    def test_building_variants_changes_the_product_etag(self):
+        urls = [reverse('api_product_detail', args=[self.product.pk]), reverse('api_async_product_detail', args=[self.product.pk])]
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.build()
+        for url, etag in zip(urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('card', response.json()['image_variants'])
+
+    def test_pages_and_api_use_the_variants(self):
+        self.build()
+        self.category.refresh_from_db()
+        card = self.category.image_variants['card']
+
+        page = self.client.get(reverse('home')).content.decode()
+        self.assertIn(card['jpeg'], page)
+        self.assertNotIn('big%20photo.jpg', page)
+
+        data = self.client.get(reverse('api_category_products', args=['cars'])).json()
+        self.assertEqual(data['category']['image_variants']['card'], card)
+        self.assertEqual(data['products'][0]['image_variants']['card'], card)
+
+    def test_changed_image_drops_stale_variants(self):
+        self.build()
+        form = ProductForm(instance=Product.objects.get(pk=self.product.pk), data={
+            'name': "Car", 'description': "Fast", 'price': 10, 'stock': 1, 'available': True,
+            'category': self.category.pk, 'image_url': 'https://example.com/car.jpg',
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.save().image_variants, {})
+
+        with self.assertNumQueries(2):
+            self.assertEqual(list(images.known_variants()), ['/images/big%20photo.jpg'])
+        self.assertEqual(images.known_variants(['https://example.com/car.jpg']), {})
+
+    def test_only_local_images_are_resolved(self):
+        self.assertIsNotNone(images.source_path('/images/big photo.jpg'))
+        self.assertIsNone(images.source_path('https://example.com/images/big%20photo.jpg'))
+        self.assertIsNone(images.source_path('/images/../images/../../etc/passwd'))
+        self.assertIsNone(images.source_path('/static/big photo.jpg'))
+
+
+class StorefrontCachingTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.products = make_catalog(category_count=2, products_per_category=3)
+        self.product = self.products[0]
+        self.user = User.objects.create_user(username="reader", password="pw")
+
+    def test_fragments_skip_queries_until_models_change(self):
+        url = reverse('product_list')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            page = self.client.get(url).content.decode()
+        self.assertIn("Product 0-0", page)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = 99
+            self.product.save()
+        self.assertIn("₹99", self.client.get(url).content.decode())
+        with self.assertNumQueries(0):
+            self.client.get(url)
+        self.assertNotIn("Product 0-0", self.client.get(url, {'q': "1-2"}).content.decode())
+
+    def test_cached_forms_get_the_current_csrf_token(self):
+        url = reverse('category_products', args=[self.product.category.slug])
+        tokens = []
+        for _ in range(2):
+            client = self.client_class(enforce_csrf_checks=True)
+            page = client.get(url).content.decode()
+            self.assertNotIn(CSRF_PLACEHOLDER, page)
+            token = page.split('name="csrfmiddlewaretoken" value="')[1].split('"')[0]
+            self.assertEqual(len(token), 64)
+            tokens.append(token)
+        self.assertNotEqual(tokens[0], tokens[1])
+
+    def test_review_list_follows_new_reviews(self):
+        url = reverse('product_detail', args=[self.product.pk])
+        self.assertIn("No reviews yet", self.client.get(url).content.decode())
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(product=self.product, user=self.user, rating=5, comment="Lovely")
+        self.assertIn("Lovely", self.client.get(url).content.decode())
+
+        # Logging in saves last_login only, which reviews do not show
+        before = get_versions([Review])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.force_login(self.user)
+        self.assertEqual(get_versions([Review]), before)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.username = "renamed"
+            self.user.save()
+        self.client.logout()
+        self.assertIn("renamed", self.client.get(url).content.decode())
+
+    def test_prerender_writes_anonymous_pages_and_drops_stale_ones(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        directory = os.path.join(tmp.name, 'prerendered')
+        self.client.force_login(self.user)
+        self.client.get(reverse('home'))
+
+        written, skipped = write_pages(hot_paths(products=2), directory)
+        self.assertEqual(skipped, [])
+        self.assertIn(reverse('product_detail', args=[self.product.pk]), written)
+        home = os.path.join(directory, 'index.html')
+        with open(home, encoding='utf-8') as page:
+            html = page.read()
+        self.assertIn("Category 0", html)
+        self.assertNotIn("reader", html)
+        with gzip.open(home + '.gz', 'rt', encoding='utf-8') as page:
+            self.assertEqual(page.read(), html)
+
+        stale = os.path.join(directory, 'product', str(self.product.pk), 'index.html')
+        self.assertTrue(os.path.exists(stale))
+        self.product.delete()
+        write_pages(hot_paths(products=2), directory)
+        self.assertFalse(os.path.exists(stale))
+        self.assertTrue(os.path.islink(directory))
+        self.assertEqual(sorted(os.listdir(tmp.name)), ['prerendered', 'prerendered.versions'])
+        self.assertEqual(len(os.listdir(directory + '.versions')), 1)
@@ -0,0 +1,90 @@
+"""
+Fixed-window throttles for login and signup, checked before any password is
+hashed.
+
+Attempts are counted per client IP and, for logins, per username from that
+IP, in the shop cache. Keying usernames on the IP too means nobody can lock
+a user out from elsewhere. A burst past the limit is rejected with 429 until
+the window rolls over. Rates are "<count>/<period>" strings (`sec`, `min`,
+`hour`, `day`); set one to None to turn that limit off. Counters are only
+shared between processes with a shared cache.
+
+Behind a proxy every request arrives from the proxy's address. Set
+`SHOP_TRUSTED_PROXY_COUNT` to the number of proxies in front of the app so
+the client is read from X-Forwarded-For instead; otherwise one client could
+exhaust the limit for everyone.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+from .cache import get_cache
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+def hit(scope, ident, rate):
+    """Count one attempt by `ident`; the seconds to wait if it is over `rate`, else None."""
+    if not rate or not ident:
+        return None
+    limit, period = parse_rate(rate)
+    now = time.time()
+    digest = hashlib.md5(str(ident).encode()).hexdigest()
+    key = f"shop:throttle:{scope}:{digest}:{int(now // period)}"
+    cache = get_cache()
+    cache.add(key, 0, period)
+    try:
+        count = cache.incr(key)
+    except ValueError:
+        # Evicted between add and incr
+        cache.set(key, 1, period)
+        count = 1
+    if count > limit:
+        return period - now % period
+    return None
+
+
+def client_ip(request):
+    """The client's address, skipping the trusted proxies that appended to X-Forwarded-For."""
+    proxies = getattr(settings, 'SHOP_TRUSTED_PROXY_COUNT', 0)
+    if proxies:
+        # Only the last `proxies` entries were written by our own proxies; earlier ones can be forged
+        hops = [hop.strip() for hop in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if hop.strip()]
+        if len(hops) >= proxies:
+            return hops[-proxies]
+    return request.META.get('REMOTE_ADDR')
+
+
+def check_login(request, username):
+    """Seconds the client must wait before another login attempt, or None."""
+    ip = client_ip(request)
+    waits = [
+        hit('login-ip', ip, getattr(settings, 'SHOP_LOGIN_RATE_IP', '100/min')),
+        hit('login-user', f"{str(username or '').lower()}|{ip}" if username else None,
+            getattr(settings, 'SHOP_LOGIN_RATE_USERNAME', '10/min')),
+    ]
+    waits = [wait for wait in waits if wait is not None]
+    return max(waits) if waits else None
+
+
+def check_signup(request):
+    return hit('signup-ip', client_ip(request), getattr(settings, 'SHOP_SIGNUP_RATE_IP', '20/hour'))
+
+
+class LoginRateThrottle(BaseThrottle):
+    """`check_login` for DRF views that take a username in the request body."""
+
+    def allow_request(self, request, view):
+        username = request.data.get('username') if hasattr(request.data, 'get') else None
+        self.wait_time = check_login(request, username)
+        return self.wait_time is None
+
+    def wait(self):
+        return self.wait_time
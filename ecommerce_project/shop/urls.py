@@ -1,9 +1,10 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
 from .views import (
     hello, home,
     CategoryList, CategoryProducts, ProductList, ProductDetail, AddToCart,
-    Cart, UpdateCart, Checkout, MyOrders, OrderDetail,
+    Cart, CartSummary, CartBatch, UpdateCart, Checkout, MyOrders, OrderDetail,
     category_list, category_products,
     product_list, product_detail,
     cart, update_cart, checkout, billing,
@@ -11,9 +12,11 @@ from .views import (
     signup_page, login_page,
     my_orders, order_detail,
     admin_dashboard, admin_product_list, admin_add_product,
-    admin_edit_product, admin_delete_product, admin_order_list, admin_order_detail
+    admin_edit_product, admin_delete_product, admin_order_list, admin_order_detail,
+    CacheStats, TokenObtainPair, serve_image,
 )
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from . import async_views
+from rest_framework_simplejwt.views import TokenRefreshView
 
 urlpatterns = [
     # API endpoints
@@ -22,12 +25,20 @@ urlpatterns = [
     path('api/products/', ProductList.as_view(), name='api_product_list'),
     path('api/product/<int:pk>/', ProductDetail.as_view(), name='api_product_detail'),
     path('api/cart/', Cart.as_view(), name='api_cart'),
+    path('api/cart/summary/', CartSummary.as_view(), name='api_cart_summary'),
+    path('api/cart/batch/', CartBatch.as_view(), name='api_cart_batch'),
     path('api/cart/update/<int:item_id>/', UpdateCart.as_view(), name='api_update_cart'),
     path('api/checkout/', Checkout.as_view(), name='api_checkout'),
     path('api/my-orders/', MyOrders.as_view(), name='api_my_orders'),
     path('api/order/<int:order_id>/', OrderDetail.as_view(), name='api_order_detail'),
+    path('api/async/categories/', async_views.category_list, name='api_async_category_list'),
+    path('api/async/category/<slug:category_slug>/', async_views.category_products, name='api_async_category_products'),
+    path('api/async/products/', async_views.product_list, name='api_async_product_list'),
+    path('api/async/product/<int:pk>/', async_views.product_detail, name='api_async_product_detail'),
+    path('api/async/my-orders/', async_views.my_orders, name='api_async_my_orders'),
+    path('api/cache-stats/', CacheStats.as_view(), name='api_cache_stats'),
     path("api/hello/", hello),
-    path("api/token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
+    path("api/token/", TokenObtainPair.as_view(), name="token_obtain_pair"),
     path("api/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
     path('signup/', signup, name='signup'),
 
@@ -65,3 +76,7 @@ urlpatterns = [
     path('dashboard/orders/', admin_order_list, name='admin_order_list'),
     path('dashboard/orders/<int:pk>/', admin_order_detail, name='admin_order_detail'),
 ]
+
+if settings.DEBUG:
+    # Development fallback; image variants are served by WhiteNoise or the web server
+    urlpatterns.append(path('media/images/<path:path>', serve_image, name='serve_image'))
@@ -1,23 +1,46 @@
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.models import User
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
+from django.utils.cache import patch_cache_control
 from django.views.decorators.csrf import csrf_exempt
+from django.views.static import serve
 from django.contrib.auth import authenticate, login
-from .models import Product, Category
+from .models import Product, Category, Review
 import json
 
 # DRF imports for API views
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
-from .serializers import CategorySerializer, ProductSerializer, OrderSerializer, OrderItemSerializer, ReviewSerializer
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
+from .serializers import CategorySerializer, ProductSerializer, OrderSerializer, OrderItemSerializer, ReviewSerializer, CartLineSerializer, CartBatchSerializer, category_table
 from .forms import ReviewForm
-from django.db.models import Q
+from .images import get_storage as get_image_storage
+from .pagination import AdminOrderPagination, AdminProductPagination, KeysetPagination
+from .cache import cached, stats as cache_stats
+from .conditional import catalog_condition, product_condition
+from .search import get_search_backend
+from .cart import CartOperationError, apply_operations, get_cart_store
+from .services import CheckoutError, EmptyCart, InsufficientStock, checkout_cart
+from .stats import dashboard as dashboard_stats
+from .streaming import stream_format, streaming_response
+from .throttling import LoginRateThrottle, check_login, check_signup
+from rest_framework_simplejwt.views import TokenObtainPairView
 
 # ----------------- User APIs -----------------
+def throttled(wait):
+    response = JsonResponse({"error": "Too many attempts, try again later"}, status=429)
+    response['Retry-After'] = str(int(wait) + 1)
+    return response
+
 @csrf_exempt
 def signup(request):
     if request.method == "POST":
+        # Rejected before create_user hashes anything
+        wait = check_signup(request)
+        if wait:
+            return throttled(wait)
         data = json.loads(request.body)
         username = data.get('username')
         email = data.get('email')
@@ -36,6 +59,9 @@ def login_view(request):
         username = data.get('username')
         password = data.get('password')
 
+        wait = check_login(request, username)
+        if wait:
+            return throttled(wait)
         user = authenticate(username=username, password=password)
         if user is not None:
             login(request, user)
@@ -43,6 +69,24 @@ def login_view(request):
         else:
             return JsonResponse({"error": "Invalid credentials"}, status=400)
 
+class TokenObtainPair(TokenObtainPairView):
+    throttle_classes = [LoginRateThrottle]
+
+# ----------------- Images -----------------
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+
+def serve_image(request, path):
+    """
+    Generated image variants, for DEBUG without WhiteNoise only; production
+    serves them through `images.ImageVariantMiddleware` or the web server.
+    Their names change with their content, so browsers may keep them for a
+    year without revalidating.
+    """
+    response = serve(request, path, document_root=get_image_storage().location)
+    if response.status_code == 200:
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    return response
+
 # ----------------- Product / Category Views -----------------
 
 from django.shortcuts import render, redirect, get_object_or_404
@@ -51,50 +95,84 @@ from django.contrib import messages
 from .models import Product, Category, Order, OrderItem
 
 # ----------------- Categories & Products -----------------
+def list_param(request, name):
+    """Parse a comma-separated query parameter such as `fields=id,name`."""
+    value = request.query_params.get(name, "")
+    return [part.strip() for part in value.split(",") if part.strip()]
+
+def compact_param(request):
+    """`compact=1` sends each product's category as an id, with the categories once in a side table."""
+    return request.query_params.get("compact") in ("1", "true")
+
+def serialize_products(page, request, expand):
+    """Serialized `page` and, in compact mode, the category side table (else None)."""
+    compact = compact_param(request)
+    serializer = ProductSerializer(page, many=True, fields=list_param(request, "fields"), expand=expand, compact=compact)
+    table = category_table(page) if compact and 'category' in serializer.child.fields else None
+    return serializer.data, table
+
+def filter_catalog(products, request):
+    """Apply the `q` search and `min_price`/`max_price` filters shared by the catalog APIs."""
+    query = request.GET.get("q", "")
+    min_price = request.GET.get("min_price")
+    max_price = request.GET.get("max_price")
+
+    if query:
+        products = get_search_backend().search(products, query)
+    if min_price:
+        products = products.filter(price__gte=min_price)
+    if max_price:
+        products = products.filter(price__lte=max_price)
+    return products
+
+def catalog_paginator(request):
+    return KeysetPagination(default_sort="relevance" if request.GET.get("q") else None)
+
 class CategoryList(APIView):
     permission_classes = [AllowAny]
 
+    @catalog_condition(Category)
     def get(self, request):
-        categories = Category.objects.all()
-        serializer = CategorySerializer(categories, many=True)
-        return Response(serializer.data)
+        data = cached("categories", [Category], lambda: CategorySerializer(Category.objects.all(), many=True).data)
+        return Response(data)
 
 class CategoryProducts(APIView):
     permission_classes = [AllowAny]
 
+    @catalog_condition(Category, Product, Review)
     def get(self, request, category_slug):
+        models = [Category, Product, Review] if "reviews" in list_param(request, "expand") else [Category, Product]
+        data = cached(
+            "category_products", models,
+            lambda: self.build_payload(request, category_slug),
+            vary=[request.build_absolute_uri()],
+        )
+        return Response(data)
+
+    def build_payload(self, request, category_slug):
         category = get_object_or_404(Category, slug=category_slug)
-        products = Product.objects.filter(category=category, available=True)
-
-        # Search and filters
-        query = request.GET.get("q", "")
-        min_price = request.GET.get("min_price")
-        max_price = request.GET.get("max_price")
-        sort = request.GET.get("sort")
-
-        if query:
-            products = products.filter(Q(name__icontains=query) | Q(description__icontains=query))
+        products = filter_catalog(Product.objects.filter(category=category, available=True), request)
 
-        if min_price:
-            products = products.filter(price__gte=min_price)
-        if max_price:
-            products = products.filter(price__lte=max_price)
-
-        if sort == "price_asc":
-            products = products.order_by("price")
-        elif sort == "price_desc":
-            products = products.order_by("-price")
+        # Sorting and cursor pagination
+        expand = list_param(request, "expand")
+        products = ProductSerializer.setup_eager_loading(products, expand=expand)
+        paginator = catalog_paginator(request)
+        page = paginator.paginate_queryset(products, request, view=self)
 
         category_serializer = CategorySerializer(category)
-        product_serializer = ProductSerializer(products, many=True)
-        return Response({
+        products, categories = serialize_products(page, request, expand)
+        payload = {
             'category': category_serializer.data,
-            'products': product_serializer.data
-        })
+            'products': products,
+            'next': paginator.get_next_link(),
+        }
+        if categories is not None:
+            payload['categories'] = categories
+        return payload
 
 # Keep template views for backward compatibility
 def category_list(request):
-    categories = Category.objects.all()
+    categories = cached("category_list", [Category], lambda: list(Category.objects.all()))
     return render(request, 'shop/category_list.html', {'categories': categories})
 
 def category_products(request, category_slug):
@@ -137,57 +215,66 @@ class AddToCart(APIView):
                 status=400
             )
 
-        # Get or create order
-        order, created = Order.objects.get_or_create(user=request.user, complete=False)
-        order_item, created = OrderItem.objects.get_or_create(order=order, product=product)
-
-        # Update quantity: add to existing if not created
-        if created:
-            order_item.quantity = min(quantity, product.stock)
-        else:
-            order_item.quantity += quantity
-            order_item.quantity = min(order_item.quantity, product.stock)
-        order_item.save()
-
+        get_cart_store().add(request.user, product, quantity)
         return Response({"message": f"{product.name} added to cart"})
 
 class Cart(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        order, created = Order.objects.get_or_create(user=request.user, complete=False)
-        items = order.items.all()
-        serializer = OrderItemSerializer(items, many=True)
-        grand_total = sum(item.get_total for item in items)
-        return Response({
-            'items': serializer.data,
-            'grand_total': grand_total
-        })
+        return Response(cart_payload(request.user))
+
+def cart_payload(user):
+    lines = get_cart_store().lines(user)
+    return {
+        'items': CartLineSerializer(lines, many=True).data,
+        'grand_total': sum(line.total_price for line in lines),
+        'item_count': sum(line.quantity for line in lines),
+    }
+
+class CartBatch(APIView):
+    """Apply a list of cart operations in one request, e.g. to sync an offline cart."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = CartBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            capped = apply_operations(request.user, serializer.validated_data['operations'])
+        except CartOperationError as exc:
+            return Response({"error": str(exc)}, status=400)
+        payload = cart_payload(request.user)
+        payload['capped'] = [{'product_id': pk, 'requested': quantity} for pk, quantity in capped.items()]
+        return Response(payload)
+
+class CartSummary(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response(get_cart_store().summary(request.user))
 
 class UpdateCart(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, item_id):
-        order = get_object_or_404(Order, user=request.user, complete=False)
-        item = get_object_or_404(OrderItem, id=item_id, order=order)
+        # Cart items are addressed by product id
+        store = get_cart_store()
+        item = store.line(request.user, item_id)
+        if item is None:
+            raise Http404
         action = request.data.get('action')
         if action == "increase":
             if item.quantity < item.product.stock:
-                item.quantity += 1
-                item.save()
+                store.set_quantity(request.user, item.product, item.quantity + 1)
                 return Response({"message": "Quantity increased"})
             else:
                 return Response({"error": "Stock limit reached"}, status=400)
         elif action == "decrease":
-            item.quantity -= 1
-            if item.quantity <= 0:
-                item.delete()
-                return Response({"message": "Item removed"})
-            else:
-                item.save()
+            if store.set_quantity(request.user, item.product, item.quantity - 1):
                 return Response({"message": "Quantity decreased"})
+            return Response({"message": "Item removed"})
         elif action == "remove":
-            item.delete()
+            store.remove(request.user, item.product)
             return Response({"message": "Item removed"})
         return Response({"error": "Invalid action"}, status=400)
 
@@ -195,21 +282,11 @@ class Checkout(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
-        order = get_object_or_404(Order, user=request.user, complete=False)
-        items = order.items.filter(quantity__gt=0)
-
-        if not items:
-            return Response({"error": "Cart is empty"}, status=400)
-
-        # Deduct stock
-        for item in items:
-            item.product.stock -= item.quantity
-            if item.product.stock < 0:
-                item.product.stock = 0
-            item.product.save()
-
-        order.complete = True
-        order.save()
+        # Convert the cart, reserve stock and complete the order in one transaction
+        try:
+            checkout_cart(request.user)
+        except CheckoutError as exc:
+            return Response({"error": str(exc)}, status=400)
 
         return Response({"message": "Order placed successfully"})
 
@@ -217,7 +294,11 @@ class MyOrders(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        orders = Order.objects.filter(user=request.user, complete=True).order_by('-created_at')
+        orders = Order.objects.filter(user_id=request.user.pk, complete=True).order_by('-created_at')
+        orders = OrderSerializer.setup_eager_loading(orders)
+        fmt = stream_format(request)
+        if fmt:
+            return streaming_response(orders.order_by('-created_at', '-id'), lambda batch: OrderSerializer(batch, many=True).data, fmt)
         serializer = OrderSerializer(orders, many=True)
         return Response(serializer.data)
 
@@ -225,7 +306,7 @@ class OrderDetail(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, order_id):
-        order = get_object_or_404(Order, id=order_id, user=request.user)
+        order = get_object_or_404(OrderSerializer.setup_eager_loading(Order.objects.all()), id=order_id, user_id=request.user.pk)
         serializer = OrderSerializer(order)
         return Response(serializer.data)
 
@@ -233,71 +314,59 @@ class OrderDetail(APIView):
 # ----------------- Cart -----------------
 @login_required
 def cart(request):
-    order, created = Order.objects.get_or_create(user=request.user, complete=False)
-    items = order.items.all()
-
-    # Calculate total per item and grand total
-    grand_total = 0
-    for item in items:
-        item.total_price = item.product.price * item.quantity
-        grand_total += item.total_price
-
+    items = get_cart_store().lines(request.user)
+    grand_total = sum(item.total_price for item in items)
     return render(request, 'shop/cart.html', {'items': items, 'grand_total': grand_total})
 
 # ----------------- Update Cart -----------------
 @login_required
 def update_cart(request, item_id, action):
-    order = get_object_or_404(Order, user=request.user, complete=False)
-    item = get_object_or_404(OrderItem, id=item_id, order=order)
+    store = get_cart_store()
+    item = store.line(request.user, item_id)
+    if item is None:
+        raise Http404
 
     if action == "increase":
         if item.quantity < item.product.stock:
-            item.quantity += 1
-            item.save()
+            store.set_quantity(request.user, item.product, item.quantity + 1)
             messages.success(request, f"Quantity updated for {item.product.name}.")
         else:
             messages.error(request, f"Cannot exceed available stock ({item.product.stock}) for {item.product.name}.")
 
     elif action == "decrease":
-        item.quantity -= 1
-        if item.quantity <= 0:
-            item.delete()
-            messages.info(request, f"{item.product.name} removed from cart.")
-        else:
-            item.save()
+        if store.set_quantity(request.user, item.product, item.quantity - 1):
             messages.success(request, f"Quantity updated for {item.product.name}.")
+        else:
+            messages.info(request, f"{item.product.name} removed from cart.")
 
     elif action == "remove":
-        item.delete()
+        store.remove(request.user, item.product)
         messages.info(request, f"{item.product.name} removed from cart.")
 
     return redirect('cart')
 @login_required
 def checkout(request):
-    order = get_object_or_404(Order, user=request.user, complete=False)
-    items = order.items.filter(quantity__gt=0)
-
-    if not items:
-        messages.info(request, "Your cart is empty.")
-        return redirect('home')
-
     if request.method == "POST":
-        # Deduct stock for each item
-        for item in items:
-            item.product.stock -= item.quantity
-            if item.product.stock < 0:
-                item.product.stock = 0  # just in case
-            item.product.save()
-
-        # Mark order complete
-        order.complete = True
-        order.save()
+        # Convert the cart, reserve stock and complete the order in one transaction
+        try:
+            checkout_cart(request.user)
+        except EmptyCart:
+            messages.info(request, "Your cart is empty.")
+            return redirect('home')
+        except InsufficientStock as exc:
+            messages.error(request, str(exc))
+            return redirect('cart')
 
         messages.success(request, "Order placed successfully!")
         return redirect('home')
 
+    items = get_cart_store().lines(request.user)
+    if not items:
+        messages.info(request, "Your cart is empty.")
+        return redirect('home')
+
     # GET request → show billing page
-    grand_total = sum(item.product.price * item.quantity for item in items)
+    grand_total = sum(item.total_price for item in items)
     return render(request, 'shop/billing.html', {
         'items': items,
         'grand_total': grand_total
@@ -312,17 +381,13 @@ from .models import Order, OrderItem, Product
 
 @login_required
 def billing(request):
-    order = get_object_or_404(Order, user=request.user, complete=False)
-    items = order.items.filter(quantity__gt=0)
+    items = get_cart_store().lines(request.user)
 
     if not items:
         messages.info(request, "Your cart is empty.")
         return redirect('home')
 
-    grand_total = 0
-    for item in items:
-        item.total_price = item.product.price * item.quantity
-        grand_total += item.total_price
+    grand_total = sum(item.total_price for item in items)
 
     return render(request, 'shop/billing.html', {
         'items': items,
@@ -338,6 +403,9 @@ from .forms import SignupForm
 def signup_page(request):
     if request.method == "POST":
         form = SignupForm(request.POST)
+        if check_signup(request):
+            messages.error(request, "Too many sign-ups from your network. Please try again later.")
+            return render(request, 'shop/signup.html', {'form': form}, status=429)
         if form.is_valid():
             user = form.save()
             login(request, user)
@@ -356,6 +424,9 @@ def login_page(request):
         password = request.POST.get('password')
         next_url = request.POST.get('next')  # get next from POST
 
+        if check_login(request, username):
+            messages.error(request, "Too many login attempts. Please wait a minute and try again.")
+            return render(request, 'shop/login.html', {'next': next_url}, status=429)
         user = authenticate(request, username=username, password=password)
         if user is not None:
             login(request, user)
@@ -384,7 +455,7 @@ def logout_page(request):
     return redirect('home')
 @login_required
 def my_orders(request):
-    orders = Order.objects.filter(user=request.user, complete=True).order_by('-created_at')
+    orders = Order.objects.filter(user=request.user, complete=True).with_totals().order_by('-created_at')
     return render(request, 'shop/my_orders.html', {'orders': orders})
 from django.shortcuts import render, get_object_or_404
 from .models import Order
@@ -392,7 +463,7 @@ from .models import Order
 @login_required
 def order_detail(request, order_id):
     order = get_object_or_404(Order, id=order_id, user=request.user)
-    items = order.items.all()
+    items = order.items.select_related('product')
 
     # Calculate total_price for each item
     for item in items:
@@ -407,47 +478,49 @@ def order_detail(request, order_id):
         'grand_total': grand_total,
     })
 
-from django.db.models import Q
-
 from django.shortcuts import render
-from django.db.models import Q
 from .models import Product, Category
 
 class ProductList(APIView):
     permission_classes = [AllowAny]
 
+    @catalog_condition(Product, Category)
     def get(self, request):
-        query = request.GET.get("q", "")
-        min_price = request.GET.get("min_price")
-        max_price = request.GET.get("max_price")
-        sort = request.GET.get("sort")
-
-        products = Product.objects.all()
-
-        # Search filter
-        if query:
-            products = products.filter(Q(name__icontains=query) | Q(description__icontains=query))
-
-        # Price filter (optional)
-        if min_price:
-            products = products.filter(price__gte=min_price)
-        if max_price:
-            products = products.filter(price__lte=max_price)
-
-        # Sorting (optional)
-        if sort == "price_asc":
-            products = products.order_by("price")
-        elif sort == "price_desc":
-            products = products.order_by("-price")
-
-        serializer = ProductSerializer(products, many=True)
-        return Response(serializer.data)
+        products = filter_catalog(Product.objects.all(), request)
+
+        # Sorting and cursor pagination
+        expand = list_param(request, "expand")
+        products = ProductSerializer.setup_eager_loading(products, expand=expand)
+        paginator = catalog_paginator(request)
+        fields = list_param(request, "fields")
+
+        # Full-catalog pulls skip pagination and stream every match instead
+        fmt = stream_format(request)
+        if fmt:
+            return streaming_response(
+                paginator.order_queryset(products, request),
+                lambda batch: ProductSerializer(batch, many=True, fields=fields, expand=expand).data,
+                fmt,
+            )
+
+        page = paginator.paginate_queryset(products, request, view=self)
+        results, categories = serialize_products(page, request, expand)
+        response = paginator.get_paginated_response(results)
+        if categories is not None:
+            response.data['categories'] = categories
+        return response
 
 class ProductDetail(APIView):
+    @product_condition
     def get(self, request, pk):
-        product = get_object_or_404(Product, pk=pk)
-        serializer = ProductSerializer(product)
-        return Response(serializer.data)
+        fields = list_param(request, "fields")
+        data = cached("product_detail", [Product, Category, Review], lambda: self.build_payload(pk, fields), vary=[pk, fields])
+        return Response(data)
+
+    def build_payload(self, pk, fields):
+        expand = ["reviews"]
+        product = get_object_or_404(ProductSerializer.setup_eager_loading(Product.objects.all(), expand=expand), pk=pk)
+        return ProductSerializer(product, fields=fields, expand=expand).data
 
     def post(self, request, pk):
         if not request.user.is_authenticated:
@@ -456,7 +529,7 @@ class ProductDetail(APIView):
         form = ReviewForm(request.data)
         if form.is_valid():
             review = form.save(commit=False)
-            review.user = request.user
+            review.user_id = request.user.pk
             review.product = product
             review.save()
             return Response({"message": "Review added"})
@@ -471,9 +544,9 @@ def product_list(request):
 
     products = Product.objects.all()
 
-    # Search filter
+    # Search filter, ranked by relevance unless another sort is chosen
     if query:
-        products = products.filter(Q(name__icontains=query) | Q(description__icontains=query))
+        products = get_search_backend().search(products, query).order_by("search_rank", "id")
 
     # Price filter (optional)
     if min_price:
@@ -486,6 +559,8 @@ def product_list(request):
         products = products.order_by("price")
     elif sort == "price_desc":
         products = products.order_by("-price")
+    elif sort == "rating":
+        products = products.order_by("-rating_avg", "-id")
 
     categories = Category.objects.all()
 
@@ -504,8 +579,8 @@ from .models import Product, Review
 from .forms import ReviewForm
 
 def product_detail(request, pk):
-    product = get_object_or_404(Product, pk=pk)
-    reviews = product.reviews.order_by('-created_at')
+    product = get_object_or_404(Product.objects.select_related('category'), pk=pk)
+    reviews = product.reviews.select_related('user').order_by('-created_at')
     related_products = Product.objects.filter(category=product.category).exclude(pk=product.pk)[:4]
 
     if request.method == 'POST':
@@ -542,19 +617,19 @@ def admin_check(user):
 
 @user_passes_test(admin_check)
 def admin_dashboard(request):
-    total_products = Product.objects.count()
-    total_orders = Order.objects.count()
-    total_users = User.objects.count()
-    total_reviews = Review.objects.count()
-
-    latest_orders = Order.objects.order_by('-created_at')[:5]
-    latest_reviews = Review.objects.order_by('-created_at')[:5]
+    # Counts come from the precomputed rollups; the latest rows walk the primary key
+    stats = dashboard_stats()
+    latest_orders = Order.objects.filter(complete=True).with_totals().order_by('-pk')[:5]
+    latest_reviews = Review.objects.select_related('user', 'product').order_by('-pk')[:5]
 
     context = {
-        'total_products': total_products,
-        'total_orders': total_orders,
-        'total_users': total_users,
-        'total_reviews': total_reviews,
+        'total_products': stats['products'],
+        'total_orders': stats['orders'],
+        'total_users': stats['users'],
+        'total_reviews': stats['reviews'],
+        'total_revenue': stats['revenue'],
+        'orders_by_status': stats['by_status'],
+        'daily_stats': stats['daily'],
         'latest_orders': latest_orders,
         'latest_reviews': latest_reviews,
     }
@@ -562,12 +637,39 @@ def admin_dashboard(request):
 
 
 
-from .forms import ProductForm
+from .forms import AdminOrderFilterForm, AdminProductFilterForm, BulkProductForm, ProductForm
+from . import bulk
 
 @user_passes_test(admin_check)
 def admin_product_list(request):
-    products = Product.objects.all()
-    return render(request, 'shop/admin_product_list.html', {'products': products})
+    form = AdminProductFilterForm(request.GET)
+    products = Product.objects.select_related('category')
+    if form.is_valid():
+        products = form.filter(products)
+    if request.method == 'POST':
+        bulk_form = BulkProductForm(request.POST, filter_form=form)
+        if bulk_form.is_valid():
+            data = bulk_form.cleaned_data
+            count = bulk.apply(data['action'], bulk_form.selection(products), data['value'], data['dry_run'])
+            label = bulk.ACTION_LABELS[data['action']]
+            if data['dry_run']:
+                messages.info(request, f"Dry run: '{label}' would affect {count} products.")
+            else:
+                messages.success(request, f"'{label}' applied to {count} products.")
+        else:
+            for errors in bulk_form.errors.values():
+                messages.error(request, errors[0])
+        # Back to the same filtered page, so a dry run can be followed by the real thing
+        return redirect(request.get_full_path())
+    paginator = AdminProductPagination()
+    page = admin_page(paginator, products, request)
+    return render(request, 'shop/admin_product_list.html', {
+        'products': page,
+        'form': form,
+        'bulk_form': BulkProductForm(),
+        'sort': paginator.sort,
+        'next_link': paginator.get_next_link(),
+    })
 
 @user_passes_test(admin_check)
 def admin_add_product(request):
@@ -600,12 +702,34 @@ def admin_delete_product(request, pk):
 
 @user_passes_test(admin_check)
 def admin_order_list(request):
-    orders = Order.objects.order_by('-created_at')
-    return render(request, 'shop/admin_order_list.html', {'orders': orders})
+    form = AdminOrderFilterForm(request.GET)
+    orders = Order.objects.all()
+    if form.is_valid():
+        orders = form.filter(orders)
+    fmt = stream_format(request)
+    if fmt:
+        orders = OrderSerializer.setup_eager_loading(orders.with_totals().order_by('-created_at', '-id'))
+        return streaming_response(orders, lambda batch: OrderSerializer(batch, many=True).data, fmt)
+
+    paginator = AdminOrderPagination()
+    page = admin_page(paginator, orders.select_related('user').with_totals(), request)
+    return render(request, 'shop/admin_order_list.html', {
+        'orders': page,
+        'form': form,
+        'sort': paginator.sort,
+        'next_link': paginator.get_next_link(),
+    })
+
+def admin_page(paginator, queryset, request):
+    """One keyset page for a template view; a bad cursor is a 404."""
+    try:
+        return paginator.paginate_queryset(queryset, Request(request))
+    except NotFound:
+        raise Http404("Invalid cursor")
 
 @user_passes_test(admin_check)
 def admin_order_detail(request, pk):
-    order = Order.objects.get(pk=pk)
+    order = Order.objects.select_related('user').with_totals().get(pk=pk)
     if request.method == 'POST':
         status = request.POST.get('status')
         if status:
@@ -613,6 +737,12 @@ def admin_order_detail(request, pk):
             order.save()
     return render(request, 'shop/admin_order_detail.html', {'order': order})
 
+class CacheStats(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(cache_stats.snapshot())
+
 
 
 from django.http import JsonResponse